@@ -0,0 +1,100 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""Import-time benchmarks of the plugin.
+
+QIIME 2 imports every plugin whenever the CLI starts or its cache is
+refreshed, so loading and registering the plugin should stay cheap. Run
+this module directly to check the import time against a budget:
+
+    python -m benchmarks.bench_import --budget 0.5
+"""
+
+import argparse
+import subprocess
+import sys
+
+# modules imported by the framework before the plugin is loaded
+FRAMEWORK_IMPORTS = (
+    "import qiime2.plugin, q2_types.per_sample_sequences, q2_types.sample_data"
+)
+PLUGIN_MODULE = "q2_checkm.plugin_setup"
+IMPORT_BUDGET = 0.5
+
+
+def measure_import_time(module: str = PLUGIN_MODULE) -> float:
+    """Measures the time it takes to import a module using -X importtime.
+
+    Only the imports triggered by the module itself are counted - the
+    framework is imported beforehand.
+
+    Args:
+        module (str): Name of the module to be imported.
+
+    Returns:
+        float: Import time (in seconds).
+    """
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"{FRAMEWORK_IMPORTS}\nimport {module}",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    package, total = module.split(".")[0], 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # nested imports are indented and already included in the
+        # cumulative time of the top-level ones
+        if not cumulative.strip().isdigit() or name[1:].startswith(" "):
+            continue
+        if name.strip().split(".")[0] == package:
+            total += int(cumulative)
+    return total / 10**6
+
+
+class ImportTime:
+    """Import of the plugin, as done by QIIME 2 on start-up."""
+
+    timeout = 300
+
+    def timeraw_import_plugin(self):
+        return f"import {PLUGIN_MODULE}", FRAMEWORK_IMPORTS
+
+    def track_import_time(self):
+        return round(measure_import_time() * 1000, 1)
+
+    track_import_time.unit = "ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Checks the time it takes to import the plugin."
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=IMPORT_BUDGET,
+        help="Maximum import time in seconds.",
+    )
+    args = parser.parse_args(argv)
+
+    import_time = measure_import_time()
+    print(f"Importing {PLUGIN_MODULE} took {import_time:.3f}s.")
+    if import_time > args.budget:
+        sys.exit(f"The import time exceeds the budget of {args.budget:.3f}s.")
+
+
+if __name__ == "__main__":
+    main()
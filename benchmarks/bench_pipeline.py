@@ -0,0 +1,199 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""Benchmarks of the main q2-checkm processing steps.
+
+None of the benchmarks requires CheckM or its database: the bins are
+generated synthetically and CheckM is replaced by the fake executable
+found in the fake_checkm directory.
+"""
+
+import json
+import os
+import tempfile
+
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+
+from q2_checkm.checkm import (
+    _classify_bins,
+    _parse_checkm_reports,
+    _render_report,
+    _run_checkm,
+    _zip_checkm_plots,
+)
+from q2_checkm.plots import (
+    _draw_detailed_plots,
+    _draw_overview_plots,
+    _get_vega_renderer,
+)
+
+from .synthetic import (
+    make_checkm_results,
+    make_cohort,
+    make_fake_db,
+    write_svg,
+)
+
+SIZES = [10, 1_000, 100_000]
+FAKE_CHECKM_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "fake_checkm"
+)
+
+
+def _bins_per_sample(n_bins: int) -> int:
+    return min(n_bins, 100)
+
+
+def _load_results(n_bins: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        reports = make_checkm_results(tmp, n_bins, _bins_per_sample(n_bins))
+        df = _parse_checkm_reports(reports)
+    return _classify_bins(df)
+
+
+class Orchestration:
+    """A complete run of _run_checkm using the fake CheckM executable."""
+
+    params = SIZES
+    param_names = ["bins"]
+    timeout = 3600
+
+    def setup_cache(self):
+        paths = {"db": os.path.abspath(make_fake_db("db"))}
+        for n_bins in SIZES:
+            paths[n_bins] = os.path.abspath(
+                make_cohort(
+                    f"cohort-{n_bins}",
+                    n_bins,
+                    bins_per_sample=_bins_per_sample(n_bins),
+                    contigs_per_bin=2,
+                    contig_length=500,
+                )
+            )
+        return paths
+
+    def setup(self, paths, n_bins):
+        os.environ["PATH"] = f"{FAKE_CHECKM_DIR}{os.pathsep}{os.environ['PATH']}"
+        os.environ.setdefault("FAKE_CHECKM_SVG_SIZE", "2000")
+        self.bins = MultiMAGSequencesDirFmt(paths[n_bins], mode="r")
+        self.checkm_params = {"db_path": paths["db"], "threads": 1}
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def teardown(self, paths, n_bins):
+        self.tmp.cleanup()
+
+    def time_run_checkm(self, paths, n_bins):
+        output_dir = tempfile.mkdtemp(dir=self.tmp.name)
+        _run_checkm(output_dir, self.bins, self.checkm_params)
+
+
+class ParseReports:
+    """Conversion of CheckM's bin statistics into the results table."""
+
+    params = SIZES
+    param_names = ["bins"]
+
+    def setup_cache(self):
+        return {
+            n_bins: make_checkm_results(
+                os.path.abspath(os.path.join("reports", str(n_bins))),
+                n_bins,
+                _bins_per_sample(n_bins),
+            )
+            for n_bins in SIZES
+        }
+
+    def time_parse_checkm_reports(self, reports, n_bins):
+        _parse_checkm_reports(reports[n_bins])
+
+    def peakmem_parse_checkm_reports(self, reports, n_bins):
+        _parse_checkm_reports(reports[n_bins])
+
+
+class ZipPlots:
+    """Archiving of the plots drawn by CheckM (three per bin)."""
+
+    params = SIZES
+    param_names = ["bins"]
+    timeout = 1800
+
+    def setup_cache(self):
+        plots = {}
+        for n_bins in SIZES:
+            per_sample, bins_per_sample = {}, _bins_per_sample(n_bins)
+            for i in range(n_bins):
+                sample = f"sample{i // bins_per_sample}"
+                for plot_type in ["gc", "nx", "coding"]:
+                    plot_dir = os.path.abspath(
+                        os.path.join("plots", str(n_bins), plot_type, sample)
+                    )
+                    os.makedirs(plot_dir, exist_ok=True)
+                    write_svg(
+                        os.path.join(plot_dir, f"bin{i}.{plot_type}.svg"), size=2000
+                    )
+                    per_sample.setdefault(sample, {})[plot_type] = plot_dir
+            plots[n_bins] = per_sample
+        return plots
+
+    def setup(self, plots, n_bins):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def teardown(self, plots, n_bins):
+        self.tmp.cleanup()
+
+    def time_zip_checkm_plots(self, plots, n_bins):
+        _zip_checkm_plots(plots[n_bins], os.path.join(self.tmp.name, "plots.zip"))
+
+
+class DrawPlots:
+    """Generation of the Vega specs embedded into the visualization."""
+
+    params = SIZES
+    param_names = ["bins"]
+    timeout = 1800
+
+    def setup(self, n_bins):
+        self.df = _load_results(n_bins)
+
+    def time_draw_detailed_plots(self, n_bins):
+        _draw_detailed_plots(self.df)
+
+    def time_draw_overview_plots(self, n_bins):
+        _draw_overview_plots(self.df)
+
+
+class RenderReport:
+    """Rendering of the visualization templates with precomputed plots."""
+
+    params = SIZES
+    param_names = ["bins"]
+    timeout = 1800
+
+    def setup(self, n_bins):
+
+        df = _load_results(n_bins)
+        self.context = {
+            "tabs": [
+                {"title": "QC overview", "url": "index.html"},
+                {"title": "Sample details", "url": "sample_details.html"},
+            ],
+            "samples": json.dumps(df["sample_id"].unique().tolist()),
+            "vega_plots_detailed": json.dumps(_draw_detailed_plots(df)),
+            "vega_plots_overview": json.dumps(_draw_overview_plots(df)),
+            "vega_renderer": _get_vega_renderer(len(df)),
+        }
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def teardown(self, n_bins):
+        self.tmp.cleanup()
+
+    def time_render_report(self, n_bins):
+        _render_report(
+            tempfile.mkdtemp(dir=self.tmp.name),
+            self.context,
+            ["index.html", "sample_details.html"],
+        )
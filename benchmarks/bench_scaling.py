@@ -0,0 +1,116 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""Scaling benchmarks of the steps whose cost grows with the number of bins.
+
+Regressions are detected by comparing the results of two commits with
+`make bench-compare` (see the Makefile for the allowed margin).
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from q2_checkm.checkm import _classify_bins, _parse_checkm_reports
+from q2_checkm.plots import _draw_detailed_plots, _draw_overview_plots
+
+from .synthetic import make_checkm_results
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+BINS_PER_SAMPLE = 100
+
+
+class ParseReportsScaling:
+    """Conversion of CheckM's bin statistics into the results table."""
+
+    params = SIZES
+    param_names = ["bins"]
+    timeout = 3600
+
+    def setup_cache(self):
+        return {
+            n_bins: make_checkm_results(
+                os.path.abspath(os.path.join("reports", str(n_bins))),
+                n_bins,
+                BINS_PER_SAMPLE,
+            )
+            for n_bins in SIZES
+        }
+
+    def time_parse_checkm_reports(self, reports, n_bins):
+        _parse_checkm_reports(reports[n_bins])
+
+    def peakmem_parse_checkm_reports(self, reports, n_bins):
+        _parse_checkm_reports(reports[n_bins])
+
+
+class PlotSpecScaling:
+    """Generation of the Vega specs embedded into the visualization."""
+
+    params = SIZES
+    param_names = ["bins"]
+    timeout = 3600
+
+    def setup_cache(self):
+        tables = {}
+        for n_bins in SIZES:
+            reports = make_checkm_results(
+                os.path.join("reports", str(n_bins)), n_bins, BINS_PER_SAMPLE
+            )
+            df = _parse_checkm_reports(reports)
+            df = _classify_bins(df)
+            tables[n_bins] = os.path.abspath(f"results-{n_bins}.pkl")
+            df.to_pickle(tables[n_bins])
+        return tables
+
+    def setup(self, tables, n_bins):
+        self.df = pd.read_pickle(tables[n_bins])
+
+    def time_draw_detailed_plots(self, tables, n_bins):
+        _draw_detailed_plots(self.df)
+
+    def peakmem_draw_detailed_plots(self, tables, n_bins):
+        _draw_detailed_plots(self.df)
+
+    def track_detailed_spec_size(self, tables, n_bins):
+        return len(json.dumps(_draw_detailed_plots(self.df)))
+
+    track_detailed_spec_size.unit = "bytes"
+
+    def time_draw_overview_plots(self, tables, n_bins):
+        _draw_overview_plots(self.df)
+
+    def peakmem_draw_overview_plots(self, tables, n_bins):
+        _draw_overview_plots(self.df)
+
+    def track_overview_spec_size(self, tables, n_bins):
+        return len(json.dumps(_draw_overview_plots(self.df)))
+
+    track_overview_spec_size.unit = "bytes"
+
+
+class ClassifyScaling:
+    """Assignment of the completeness categories and MIMAG quality tiers."""
+
+    params = SIZES
+    param_names = ["bins"]
+
+    def setup(self, n_bins):
+        rng = np.random.default_rng(0)
+        completeness = rng.uniform(0, 100, n_bins)
+        completeness[::50] = np.nan
+        self.df = pd.DataFrame(
+            {
+                "completeness": completeness,
+                "contamination": rng.uniform(0, 30, n_bins),
+            }
+        )
+
+    def time_classify_bins(self, n_bins):
+        _classify_bins(self.df)
@@ -0,0 +1,196 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""Synthetic data used by the benchmarks.
+
+This module is also imported by the fake CheckM executable, so it should
+not import any heavy dependencies at the module level.
+"""
+
+import os
+import random
+from typing import List
+
+# marker names used to fill in the gene copy number (GCN) fields
+MARKERS = [f"PF{x:05d}" for x in range(1000, 1100)]
+LINEAGES = [
+    "k__Bacteria (UID203)",
+    "o__Actinomycetales (UID1572)",
+    "g__Mycobacterium (UID1816)",
+    "f__Enterobacteriaceae (UID5121)",
+    "k__Archaea (UID2)",
+]
+
+
+def make_cohort(
+    path: str,
+    n_bins: int,
+    bins_per_sample: int = 10,
+    contigs_per_bin: int = 5,
+    contig_length: int = 1000,
+    seed: int = 0,
+) -> str:
+    """Creates a synthetic cohort of MAGs.
+
+    The cohort has the layout of a MultiMAGSequencesDirFmt: one directory
+    per sample containing one FASTA file per bin and a MANIFEST file.
+
+    Args:
+        path (str): Directory in which the cohort should be created.
+        n_bins (int): Total number of bins.
+        bins_per_sample (int): Number of bins in every sample (the last
+            sample may contain fewer).
+        contigs_per_bin (int): Number of contigs in every bin.
+        contig_length (int): Length of every contig.
+        seed (int): Random seed.
+
+    Returns:
+        str: Path to the cohort.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    alphabet = np.frombuffer(b"ACGT", dtype=np.uint8)
+    os.makedirs(path, exist_ok=True)
+
+    manifest = ["sample-id,mag-id,filename"]
+    for i in range(n_bins):
+        sample, mag = f"sample{i // bins_per_sample}", f"bin{i % bins_per_sample}"
+        os.makedirs(os.path.join(path, sample), exist_ok=True)
+        fn = os.path.join(sample, f"{mag}.fasta")
+
+        seqs = rng.choice(alphabet, size=(contigs_per_bin, contig_length))
+        with open(os.path.join(path, fn), "wb") as fh:
+            for j, seq in enumerate(seqs):
+                fh.write(f">{mag}_contig{j}\n".encode())
+                fh.write(seq.tobytes() + b"\n")
+        manifest.append(f"{sample},{mag},{fn}")
+
+    with open(os.path.join(path, "MANIFEST"), "w") as fh:
+        fh.write("\n".join(manifest) + "\n")
+    return path
+
+
+def make_bin_stats(bin_id: str, rng: random.Random, genome_size: int = None) -> dict:
+    """Creates a realistic CheckM statistics record of a single bin.
+
+    Args:
+        bin_id (str): The bin ID.
+        rng (random.Random): Random number generator.
+        genome_size (int): Genome size of the bin. A random value is used
+            if not provided.
+
+    Returns:
+        dict: Statistics in the form found in CheckM's bin_stats_ext.tsv.
+    """
+    genome_size = genome_size or rng.randint(500_000, 8_000_000)
+    contigs = rng.randint(1, 500)
+    markers = rng.randint(100, 1000)
+    counts = [rng.randint(0, markers // 10) for _ in range(5)]
+    counts.insert(1, markers - sum(counts))
+    gcn = [rng.sample(MARKERS, k=rng.randint(0, 10)) for _ in range(6)]
+    return {
+        "marker lineage": rng.choice(LINEAGES),
+        "# genomes": rng.randint(10, 5000),
+        "# markers": markers,
+        "# marker sets": rng.randint(50, 400),
+        **{k: v for k, v in zip(["0", "1", "2", "3", "4", "5+"], counts)},
+        "Completeness": round(rng.uniform(0, 100), 2),
+        "Contamination": round(rng.uniform(0, 30), 2),
+        "GC": rng.uniform(0.25, 0.75),
+        "GC std": rng.uniform(0, 0.05),
+        "Genome size": genome_size,
+        "# ambiguous bases": rng.randint(0, 100),
+        "# scaffolds": contigs,
+        "# contigs": contigs,
+        "Longest scaffold": genome_size // contigs * 3,
+        "Longest contig": genome_size // contigs * 3,
+        "N50 (scaffolds)": genome_size // contigs,
+        "N50 (contigs)": genome_size // contigs,
+        "Mean scaffold length": genome_size / contigs,
+        "Mean contig length": genome_size / contigs,
+        "Coding density": rng.uniform(0.8, 0.95),
+        "Translation table": 11,
+        "# predicted genes": genome_size // 1000,
+        **{f"GCN{k}": v for k, v in zip(["0", "1", "2", "3", "4", "5+"], gcn)},
+    }
+
+
+def write_bin_stats(fp: str, bin_ids: List[str], seed: int = 0):
+    """Writes a CheckM bin_stats_ext.tsv file with random statistics.
+
+    Args:
+        fp (str): Path to the file.
+        bin_ids (List[str]): IDs of the bins.
+        seed (int): Random seed.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(fp), exist_ok=True)
+    with open(fp, "w") as fh:
+        for bin_id in bin_ids:
+            fh.write(f"{bin_id}\t{make_bin_stats(bin_id, rng)}\n")
+
+
+def write_svg(fp: str, size: int = 20_000):
+    """Writes an SVG file similar in size to the plots drawn by CheckM.
+
+    Args:
+        fp (str): Path to the file.
+        size (int): Approximate size of the file (in bytes).
+    """
+    points = " ".join(f"L{x % 500} {x * 7 % 300}" for x in range(size // 12))
+    with open(fp, "w") as fh:
+        fh.write(
+            '<svg xmlns="http://www.w3.org/2000/svg" width="500" height="300">'
+            f'<path d="M0 0 {points}"/></svg>'
+        )
+
+
+def make_checkm_results(path: str, n_bins: int, bins_per_sample: int = 10) -> dict:
+    """Creates CheckM's bin statistics files for a synthetic cohort.
+
+    Args:
+        path (str): Directory in which the results should be created
+            (one directory per sample).
+        n_bins (int): Total number of bins.
+        bins_per_sample (int): Number of bins in every sample.
+
+    Returns:
+        dict: Paths to the bin statistics files per sample.
+    """
+    reports = {}
+    n_samples = -(-n_bins // bins_per_sample)
+    for i in range(n_samples):
+        sample = f"sample{i}"
+        n_sample_bins = min(bins_per_sample, n_bins - i * bins_per_sample)
+        bins = [f"bin{j}" for j in range(n_sample_bins)]
+        fp = os.path.join(path, sample, "storage", "bin_stats_ext.tsv")
+        write_bin_stats(fp, bins, seed=i)
+        reports[sample] = fp
+    return reports
+
+
+def make_fake_db(path: str) -> str:
+    """Creates an empty database with the layout expected by q2-checkm.
+
+    Args:
+        path (str): Directory in which the database should be created.
+
+    Returns:
+        str: Path to the database.
+    """
+    from q2_checkm.database import CHECKM_DB_LAYOUT, CHECKM_TREES
+
+    for rel_path in [*CHECKM_DB_LAYOUT, *CHECKM_TREES.values()]:
+        fp = os.path.join(path, rel_path)
+        if "." in os.path.basename(rel_path) and not rel_path.endswith(".refpkg"):
+            os.makedirs(os.path.dirname(fp), exist_ok=True)
+            with open(fp, "w") as fh:
+                fh.write(rel_path)
+        else:
+            os.makedirs(fp, exist_ok=True)
+    return path
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+"""Downloads the JavaScript/CSS libraries used by the visualizations.
+
+The libraries (and their pinned versions) are listed in the vendor.json
+manifest next to them. Once downloaded, the visualizations reference the
+bundled copies instead of loading them from the CDN. Run before installing:
+
+    python fetch-assets.py
+
+Every library is checked against the integrity hash pinned in the manifest.
+Libraries without one are skipped (and keep being loaded from the CDN).
+To pin the hash of such a library, fetch it once with --allow-unverified,
+which prints the hash to be added to vendor.json.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import urllib.request
+
+VENDOR_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "q2_checkm",
+    "assets",
+    "checkm",
+    "vendor",
+)
+
+
+def verify(content: bytes, integrity: str) -> bool:
+    """Checks the content against a subresource integrity hash."""
+    algorithm, expected = integrity.split("-", 1)
+    digest = hashlib.new(algorithm, content).digest()
+    return base64.b64encode(digest).decode("ascii") == expected
+
+
+def compute_integrity(content: bytes, algorithm: str = "sha384") -> str:
+    """Computes the subresource integrity hash of the content."""
+    digest = hashlib.new(algorithm, content).digest()
+    return f"{algorithm}-{base64.b64encode(digest).decode('ascii')}"
+
+
+def fetch(
+    vendor_dir: str = VENDOR_DIR, force: bool = False, allow_unverified: bool = False
+):
+    with open(os.path.join(vendor_dir, "vendor.json"), "r") as fh:
+        manifest = json.load(fh)
+
+    for name, asset in manifest.items():
+        fp = os.path.join(vendor_dir, asset["file"])
+        if os.path.isfile(fp) and not force:
+            print(f"{name}: {asset['file']} already present.")
+            continue
+
+        if not asset.get("integrity") and not allow_unverified:
+            print(
+                f"{name}: WARNING - skipped, as vendor.json has no integrity "
+                f"hash of {asset['url']}."
+            )
+            continue
+
+        print(f"{name}: fetching {asset['url']}...")
+        with urllib.request.urlopen(asset["url"], timeout=60) as response:
+            content = response.read()
+        if not asset.get("integrity"):
+            print(
+                f"{name}: WARNING - bundled without verification, add "
+                f'"integrity": "{compute_integrity(content)}" to vendor.json.'
+            )
+        elif not verify(content, asset["integrity"]):
+            raise ValueError(f"{name}: integrity check of {asset['url']} failed.")
+
+        # never leave a partially written file behind
+        fd, tmp_fp = tempfile.mkstemp(dir=vendor_dir, prefix=f".{asset['file']}-")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(content)
+        os.chmod(tmp_fp, 0o644)
+        os.replace(tmp_fp, fp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--force", action="store_true", help="Download the libraries again."
+    )
+    parser.add_argument(
+        "--allow-unverified",
+        action="store_true",
+        help="Bundle also the libraries without an integrity hash in the "
+        "manifest (and print their hashes).",
+    )
+    args = parser.parse_args()
+    try:
+        fetch(force=args.force, allow_unverified=args.allow_unverified)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Fetching the assets failed: {e}")
@@ -7,9 +7,26 @@
 # ----------------------------------------------------------------------------
 
 from ._version import get_versions
-from .checkm import evaluate_bins
+from .checkm import (
+    evaluate_bin_stats,
+    evaluate_bins,
+    evaluate_bins_parallel,
+    run_checkm,
+    visualize_checkm,
+)
+from .filtering import filter_mags
+from .partition import collate_checkm_results, partition_mags
 
 __version__ = get_versions()["version"]
 del get_versions
 
-__all__ = ["evaluate_bins"]
+__all__ = [
+    "evaluate_bins",
+    "evaluate_bin_stats",
+    "evaluate_bins_parallel",
+    "run_checkm",
+    "visualize_checkm",
+    "partition_mags",
+    "collate_checkm_results",
+    "filter_mags",
+]
@@ -0,0 +1,109 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import zipfile
+
+from qiime2.plugin import ValidationError, model
+
+
+class CheckMResultsFormat(model.TextFileFormat):
+    """Table with CheckM results (one row per bin)."""
+
+    REQUIRED_COLUMNS = ["sample_id", "bin_id", "completeness", "contamination"]
+
+    def _validate_(self, level):
+        with self.open() as fh:
+            header = fh.readline().rstrip("\n").split("\t")
+
+        missing = [x for x in self.REQUIRED_COLUMNS if x not in header]
+        if missing:
+            raise ValidationError(
+                f"CheckM results table is missing the following required "
+                f"columns: {', '.join(missing)}."
+            )
+
+
+class CheckMContigCoverageFormat(model.TextFileFormat):
+    """Table with the read depth of every contig (one row per contig)."""
+
+    REQUIRED_COLUMNS = ["sample_id", "bin_id", "contig_id", "mean_depth"]
+
+    def _validate_(self, level):
+        with self.open() as fh:
+            header = fh.readline().rstrip("\n").split("\t")
+
+        missing = [x for x in self.REQUIRED_COLUMNS if x not in header]
+        if missing:
+            raise ValidationError(
+                f"Contig coverage table is missing the following required "
+                f"columns: {', '.join(missing)}."
+            )
+
+
+class CheckMBinStatsFormat(model.TextFileFormat):
+    """Raw bin statistics generated by CheckM (bin_stats_ext.tsv)."""
+
+    def _validate_(self, level):
+        max_lines = {"min": 10, "max": None}[level]
+        with self.open() as fh:
+            for i, line in enumerate(fh, 1):
+                if max_lines is not None and i > max_lines:
+                    break
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) != 2 or not fields[1].startswith("{"):
+                    raise ValidationError(
+                        f"Line {i} of the CheckM bin statistics file does not "
+                        f"have the expected format (bin ID followed by a "
+                        f"dictionary of statistics)."
+                    )
+
+
+class CheckMRunInfoFormat(model.TextFileFormat):
+    """Information about a CheckM run (e.g., the chosen thread plan)."""
+
+    def _validate_(self, level):
+        try:
+            with self.open() as fh:
+                info = json.load(fh)
+        except ValueError:
+            raise ValidationError("CheckM run info file is not a valid JSON file.")
+        if not isinstance(info, dict):
+            raise ValidationError("CheckM run info file should contain a mapping.")
+
+
+class CheckMPlotsFormat(model.BinaryFileFormat):
+    """Zip archive with all the plots generated by CheckM."""
+
+    def _validate_(self, level):
+        if not zipfile.is_zipfile(str(self)):
+            raise ValidationError("CheckM plots file is not a valid zip archive.")
+
+
+class CheckMLogsFormat(model.BinaryFileFormat):
+    """Zip archive with the logs of all the CheckM jobs."""
+
+    def _validate_(self, level):
+        if not zipfile.is_zipfile(str(self)):
+            raise ValidationError("CheckM logs file is not a valid zip archive.")
+
+
+class CheckMResultsDirFmt(model.DirectoryFormat):
+    results = model.File("results.tsv", format=CheckMResultsFormat)
+    plots = model.File("checkm_plots.zip", format=CheckMPlotsFormat)
+    logs = model.File("checkm_logs.zip", format=CheckMLogsFormat, optional=True)
+    run_info = model.File("run_info.json", format=CheckMRunInfoFormat, optional=True)
+    contig_coverage = model.File(
+        "contig_coverage.tsv", format=CheckMContigCoverageFormat, optional=True
+    )
+    bin_stats = model.FileCollection(
+        r"bin_stats/.+/bin_stats_ext\.tsv", format=CheckMBinStatsFormat, optional=True
+    )
+
+    @bin_stats.set_path_maker
+    def bin_stats_path_maker(self, sample_id):
+        return f"bin_stats/{sample_id}/bin_stats_ext.tsv"
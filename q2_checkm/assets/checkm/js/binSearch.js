@@ -0,0 +1,222 @@
+function loadSearchIndex(src) {
+    // Loads the precomputed search index (written by q2_checkm/search.py)
+    // the first time it is needed. The index is a script rather than a JSON
+    // file, so that it can also be loaded when the page is opened from disk.
+    if (!loadSearchIndex.promise) {
+        loadSearchIndex.promise = new Promise(function (resolve, reject) {
+            const script = document.createElement("script")
+            script.src = src
+            script.onload = function () { resolve(prepareSearchIndex(window.checkmSearchIndex)) }
+            script.onerror = function () {
+                loadSearchIndex.promise = null
+                reject(new Error("Unable to load the search index (" + src + ")."))
+            }
+            document.head.appendChild(script)
+        })
+    }
+    return loadSearchIndex.promise
+}
+
+function prepareSearchIndex(index) {
+    // Adds the lowercase keys of every searchable column, in index order.
+    Object.keys(index.fields).forEach(function (field) {
+        const values = index.rows[field]
+        index.fields[field].keys = index.fields[field].order.map(function (row) {
+            return values[row] === null ? "" : String(values[row]).toLowerCase()
+        })
+    })
+    index.size = index.rows[index.columns[0]].length
+    return index
+}
+
+function lowerBound(keys, start, end, query) {
+    // Finds the first position within [start, end) whose key is >= query.
+    while (start < end) {
+        const mid = (start + end) >>> 1
+        if (keys[mid] < query) {
+            start = mid + 1
+        } else {
+            end = mid
+        }
+    }
+    return start
+}
+
+function searchBins(index, query) {
+    // Finds all the rows in which any of the searchable columns starts
+    // with the query. The range of the query's prefix is looked up in the
+    // index directly and narrowed down by a binary search if the query is
+    // longer than the stored prefixes. Returns the (sorted) row numbers.
+    const q = query.trim().toLowerCase()
+    if (!q) {
+        return null
+    }
+    const rows = new Set()
+    Object.keys(index.fields).forEach(function (field) {
+        const entry = index.fields[field]
+        const range = entry.prefixes[q.slice(0, index.prefix_length)]
+        if (!range) {
+            return
+        }
+        let start = range[0]
+        let end = range[1]
+        if (q.length > index.prefix_length) {
+            start = lowerBound(entry.keys, start, end, q)
+            end = lowerBound(entry.keys, start, end, q + "\uffff")
+        }
+        for (let i = start; i < end; i++) {
+            rows.add(entry.order[i])
+        }
+    })
+    return Array.from(rows).sort(function (a, b) { return a - b })
+}
+
+function VirtualTable(container, index, options) {
+    // Table of the search results in which only the visible rows (and a few
+    // around them) are kept in the DOM - rows are rendered again on scroll.
+    this.index = index
+    this.rowHeight = options.rowHeight || 32
+    this.overscan = options.overscan || 10
+    this.onSelect = options.onSelect
+    this.rows = null
+    this.selected = null
+    this.frame = null
+
+    // the header is kept in a separate table, outside of the scrolled area
+    const header = document.createElement("table")
+    header.className = "table table-sm mb-0 virtual-table-header"
+    const head = header.createTHead().insertRow()
+    index.columns.forEach(function (col) {
+        const th = document.createElement("th")
+        th.textContent = col
+        head.appendChild(th)
+    })
+    this.viewport = document.createElement("div")
+    this.viewport.className = "virtual-table"
+    this.spacer = document.createElement("div")
+    this.spacer.className = "virtual-table-spacer"
+    this.table = document.createElement("table")
+    this.table.className = "table table-sm table-hover mb-0"
+    this.body = this.table.createTBody()
+    this.spacer.appendChild(this.table)
+    this.viewport.appendChild(this.spacer)
+    container.innerHTML = ""
+    container.appendChild(header)
+    container.appendChild(this.viewport)
+
+    const self = this
+    this.viewport.addEventListener("scroll", function () { self.scheduleRender() })
+    this.table.addEventListener("click", function (event) {
+        const tr = event.target.closest("tbody tr")
+        if (tr) {
+            self.select(Number(tr.dataset.row))
+        }
+    })
+}
+
+VirtualTable.prototype.count = function () {
+    return this.rows === null ? this.index.size : this.rows.length
+}
+
+VirtualTable.prototype.rowAt = function (i) {
+    return this.rows === null ? i : this.rows[i]
+}
+
+VirtualTable.prototype.setRows = function (rows) {
+    // Shows the given rows (all the rows if null) from the top.
+    this.rows = rows
+    this.viewport.scrollTop = 0
+    this.spacer.style.height = this.count() * this.rowHeight + "px"
+    this.render()
+}
+
+VirtualTable.prototype.scheduleRender = function () {
+    const self = this
+    if (this.frame === null) {
+        this.frame = requestAnimationFrame(function () {
+            self.frame = null
+            self.render()
+        })
+    }
+}
+
+VirtualTable.prototype.render = function () {
+    const visible = Math.ceil(this.viewport.clientHeight / this.rowHeight)
+    const first = Math.max(
+        0, Math.floor(this.viewport.scrollTop / this.rowHeight) - this.overscan
+    )
+    const last = Math.min(this.count(), first + visible + 2 * this.overscan)
+    const columns = this.index.columns
+    const values = this.index.rows
+
+    const body = document.createElement("tbody")
+    for (let i = first; i < last; i++) {
+        const row = this.rowAt(i)
+        const tr = body.insertRow()
+        tr.dataset.row = row
+        tr.style.height = this.rowHeight + "px"
+        if (row === this.selected) {
+            tr.classList.add("table-active")
+        }
+        columns.forEach(function (col) {
+            const value = values[col][row]
+            tr.insertCell().textContent = value === null ? "" : value
+        })
+    }
+    this.table.replaceChild(body, this.body)
+    this.body = body
+    this.table.style.top = first * this.rowHeight + "px"
+}
+
+VirtualTable.prototype.select = function (row) {
+    this.selected = row
+    this.render()
+    if (this.onSelect) {
+        this.onSelect(row)
+    }
+}
+
+function setupBinSearch(input, container, status, options) {
+    // Connects the search box to the results table. The index is only
+    // loaded once the search box is used for the first time.
+    let table = null
+    let pending = null
+
+    function update() {
+        const start = performance.now()
+        const rows = searchBins(table.index, input.value)
+        table.setRows(rows)
+        const count = table.count()
+        status.textContent = (rows === null ? "Showing all " : "Found ") +
+            count + " bin(s) in " + (performance.now() - start).toFixed(1) + " ms."
+    }
+
+    function init() {
+        status.textContent = "Loading the search index..."
+        return loadSearchIndex(options.src).then(function (index) {
+            container.hidden = false
+            table = new VirtualTable(container, index, {onSelect: options.onSelect})
+            update()
+        }).catch(function (error) {
+            status.textContent = error.message
+            // try again the next time the search box is used
+            pending = null
+        })
+    }
+
+    input.addEventListener("focus", function () {
+        if (!pending) {
+            pending = init()
+        }
+    })
+    input.addEventListener("input", function () {
+        if (!pending) {
+            pending = init()
+        }
+        pending.then(function () {
+            if (table) {
+                update()
+            }
+        })
+    })
+}
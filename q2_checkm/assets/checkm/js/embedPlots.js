@@ -0,0 +1,83 @@
+function embedPlots(specs, containers, options) {
+    // Embeds the Vega-Lite specs into their containers. The first spec is
+    // embedded right away, the remaining ones only once their container is
+    // scrolled into view. Selection stores listed in options.sharedStores
+    // are copied from the first view into all the other views, so that
+    // their plots are filtered using the same selections.
+    const embedOptions = {renderer: options.renderer || "canvas"}
+    const sharedStores = options.sharedStores || []
+    const timings = []
+    let primaryView = null
+
+    function reportRenderTime() {
+        const total = timings.reduce(function (a, b) { return a + b }, 0)
+        const element = document.getElementById("render-time")
+        if (element) {
+            element.textContent = "Rendered " + timings.length + " of " +
+                specs.length + " plot view(s) in " + total.toFixed(0) +
+                " ms using the " + embedOptions.renderer + " renderer."
+        }
+    }
+
+    function shareStores(view) {
+        sharedStores.forEach(function (store) {
+            const copy = function () {
+                const tuples = primaryView.data(store).map(function (t) {
+                    return {unit: t.unit, fields: t.fields, values: t.values}
+                })
+                view.data(store, tuples).runAsync()
+            }
+            copy()
+            primaryView.addDataListener(store, copy)
+        })
+    }
+
+    function embed(i) {
+        const start = performance.now()
+        return vegaEmbed(containers[i], specs[i], embedOptions).then(function (result) {
+            result.view.logLevel(vega.Warn)
+            if (i === 0) {
+                primaryView = result.view
+            } else {
+                shareStores(result.view)
+            }
+            return new Promise(function (resolve) {
+                // wait for the browser to paint the view
+                requestAnimationFrame(function () {
+                    timings.push(performance.now() - start)
+                    reportRenderTime()
+                    resolve(result)
+                })
+            })
+        }).catch(function (error) {
+            // From 'js-error-handler.html'
+            handleErrors([error], $(containers[i]))
+        })
+    }
+
+    return embed(0).then(function (result) {
+        if (!result) {
+            return result
+        }
+        if (options.onPrimary) {
+            options.onPrimary(result)
+        }
+        const deferred = containers.slice(1)
+        if (!("IntersectionObserver" in window)) {
+            deferred.forEach(function (_, i) { embed(i + 1) })
+            return result
+        }
+        const observer = new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target)
+                    embed(containers.indexOf("#" + entry.target.id))
+                }
+            })
+        }, {rootMargin: "200px"})
+        deferred.forEach(function (container) {
+            observer.observe(document.querySelector(container))
+        })
+        return result
+    })
+}
@@ -5,33 +5,136 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import contextlib
 import glob
+import importlib.resources
 import json
 import os
-import tempfile
+import shutil
+import subprocess
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-from distutils.dir_util import copy_tree
-from typing import Mapping
+from typing import List, Mapping
 from zipfile import ZipFile
 
+import numpy as np
 import pandas as pd
-import pkg_resources
-import q2templates
-from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+from q2_types.per_sample_sequences import BAMDirFmt, MultiMAGSequencesDirFmt
 
-from q2_checkm.plots import _draw_detailed_plots, _draw_overview_plots
+from q2_checkm._format import CheckMResultsDirFmt
+from q2_checkm.coverage import _calculate_coverage
+from q2_checkm.database import _staged_db, _validate_checkm_db
+from q2_checkm.jobqueue import LOG_TAIL_LINES, _JobQueue
+from q2_checkm.progress import _ProgressTracker
+from q2_checkm.rendering import _copy_assets, _get_vendor_assets
+from q2_checkm.resources import (
+    _get_available_cpus,
+    _get_available_memory,
+    _plan_threads,
+)
+from q2_checkm.resume import (
+    _get_bins_key,
+    _get_resume_dir,
+    _restore_sample,
+    _save_sample,
+)
+from q2_checkm.search import _write_search_index
+from q2_checkm.stats import _calculate_sequence_stats, _prefilter_bins
 from q2_checkm.utils import (
+    INTERMEDIATES_SIZE_FACTOR,
+    _get_log_fp,
     _get_plots_per_sample,
+    _link_or_copy,
     _process_checkm_arg,
     _process_common_input_params,
+    _ScratchSpace,
+    _stage_bins,
+    _zip_logs,
     run_command,
 )
 
-TEMPLATES = pkg_resources.resource_filename("q2_checkm", "assets")
+try:
+    TEMPLATES = str(importlib.resources.files("q2_checkm") / "assets")
+except AttributeError:  # Python < 3.9
+    TEMPLATES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# mapping of CheckM's report fields to the results table columns
+CHECKM_COLUMNS = {
+    "index": "bin_id",
+    "marker lineage": "marker_lineage",
+    "# genomes": "genomes",
+    "# markers": "markers",
+    "# marker sets": "marker_sets",
+    "0": "count0",
+    "1": "count1",
+    "2": "count2",
+    "3": "count3",
+    "4": "count4",
+    "5+": "count5_or_more",
+    "Completeness": "completeness",
+    "Contamination": "contamination",
+    "GC": "gc",
+    "GC std": "gc_std",
+    "Genome size": "genome_size",
+    "# ambiguous bases": "ambiguous_bases",
+    "# scaffolds": "scaffolds",
+    "# contigs": "contigs",
+    "Longest scaffold": "longest_scaffold",
+    "Longest contig": "longest_contig",
+    "N50 (scaffolds)": "n50_scaffolds",
+    "N50 (contigs)": "n50_contigs",
+    "Mean scaffold length": "mean_scaffold_length",
+    "Mean contig length": "mean_contig_length",
+    "Coding density": "coding_density",
+    "Translation table": "translation_table",
+    "# predicted genes": "predicted_genes",
+    "GCN0": "gcn0",
+    "GCN1": "gcn1",
+    "GCN2": "gcn2",
+    "GCN3": "gcn3",
+    "GCN4": "gcn4",
+    "GCN5+": "gcn5_or_more",
+}
+
+# completeness categories and MIMAG quality tiers assigned to bins,
+# from the best to the worst
+QC_CATEGORIES = ["near", "substantial", "moderate", "partial", "not evaluated"]
+MIMAG_TIERS = ["high", "medium", "low", "contaminated", "not evaluated"]
+
+# parameters of run_checkm/evaluate_bins which should not be passed to CheckM
+NON_CHECKM_PARAMS = [
+    "output_dir",
+    "bins",
+    "db_path",
+    "db_cache_dir",
+    "scratch_dir",
+    "ram_disk_budget",
+    "keep_intermediates",
+    "min_genome_size",
+    "min_n50",
+    "max_contigs",
+    "queue_dir",
+    "auto_threads",
+    "alignments",
+    "progress_file",
+    "continue_on_error",
+    "resume_dir",
+]
 
 
 def _evaluate_bins(
-    results_dir: str, bins: MultiMAGSequencesDirFmt, db_path: str, common_args: list
+    results_dir: str,
+    bins: MultiMAGSequencesDirFmt,
+    db_path: str,
+    common_args: list,
+    scratch: _ScratchSpace = None,
+    job_queue: _JobQueue = None,
+    concurrency: int = 1,
+    progress: _ProgressTracker = None,
+    failures: list = None,
+    resume_dir: str = None,
+    log_dir: str = None,
 ) -> dict:
     """Evaluates bins for all samples using CheckM.
 
@@ -40,35 +143,213 @@ def _evaluate_bins(
         bins (MultiMAGSequencesDirFmt): The bins to be analyzed.
         db_path (str): Path to the CheckM database.
         common_args (list): List of common arguments to be passed to CheckM.
+        scratch (_ScratchSpace): Scratch space used to allocate per-sample
+            results directories (e.g., on a RAM disk). If not provided,
+            the directories are created directly inside the results_dir.
+        job_queue (_JobQueue): Job queue to which per-sample CheckM runs
+            should be submitted. The bins and results are then stored in
+            the queue's run directory and the per-sample results directories
+            are linked into the results_dir once all the jobs are finished.
+            If not provided, CheckM is run locally.
+        concurrency (int): Number of samples to be evaluated at the same
+            time when running CheckM locally.
+        progress (_ProgressTracker): Tracker to which the start and end
+            of every sample's lineage_wf job should be reported.
+        failures (list): If provided, samples which could not be evaluated
+            are recorded in this list (see _get_failure_record) and all the
+            other samples are still evaluated. Otherwise, the first failure
+            is raised.
+        resume_dir (str): Run's directory in the resume directory (see
+            _get_resume_dir). Samples with results saved there are not
+            evaluated again and the results of all the newly evaluated
+            samples are saved there.
+        log_dir (str): Directory into which CheckM's output should be
+            written, one log per sample and stage (see _get_log_fp). If not
+            provided, the output is printed.
 
     Returns:
-        dict: Dictionary containing the paths to the generated reports.
+        dict: Dictionary containing the paths to the generated reports
+            of all the successfully evaluated samples.
     """
+    progress = progress or _ProgressTracker(verbose=False)
     base_cmd = ["checkm", "lineage_wf", *common_args]
-    stats_fps = {}
+    stats_fps, jobs, local_runs = {}, {}, {}
+
+    if job_queue is not None:
+        # workers need to see the bins, so they are staged in the queue
+        bins = _stage_bins(
+            bins, os.path.join(job_queue.run_dir, "bins"), allow_symlinks=False
+        )
+        os.makedirs(results_dir, exist_ok=True)
 
     manifest: pd.DataFrame = bins.manifest.view(pd.DataFrame)
     manifest["sample_dir"] = manifest.filename.apply(lambda x: os.path.dirname(x))
+    manifest["size"] = manifest.filename.apply(lambda x: os.path.getsize(x))
+    sample_sizes = manifest.groupby("sample_dir")["size"].sum()
     sample_dirs = manifest["sample_dir"].unique()
+    # bins of every sample, used to check whether saved results still apply
+    bins_keys = (
+        {
+            os.path.split(sample_dir)[-1]: _get_bins_key(sample_bins["filename"])
+            for sample_dir, sample_bins in manifest.groupby("sample_dir")
+        }
+        if resume_dir
+        else {}
+    )
     for sample_dir in sample_dirs:
         sample = os.path.split(sample_dir)[-1]
-        sample_results = os.path.join(results_dir, sample)
+        if job_queue is not None:
+            sample_results = os.path.join(job_queue.run_dir, "results", sample)
+        elif scratch is not None:
+            sample_results = scratch.make_sample_dir(
+                results_dir,
+                sample,
+                estimated_size=sample_sizes[sample_dir] * INTERMEDIATES_SIZE_FACTOR,
+            )
+        else:
+            sample_results = os.path.join(results_dir, sample)
+
+        if resume_dir and _restore_sample(
+            resume_dir,
+            sample,
+            bins_keys[sample],
+            os.path.join(results_dir, sample),
+        ):
+            print(f"Results of sample {sample} were restored from {resume_dir}.")
+            stats_fps[sample] = _get_stats_fp(os.path.join(results_dir, sample))
+            progress.skip("lineage_wf", sample)
+            continue
 
         cmd = deepcopy(base_cmd)
         cmd.extend(["-x", "fasta", sample_dir, sample_results])
-        run_command(cmd, env={**os.environ, "CHECKM_DATA_PATH": db_path})
+        if job_queue is not None:
+            jobs[sample] = job_queue.submit(sample, cmd, db_path, sample_results)
+            progress.start("lineage_wf", sample)
+        else:
+            local_runs[sample] = (cmd, sample_results)
+
+    def _evaluate_sample(sample: str, cmd: list, sample_results: str) -> str:
+        with progress.track("lineage_wf", sample):
+            run_command(
+                cmd,
+                env={**os.environ, "CHECKM_DATA_PATH": db_path},
+                log_fp=_get_log_fp(log_dir, sample, "lineage_wf"),
+            )
+            stats_fp = _get_stats_fp(sample_results)
+        if scratch is not None:
+            scratch.release(sample_results, stage="lineage_wf")
+        if resume_dir:
+            _save_sample(resume_dir, sample, bins_keys[sample], sample_results)
+        return stats_fp
 
-        stats_fp = os.path.join(sample_results, "storage", "bin_stats_ext.tsv")
-        if os.path.isfile(stats_fp):
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            sample: executor.submit(_evaluate_sample, sample, *run)
+            for sample, run in local_runs.items()
+        }
+        for sample, future in futures.items():
+            try:
+                stats_fps[sample] = future.result()
+            except (subprocess.CalledProcessError, FileNotFoundError) as e:
+                if failures is None:
+                    raise
+                failures.append(_get_failure_record(sample, "lineage_wf", e))
+
+    if jobs:
+        outcomes = job_queue.wait(jobs.values())
+        for sample, job_id in jobs.items():
+            progress.finish(
+                "lineage_wf", sample, failed=outcomes[job_id]["returncode"] != 0
+            )
+        for sample, job_id in jobs.items():
+            outcome = outcomes[job_id]
+            sample_results = os.path.join(job_queue.run_dir, "results", sample)
+            queue_log_fp = os.path.join(job_queue.run_dir, f"{sample}.log")
+            if log_dir and os.path.isfile(queue_log_fp):
+                log_fp = _get_log_fp(log_dir, sample, "lineage_wf")
+                os.makedirs(os.path.dirname(log_fp), exist_ok=True)
+                shutil.copyfile(queue_log_fp, log_fp)
+            try:
+                if outcome["returncode"] != 0:
+                    raise subprocess.CalledProcessError(
+                        outcome["returncode"],
+                        base_cmd,
+                        output=outcome["log_tail"],
+                    )
+                stats_fp = _get_stats_fp(sample_results)
+            except (subprocess.CalledProcessError, FileNotFoundError) as e:
+                if failures is None:
+                    raise
+                failures.append(_get_failure_record(sample, "lineage_wf", e))
+                continue
+            os.symlink(sample_results, os.path.join(results_dir, sample))
             stats_fps[sample] = stats_fp
-        else:
-            raise FileNotFoundError(f"CheckM stats file {stats_fp} could not be found.")
+            if scratch is not None:
+                scratch.release(sample_results, stage="lineage_wf")
+            if resume_dir:
+                _save_sample(resume_dir, sample, bins_keys[sample], sample_results)
 
     return stats_fps
 
 
+def _get_stats_fp(sample_results: str) -> str:
+    """Finds the bin statistics file generated by CheckM's lineage_wf.
+
+    Args:
+        sample_results (str): CheckM's results directory of a sample.
+
+    Returns:
+        str: Path to the bin statistics file.
+    """
+    stats_fp = os.path.join(sample_results, "storage", "bin_stats_ext.tsv")
+    if not os.path.isfile(stats_fp):
+        raise FileNotFoundError(f"CheckM stats file {stats_fp} could not be found.")
+    return stats_fp
+
+
+def _format_failures(failures: List[dict]) -> str:
+    """Formats failure records (see _get_failure_record) for display."""
+    return "\n".join(
+        f"{x['sample_id']} ({x['stage']}, exit code {x['returncode']}): "
+        f"{x['error'].splitlines()[-1] if x['error'] else ''}"
+        for x in failures
+    )
+
+
+def _get_failure_record(sample: str, stage: str, error: Exception) -> dict:
+    """Describes the failure of a sample's CheckM job.
+
+    Args:
+        sample (str): The sample ID.
+        stage (str): The stage which failed (e.g., lineage_wf or gc_plot).
+        error (Exception): The raised error.
+
+    Returns:
+        dict: Failure record with the sample ID, the stage, CheckM's exit
+            code (if it was run) and the last lines of its error output
+            (or the error message).
+    """
+    if isinstance(error, subprocess.CalledProcessError):
+        message = error.stderr or error.output or str(error)
+    else:
+        message = str(error)
+    return {
+        "sample_id": sample,
+        "stage": stage,
+        "returncode": getattr(error, "returncode", None),
+        "error": "\n".join(message.rstrip().splitlines()[-LOG_TAIL_LINES:]),
+    }
+
+
 def _draw_checkm_plots(
-    results_dir: str, bins: MultiMAGSequencesDirFmt, db_path: str, plot_type: str = "gc"
+    results_dir: str,
+    bins: MultiMAGSequencesDirFmt,
+    db_path: str,
+    plot_type: str = "gc",
+    scratch: _ScratchSpace = None,
+    progress: _ProgressTracker = None,
+    failures: list = None,
+    log_dir: str = None,
 ) -> dict:
     """Draws CheckM plots for all samples.
 
@@ -77,6 +358,16 @@ def _draw_checkm_plots(
         bins (MultiMAGSequencesDirFmt): The bins to be analyzed.
         db_path (str): The path to the CheckM database.
         plot_type (str): The type of plot to be drawn (one of: gc/nx/coding).
+        scratch (_ScratchSpace): Scratch space holding CheckM's intermediate
+            files - those not required anymore will be released once
+            the plots are drawn.
+        progress (_ProgressTracker): Tracker to which the start and end
+            of every sample's plotting job should be reported.
+        failures (list): If provided, samples whose plots could not be drawn
+            are recorded in this list and left out of the returned plots.
+            Otherwise, the first failure is raised.
+        log_dir (str): Directory into which CheckM's output should be
+            written (see _get_log_fp). If not provided, the output is printed.
 
     Returns:
         dict: A dictionary containing the paths to the generated plots in a
@@ -92,6 +383,7 @@ def _draw_checkm_plots(
         "--font_size",
         "10",
     ]
+    progress = progress or _ProgressTracker(verbose=False)
     # TODO: the numbers should probably be configurable
     dist_values = [] if plot_type == "nx" else ["50", "75", "90"]
     plots = {}
@@ -103,12 +395,26 @@ def _draw_checkm_plots(
         sample = os.path.split(sample_bins)[-1]
         sample_plots = os.path.join(results_dir, "plots", plot_type, sample)
         checkm_files = os.path.join(results_dir, sample)
-        plots[sample] = sample_plots
 
         cmd = deepcopy(base_cmd)
         cmd.append(checkm_files) if plot_type == "coding" else False
         cmd.extend([sample_bins, sample_plots, *dist_values])
-        run_command(cmd, env={**os.environ, "CHECKM_DATA_PATH": db_path})
+        try:
+            with progress.track(f"{plot_type}_plot", sample):
+                run_command(
+                    cmd,
+                    env={**os.environ, "CHECKM_DATA_PATH": db_path},
+                    log_fp=_get_log_fp(log_dir, sample, f"{plot_type}_plot"),
+                )
+        except subprocess.CalledProcessError as e:
+            if failures is None:
+                raise
+            failures.append(_get_failure_record(sample, f"{plot_type}_plot", e))
+            continue
+        plots[sample] = sample_plots
+
+        if scratch is not None and plot_type == "coding":
+            scratch.release(checkm_files, stage="coding_plot")
     return plots
 
 
@@ -121,6 +427,9 @@ def _parse_checkm_reports(reports: Mapping[str, str]) -> pd.DataFrame:
     Returns:
         pd.DataFrame: A pandas DataFrame containing the parsed CheckM metrics.
     """
+    if not reports:
+        return pd.DataFrame(columns=["sample_id", *CHECKM_COLUMNS.values()])
+
     dfs = [_parse_single_checkm_report(_id, fp) for _id, fp in reports.items()]
     results_df = pd.concat(dfs)
     results_df.reset_index(drop=True, inplace=True)
@@ -148,69 +457,95 @@ def _parse_single_checkm_report(sample_id: str, report_fp: str) -> pd.DataFrame:
     # convert report to DataFrame
     df = pd.DataFrame.from_dict(stats, orient="index")
     df.reset_index(drop=False, inplace=True)
-    col_names = {
-        "index": "bin_id",
-        "marker lineage": "marker_lineage",
-        "# genomes": "genomes",
-        "# markers": "markers",
-        "# marker sets": "marker_sets",
-        "0": "count0",
-        "1": "count1",
-        "2": "count2",
-        "3": "count3",
-        "4": "count4",
-        "5+": "count5_or_more",
-        "Completeness": "completeness",
-        "Contamination": "contamination",
-        "GC": "gc",
-        "GC std": "gc_std",
-        "Genome size": "genome_size",
-        "# ambiguous bases": "ambiguous_bases",
-        "# scaffolds": "scaffolds",
-        "# contigs": "contigs",
-        "Longest scaffold": "longest_scaffold",
-        "Longest contig": "longest_contig",
-        "N50 (scaffolds)": "n50_scaffolds",
-        "N50 (contigs)": "n50_contigs",
-        "Mean scaffold length": "mean_scaffold_length",
-        "Mean contig length": "mean_contig_length",
-        "Coding density": "coding_density",
-        "Translation table": "translation_table",
-        "# predicted genes": "predicted_genes",
-        "GCN0": "gcn0",
-        "GCN1": "gcn1",
-        "GCN2": "gcn2",
-        "GCN3": "gcn3",
-        "GCN4": "gcn4",
-        "GCN5+": "gcn5_or_more",
-    }
-    df.rename(columns=col_names, inplace=True)
+    df.rename(columns=CHECKM_COLUMNS, inplace=True)
     df["sample_id"] = sample_id
 
     # reorder columns
-    df = df[["sample_id", *col_names.values()]]
+    df = df[["sample_id", *CHECKM_COLUMNS.values()]]
 
     return df
 
 
-def _classify_completeness(completeness: float) -> str:
-    """Converts CheckM's completeness score into one of four
+def _classify_completeness(completeness: pd.Series) -> pd.Series:
+    """Converts CheckM's completeness scores into one of four
         completeness categories.
 
     Args:
-        completeness (float): CheckM's completeness score (0-100).
+        completeness (pd.Series): CheckM's completeness scores (0-100).
 
     Returns:
-        str: One of four completeness categories.
+        pd.Series: One of four completeness categories per bin or
+            "not evaluated" if the completeness is not available
+            (categorical, see QC_CATEGORIES).
     """
-    if completeness >= 90.0:
-        return "near"
-    elif 90.0 > completeness >= 70.0:
-        return "substantial"
-    elif 70.0 > completeness >= 50.0:
-        return "moderate"
-    else:
-        return "partial"
+    codes = np.select(
+        [
+            completeness.isna(),
+            completeness >= 90.0,
+            completeness >= 70.0,
+            completeness >= 50.0,
+        ],
+        [4, 0, 1, 2],
+        default=3,
+    )
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=QC_CATEGORIES),
+        index=completeness.index,
+    )
+
+
+def _classify_mimag_quality(
+    completeness: pd.Series, contamination: pd.Series
+) -> pd.Series:
+    """Assigns MIMAG quality tiers to bins based on CheckM's estimates.
+
+    The tiers follow the MIMAG standard (Bowers et al., 2017): high-quality
+    drafts are >90% complete with <5% contamination, medium-quality drafts
+    are >=50% complete with <10% contamination and low-quality drafts are
+    <50% complete with <10% contamination. The presence of rRNA and tRNA
+    genes (also required for high-quality drafts) is not assessed.
+
+    Args:
+        completeness (pd.Series): CheckM's completeness scores (0-100).
+        contamination (pd.Series): CheckM's contamination scores.
+
+    Returns:
+        pd.Series: The quality tier per bin, "contaminated" if the bin does
+            not meet any of the tiers or "not evaluated" if any of the
+            scores is not available (categorical, see MIMAG_TIERS).
+    """
+    codes = np.select(
+        [
+            completeness.isna() | contamination.isna(),
+            contamination >= 10.0,
+            (completeness > 90.0) & (contamination < 5.0),
+            completeness >= 50.0,
+        ],
+        [4, 3, 0, 1],
+        default=2,
+    )
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=MIMAG_TIERS),
+        index=completeness.index,
+    )
+
+
+def _classify_bins(results: pd.DataFrame) -> pd.DataFrame:
+    """Adds the completeness categories and MIMAG quality tiers to results.
+
+    Args:
+        results (pd.DataFrame): The CheckM results.
+
+    Returns:
+        pd.DataFrame: A copy of the results with the qc_category and
+            mimag_quality columns.
+    """
+    results = results.copy()
+    results["qc_category"] = _classify_completeness(results["completeness"])
+    results["mimag_quality"] = _classify_mimag_quality(
+        results["completeness"], results["contamination"]
+    )
+    return results
 
 
 def _zip_checkm_plots(plots_per_sample: Mapping[str, Mapping[str, str]], zip_path: str):
@@ -235,93 +570,551 @@ def _zip_checkm_plots(plots_per_sample: Mapping[str, Mapping[str, str]], zip_pat
                 zf.write(plot_fp, arcname=arcname)
 
 
-def evaluate_bins(
+def _render_report(output_dir: str, context: dict, templates: List[str]):
+    """Renders visualization templates and copies all the required assets.
+
+    JS/CSS libraries are referenced locally if they are bundled with
+    the plugin (see _get_vendor_assets).
+
+    Args:
+        output_dir (str): The visualization's output directory.
+        context (dict): Context to be used when rendering the templates.
+        templates (List[str]): Names of the templates to be rendered.
+    """
+    import q2templates
+
+    templates_dir = os.path.join(TEMPLATES, "checkm")
+    context = {**context, "vendor": _get_vendor_assets(templates_dir)}
+    _copy_assets(templates_dir, output_dir)
+
+    templates = [os.path.join(templates_dir, x) for x in templates]
+    q2templates.render(templates, output_dir, context=context)
+
+    # until Bootstrap 3 is replaced with v5, remove the v3 scripts as
+    # the HTML files are adjusted to work with v5
+    os.remove(os.path.join(output_dir, "q2templateassets", "css", "bootstrap.min.css"))
+    os.remove(os.path.join(output_dir, "q2templateassets", "js", "bootstrap.min.js"))
+
+
+def _get_thread_plan(bins: MultiMAGSequencesDirFmt, params: dict) -> dict:
+    """Decides how many threads CheckM should use.
+
+    Args:
+        bins (MultiMAGSequencesDirFmt): The bins to be analyzed.
+        params (dict): Parameters of the calling action.
+
+    Returns:
+        dict: Number of concurrently evaluated samples (concurrency) as well
+            as threads and pplacer_threads to be used for every sample. If
+            auto_threads is set, these are derived from the number of bins
+            and the available CPUs and memory - otherwise, the values
+            provided by the user are used.
+    """
+    if not params.get("auto_threads"):
+        return {
+            "auto_threads": False,
+            "concurrency": 1,
+            "threads": params.get("threads"),
+            "pplacer_threads": params.get("pplacer_threads"),
+        }
+
+    if params.get("threads") or params.get("pplacer_threads"):
+        warnings.warn(
+            "The threads and pplacer_threads parameters are ignored "
+            "when auto_threads is enabled."
+        )
+    manifest: pd.DataFrame = bins.manifest.view(pd.DataFrame).reset_index()
+    plan = _plan_threads(
+        manifest.groupby("sample-id").size().tolist(),
+        cpus=_get_available_cpus(),
+        memory=_get_available_memory(),
+        reduced_tree=bool(params.get("reduced_tree")),
+    )
+    print(
+        f"Evaluating {plan['concurrency']} sample(s) at a time using "
+        f"{plan['threads']} thread(s) and {plan['pplacer_threads']} pplacer "
+        f"thread(s) each."
+    )
+    return {"auto_threads": True, **plan}
+
+
+def _run_checkm(
     output_dir: str,
     bins: MultiMAGSequencesDirFmt,
-    db_path: str,
-    reduced_tree: bool = None,
-    unique: int = None,
-    multi: int = None,
-    force_domain: bool = None,
-    no_refinement: bool = None,
-    individual_markers: bool = None,
-    skip_adj_correction: bool = None,
-    skip_pseudogene_correction: bool = None,
-    aai_strain: float = None,
-    ignore_thresholds: bool = None,
-    e_value: float = None,
-    length: float = None,
-    threads: int = None,
-    pplacer_threads: int = None,
-):
+    params: dict,
+    raw_stats_dir: str = None,
+    alignments: BAMDirFmt = None,
+) -> pd.DataFrame:
+    """Runs CheckM on all the bins and collects its results.
 
-    kwargs = {
-        k: v for k, v in locals().items() if k not in ["output_dir", "bins", "db_path"]
-    }
-    common_args = _process_common_input_params(
-        processing_func=_process_checkm_arg, params=kwargs
+    The results table (results.tsv), the archive with all the plots
+    generated by CheckM (checkm_plots.zip) and the archive with the logs
+    of all the CheckM jobs (checkm_logs.zip) are written into the output_dir.
+    If read alignments are provided, the read depth of every contig is
+    written into contig_coverage.tsv and the bins' mean depth and covered
+    fraction are added to the results table.
+
+    Args:
+        output_dir (str): Location where the results should be stored.
+        bins (MultiMAGSequencesDirFmt): The bins to be analyzed.
+        params (dict): Parameters of the calling action.
+        raw_stats_dir (str): Location where CheckM's raw bin statistics
+            (bin_stats_ext.tsv) should be stored, one directory per sample.
+            They are not kept if not provided.
+        alignments (BAMDirFmt): Reads of every sample aligned to its
+            contigs, used to calculate the bins' coverage.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame containing the CheckM results.
+    """
+    checkm_params = {k: v for k, v in params.items() if k not in NON_CHECKM_PARAMS}
+    db_path, threads = params["db_path"], params.get("threads")
+    if params.get("auto_threads"):
+        threads = _get_available_cpus()
+    min_genome_size, min_n50, max_contigs = (
+        params.get("min_genome_size"),
+        params.get("min_n50"),
+        params.get("max_contigs"),
+    )
+
+    # fail early if CheckM's database is not available
+    db_fingerprint = _validate_checkm_db(
+        db_path, reduced_tree=bool(params.get("reduced_tree"))
+    )
+
+    ram_disk_budget = params.get("ram_disk_budget")
+    scratch = _ScratchSpace(
+        scratch_dir=params.get("scratch_dir"),
+        ram_disk_budget=ram_disk_budget * 1024**2 if ram_disk_budget else None,
+        keep_intermediates=bool(params.get("keep_intermediates")),
     )
+    db_cache_dir = params.get("db_cache_dir")
+    queue_dir = params.get("queue_dir")
+    queue = _JobQueue(queue_dir) if queue_dir else contextlib.nullcontext()
+    progress = _ProgressTracker(params.get("progress_file"))
+    with _staged_db(
+        db_path, db_cache_dir, db_fingerprint
+    ) as checkm_db, scratch, queue as job_queue, progress:
+        results_dir = os.path.join(scratch.path, "results")
+        # CheckM's output is kept per job - only a summary is printed
+        log_dir = os.path.join(scratch.path, "logs")
+        input_bins = bins
 
-    # TODO: check that CheckM's database is available (or fetch?)
+        # only send bins which pass the sequence statistics thresholds
+        # to CheckM - the remaining ones will only get stats-only rows
+        filtered_stats = None
+        if any([min_genome_size, min_n50, max_contigs]):
+            stats = _calculate_sequence_stats(bins, threads=threads or 1)
+            passed = _prefilter_bins(stats, min_genome_size, min_n50, max_contigs)
+            passed_bins = set(zip(stats["sample_id"][passed], stats["bin_id"][passed]))
+            filtered_stats = stats[~passed]
+            print(
+                f"{len(filtered_stats)} out of {len(stats)} bins did not pass "
+                f"the sequence statistics thresholds and will not be evaluated "
+                f"by CheckM."
+            )
+            bins = _stage_bins(
+                bins,
+                os.path.join(scratch.path, "bins"),
+                bin_filter=lambda sample, mag: (sample, mag) in passed_bins,
+            )
 
-    with tempfile.TemporaryDirectory() as tmp:
-        results_dir = os.path.join(tmp, "results")
+        thread_plan = _get_thread_plan(bins, params)
+        checkm_params["threads"] = thread_plan["threads"]
+        checkm_params["pplacer_threads"] = thread_plan["pplacer_threads"]
+        common_args = _process_common_input_params(
+            processing_func=_process_checkm_arg, params=checkm_params
+        )
+        run_info = {"thread_plan": thread_plan}
+        with open(os.path.join(output_dir, "run_info.json"), "w") as fh:
+            json.dump(run_info, fh, indent=2)
+
+        # failures of individual samples are only recorded (and not raised)
+        # when continuing on errors
+        failures = [] if params.get("continue_on_error") else None
+        resume_dir = params.get("resume_dir")
+        if resume_dir:
+            resume_dir = _get_resume_dir(resume_dir, db_fingerprint, checkm_params)
+
+        # register all the jobs upfront so that the pending ones are known -
+        # queued jobs may all run at the same time on separate workers
+        bins_per_sample = bins.manifest.view(pd.DataFrame).groupby(level=0).size()
+        progress.add_jobs(
+            "lineage_wf",
+            bins_per_sample,
+            concurrency=(
+                len(bins_per_sample)
+                if job_queue is not None
+                else thread_plan["concurrency"]
+            ),
+        )
+        for plot_type in ["gc", "nx", "coding"]:
+            progress.add_jobs(f"{plot_type}_plot", bins_per_sample)
 
         # run CheckM's lineage_wf pipeline, draw all the QC plots and zip
-        # them into a single archive for download
-        reports = _evaluate_bins(results_dir, bins, db_path, common_args)
+        # them into a single archive for download - queued jobs run on
+        # other nodes which need to use the shared database
+        reports = _evaluate_bins(
+            results_dir,
+            bins,
+            db_path if job_queue is not None else checkm_db,
+            common_args,
+            scratch,
+            job_queue,
+            concurrency=thread_plan["concurrency"],
+            progress=progress,
+            failures=failures,
+            resume_dir=resume_dir,
+            log_dir=log_dir,
+        )
+        if failures:
+            # failed samples are not plotted
+            failed = {x["sample_id"] for x in failures}
+            for sample in failed:
+                for plot_type in ["gc", "nx", "coding"]:
+                    progress.skip(f"{plot_type}_plot", sample)
+            bins = _stage_bins(
+                bins,
+                os.path.join(scratch.path, "bins_evaluated"),
+                bin_filter=lambda sample, mag: sample not in failed,
+            )
+
         all_plots = {}
         for plot_type in ["gc", "nx", "coding"]:
             plot_dirs = _draw_checkm_plots(
-                results_dir, bins, db_path, plot_type=plot_type
+                results_dir,
+                bins,
+                checkm_db,
+                plot_type=plot_type,
+                scratch=scratch,
+                progress=progress,
+                failures=failures,
+                log_dir=log_dir,
             )
             all_plots[f"plots_{plot_type}"] = plot_dirs
+        if failures:
+            # samples missing any of the plots are left out of the archive
+            plotted = set.intersection(*[set(x) for x in all_plots.values()])
+            all_plots = {
+                k: {sample: v[sample] for sample in v if sample in plotted}
+                for k, v in all_plots.items()
+            }
+        print(f"Peak scratch space usage: {scratch.peak_usage / 1024**2:.2f} MB")
 
         plots_per_sample = _get_plots_per_sample(all_plots)
 
         _zip_checkm_plots(
             plots_per_sample, os.path.join(output_dir, "checkm_plots.zip")
         )
+        _zip_logs(log_dir, os.path.join(output_dir, "checkm_logs.zip"))
 
-        # TODO: calculate bin coverage and add one more plot
-        #  (depth vs. genome size)
+        if raw_stats_dir:
+            for sample, stats_fp in reports.items():
+                os.makedirs(os.path.join(raw_stats_dir, sample), exist_ok=True)
+                shutil.copy2(
+                    stats_fp, os.path.join(raw_stats_dir, sample, "bin_stats_ext.tsv")
+                )
 
-        # convert CheckM reports into a DataFrame and add completeness info
+        # convert CheckM reports into a DataFrame
         checkm_results = _parse_checkm_reports(reports)
+        if filtered_stats is not None:
+            checkm_results = pd.concat(
+                [checkm_results, filtered_stats], ignore_index=True
+            )
+        checkm_results = _classify_bins(checkm_results)
+
+        # calculate the read depth of all the bins (including the ones
+        # which were not evaluated by CheckM)
+        if alignments is not None:
+            contig_coverage, coverage = _calculate_coverage(
+                input_bins, alignments, threads=threads or 1
+            )
+            contig_coverage.to_csv(
+                os.path.join(output_dir, "contig_coverage.tsv"),
+                sep="\t",
+                index=False,
+            )
+            checkm_results = checkm_results.merge(
+                coverage, on=["sample_id", "bin_id"], how="left"
+            )
+
         checkm_results.to_csv(
             os.path.join(output_dir, "results.tsv"),
             sep="\t",
             index=False,
         )
-        checkm_results["qc_category"] = checkm_results["completeness"].apply(
-            _classify_completeness
-        )
 
-        # prepare viz templates and copy all the required files
-        context = {
-            "tabs": [
-                {"title": "QC overview", "url": "index.html"},
-                {"title": "Sample details", "url": "sample_details.html"},
-            ],
-            "samples": json.dumps(list(reports.keys())),
-            "vega_plots_detailed": json.dumps(_draw_detailed_plots(checkm_results)),
-            "vega_plots_overview": json.dumps(_draw_overview_plots(checkm_results)),
-        }
+        if failures is not None:
+            run_info["failures"] = failures
+            with open(os.path.join(output_dir, "run_info.json"), "w") as fh:
+                json.dump(run_info, fh, indent=2)
+        if failures:
+            warnings.warn(
+                f"CheckM failed for {len(failures)} job(s) - the failures are "
+                f"listed in run_info.json.\n\n{_format_failures(failures)}"
+            )
 
-        index = os.path.join(TEMPLATES, "checkm", "index.html")
-        sample_details = os.path.join(TEMPLATES, "checkm", "sample_details.html")
+    return checkm_results
 
-        copy_tree(os.path.join(TEMPLATES, "checkm"), output_dir)
-        copy_tree(os.path.join(results_dir, "plots"), os.path.join(output_dir, "plots"))
 
-        templates = [index, sample_details]
-        q2templates.render(templates, output_dir, context=context)
+def _visualize_checkm_results(
+    output_dir: str, checkm_results: pd.DataFrame, failures: List[dict] = None
+):
+    """Renders the visualization of the CheckM results.
 
-        # until Bootstrap 3 is replaced with v5, remove the v3 scripts as
-        # the HTML files are adjusted to work with v5
-        os.remove(
-            os.path.join(output_dir, "q2templateassets", "css", "bootstrap.min.css")
+    Args:
+        output_dir (str): The visualization's output directory.
+        checkm_results (pd.DataFrame): The CheckM results.
+        failures (List[dict]): Failures of individual samples (see
+            _get_failure_record), listed on the overview page.
+    """
+    # Altair is slow to import, so it is only loaded when plots are drawn
+    from q2_checkm.plots import (
+        _draw_detailed_plots,
+        _draw_overview_plots,
+        _get_vega_renderer,
+    )
+
+    checkm_results = _classify_bins(checkm_results)
+
+    # prepare viz templates and copy all the required files
+    context = {
+        "tabs": [
+            {"title": "QC overview", "url": "index.html"},
+            {"title": "Sample details", "url": "sample_details.html"},
+        ],
+        "samples": json.dumps(checkm_results["sample_id"].unique().tolist()),
+        "vega_renderer": _get_vega_renderer(len(checkm_results)),
+        "failures": failures or [],
+        "logs": os.path.isfile(os.path.join(output_dir, "checkm_logs.zip")),
+    }
+    # no plots can be drawn if CheckM failed for all the samples - only
+    # the failures are listed then
+    if not checkm_results.empty:
+        context.update(
+            {
+                "vega_plots_detailed": json.dumps(_draw_detailed_plots(checkm_results)),
+                "vega_plots_overview": json.dumps(_draw_overview_plots(checkm_results)),
+                "search_index": _write_search_index(output_dir, checkm_results),
+            }
         )
-        os.remove(
-            os.path.join(output_dir, "q2templateassets", "js", "bootstrap.min.js")
+    _render_report(output_dir, context, ["index.html", "sample_details.html"])
+
+
+def _read_checkm_results(results_dir: str) -> pd.DataFrame:
+    """Reads the results table stored in a CheckMResults artifact.
+
+    Args:
+        results_dir (str): Path to the CheckMResultsDirFmt directory.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame containing the CheckM results.
+    """
+    return pd.read_csv(
+        os.path.join(results_dir, "results.tsv"),
+        sep="\t",
+        dtype={"sample_id": str, "bin_id": str},
+    )
+
+
+def _read_failures(results_dir: str) -> List[dict]:
+    """Reads the failures recorded in the run info of CheckM results.
+
+    Args:
+        results_dir (str): Directory containing run_info.json, either of a
+            single run or collated from several partitions.
+
+    Returns:
+        List[dict]: Failure records of all the runs.
+    """
+    try:
+        with open(os.path.join(results_dir, "run_info.json"), "r") as fh:
+            run_info = json.load(fh)
+    except FileNotFoundError:
+        return []
+    runs = run_info.get("partitions", [run_info])
+    return [failure for run in runs for failure in run.get("failures", [])]
+
+
+def run_checkm(
+    bins: MultiMAGSequencesDirFmt,
+    db_path: str,
+    reduced_tree: bool = None,
+    unique: int = None,
+    multi: int = None,
+    force_domain: bool = None,
+    no_refinement: bool = None,
+    individual_markers: bool = None,
+    skip_adj_correction: bool = None,
+    skip_pseudogene_correction: bool = None,
+    aai_strain: float = None,
+    ignore_thresholds: bool = None,
+    e_value: float = None,
+    length: float = None,
+    threads: int = None,
+    pplacer_threads: int = None,
+    scratch_dir: str = None,
+    ram_disk_budget: int = None,
+    keep_intermediates: bool = None,
+    db_cache_dir: str = None,
+    min_genome_size: int = None,
+    min_n50: int = None,
+    max_contigs: int = None,
+    queue_dir: str = None,
+    auto_threads: bool = None,
+    alignments: BAMDirFmt = None,
+    progress_file: str = None,
+    continue_on_error: bool = None,
+    resume_dir: str = None,
+) -> CheckMResultsDirFmt:
+    params = dict(locals())
+    results = CheckMResultsDirFmt()
+    _run_checkm(
+        str(results),
+        bins,
+        params,
+        raw_stats_dir=os.path.join(str(results), "bin_stats"),
+        alignments=alignments,
+    )
+    return results
+
+
+def visualize_checkm(output_dir: str, results: CheckMResultsDirFmt):
+    for fn in [
+        "results.tsv",
+        "checkm_plots.zip",
+        "checkm_logs.zip",
+        "run_info.json",
+        "contig_coverage.tsv",
+    ]:
+        if not os.path.isfile(os.path.join(str(results), fn)):
+            continue
+        _link_or_copy(
+            os.path.join(str(results), fn),
+            os.path.join(output_dir, fn),
+            allow_symlinks=False,
         )
+    _visualize_checkm_results(
+        output_dir,
+        _read_checkm_results(str(results)),
+        failures=_read_failures(str(results)),
+    )
+
+
+def evaluate_bins(
+    output_dir: str,
+    bins: MultiMAGSequencesDirFmt,
+    db_path: str,
+    reduced_tree: bool = None,
+    unique: int = None,
+    multi: int = None,
+    force_domain: bool = None,
+    no_refinement: bool = None,
+    individual_markers: bool = None,
+    skip_adj_correction: bool = None,
+    skip_pseudogene_correction: bool = None,
+    aai_strain: float = None,
+    ignore_thresholds: bool = None,
+    e_value: float = None,
+    length: float = None,
+    threads: int = None,
+    pplacer_threads: int = None,
+    scratch_dir: str = None,
+    ram_disk_budget: int = None,
+    keep_intermediates: bool = None,
+    db_cache_dir: str = None,
+    min_genome_size: int = None,
+    min_n50: int = None,
+    max_contigs: int = None,
+    queue_dir: str = None,
+    auto_threads: bool = None,
+    alignments: BAMDirFmt = None,
+    progress_file: str = None,
+    continue_on_error: bool = None,
+    resume_dir: str = None,
+):
+    params = dict(locals())
+    checkm_results = _run_checkm(output_dir, bins, params, alignments=alignments)
+    _visualize_checkm_results(
+        output_dir, checkm_results, failures=_read_failures(output_dir)
+    )
+
+
+def evaluate_bins_parallel(
+    ctx,
+    bins,
+    db_path,
+    reduced_tree=None,
+    unique=None,
+    multi=None,
+    force_domain=None,
+    no_refinement=None,
+    individual_markers=None,
+    skip_adj_correction=None,
+    skip_pseudogene_correction=None,
+    aai_strain=None,
+    ignore_thresholds=None,
+    e_value=None,
+    length=None,
+    threads=None,
+    pplacer_threads=None,
+    scratch_dir=None,
+    ram_disk_budget=None,
+    keep_intermediates=None,
+    db_cache_dir=None,
+    min_genome_size=None,
+    min_n50=None,
+    max_contigs=None,
+    queue_dir=None,
+    auto_threads=None,
+    alignments=None,
+    progress_file=None,
+    continue_on_error=None,
+    resume_dir=None,
+    num_partitions=None,
+):
+    params = {
+        k: v for k, v in locals().items() if k not in ["ctx", "bins", "num_partitions"]
+    }
+
+    partition_mags = ctx.get_action("checkm", "partition_mags")
+    run_checkm = ctx.get_action("checkm", "run_checkm")
+    collate_checkm_results = ctx.get_action("checkm", "collate_checkm_results")
+    visualize_checkm = ctx.get_action("checkm", "visualize_checkm")
+
+    (partitioned_bins,) = partition_mags(bins, num_partitions)
+    results = []
+    for key, partition in partitioned_bins.items():
+        if progress_file:
+            # partitions may be evaluated at the same time, so each of them
+            # tracks its progress in a separate file
+            root, ext = os.path.splitext(progress_file)
+            params["progress_file"] = f"{root}.{key}{ext}"
+        (partition_results,) = run_checkm(partition, **params)
+        results.append(partition_results)
+
+    (collated_results,) = collate_checkm_results(results)
+    (visualization,) = visualize_checkm(collated_results)
+    return collated_results, visualization
+
+
+def evaluate_bin_stats(
+    output_dir: str,
+    bins: MultiMAGSequencesDirFmt,
+    threads: int = None,
+):
+    from q2_checkm.plots import _draw_stats_plots, _get_vega_renderer
+
+    # calculate sequence statistics without running any of CheckM's
+    # marker gene analyses - all the other columns remain empty
+    stats = _calculate_sequence_stats(bins, threads=threads or 1)
+    results = stats.reindex(columns=["sample_id", *CHECKM_COLUMNS.values()])
+    results.to_csv(os.path.join(output_dir, "results.tsv"), sep="\t", index=False)
+
+    context = {
+        "tabs": [{"title": "QC overview", "url": "index.html"}],
+        "stats_only": True,
+        "vega_plots_overview": json.dumps(_draw_stats_plots(stats)),
+        "vega_renderer": _get_vega_renderer(len(stats)),
+    }
+    _render_report(output_dir, context, ["index.html"])
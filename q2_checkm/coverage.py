@@ -0,0 +1,242 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import glob
+import os
+import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from q2_types.per_sample_sequences import BAMDirFmt, MultiMAGSequencesDirFmt
+
+# columns added to the results table
+COVERAGE_COLS = ["mean_depth", "covered_fraction"]
+
+# columns of the per-contig coverage table
+CONTIG_COVERAGE_COLS = [
+    "sample_id",
+    "bin_id",
+    "contig_id",
+    "length",
+    "aligned_bases",
+    "covered_bases",
+    "mean_depth",
+]
+
+# contigs are queried in windows of this size to limit the memory used
+# by the per-base depth arrays
+DEPTH_WINDOW = 1_000_000
+
+
+def _read_contig_ids(fp: str) -> List[str]:
+    """Finds the IDs of all the contigs in a FASTA file.
+
+    Args:
+        fp (str): Path to the FASTA file.
+
+    Returns:
+        List[str]: Contig IDs (the first word of every header).
+    """
+    with open(fp, "r") as fh:
+        return [line[1:].split()[0] for line in fh if line.startswith(">")]
+
+
+def _find_alignments(alignments: BAMDirFmt) -> Dict[str, str]:
+    """Finds the BAM file of every sample.
+
+    Args:
+        alignments (BAMDirFmt): Per-sample read alignments.
+
+    Returns:
+        Dict[str, str]: Paths to the BAM files per sample ID.
+    """
+    bams = {}
+    for fp in sorted(glob.glob(os.path.join(str(alignments), "*.bam"))):
+        sample_id = os.path.basename(fp)[: -len(".bam")]
+        if sample_id.endswith("_alignment"):
+            sample_id = sample_id[: -len("_alignment")]
+        bams[sample_id] = fp
+    return bams
+
+
+def _index_bam(bam_fp: str, tmp_dir: str) -> Tuple[str, str]:
+    """Creates an index of a BAM file, sorting it first if required.
+
+    Indices are never written next to the BAM files, which belong to
+    the input artifact.
+
+    Args:
+        bam_fp (str): Path to the BAM file.
+        tmp_dir (str): Directory in which the index (and the sorted BAM
+            file, if sorting was required) should be created.
+
+    Returns:
+        Tuple[str, str]: Paths to the (sorted) BAM file and its index.
+    """
+    import pysam
+
+    name = os.path.basename(bam_fp)[: -len(".bam")]
+    index_fp = os.path.join(tmp_dir, f"{name}.bam.bai")
+    try:
+        pysam.index(bam_fp, index_fp)
+    except pysam.SamtoolsError:
+        sorted_fp = os.path.join(tmp_dir, f"{name}.sorted.bam")
+        pysam.sort("-o", sorted_fp, bam_fp)
+        pysam.index(sorted_fp, index_fp)
+        bam_fp = sorted_fp
+    return bam_fp, index_fp
+
+
+def _calculate_contig_depth(bam, contig_id: str, length: int) -> Tuple[int, int]:
+    """Calculates the read depth of a single contig.
+
+    Only the region of the contig is queried (using the BAM index) and
+    it is processed in windows of DEPTH_WINDOW bases.
+
+    Args:
+        bam (pysam.AlignmentFile): The indexed alignment file.
+        contig_id (str): ID of the contig.
+        length (int): Length of the contig.
+
+    Returns:
+        Tuple[int, int]: The total number of aligned bases and the number
+            of bases covered by at least one read.
+    """
+    aligned, covered = 0, 0
+    for start in range(0, length, DEPTH_WINDOW):
+        counts = bam.count_coverage(
+            contig_id,
+            start,
+            min(start + DEPTH_WINDOW, length),
+            quality_threshold=0,
+        )
+        depth = np.sum([np.asarray(x, dtype=np.int64) for x in counts], axis=0)
+        aligned += int(depth.sum())
+        covered += int(np.count_nonzero(depth))
+    return aligned, covered
+
+
+def _calculate_sample_coverage(
+    sample_id: str, bins: pd.DataFrame, bam_fp: str
+) -> pd.DataFrame:
+    """Calculates the read depth of all the contigs in the bins of a sample.
+
+    Args:
+        sample_id (str): The sample ID.
+        bins (pd.DataFrame): Bins of the sample (bin_id and filename columns).
+        bam_fp (str): Path to the sample's BAM file.
+
+    Returns:
+        pd.DataFrame: One row per contig with CONTIG_COVERAGE_COLS. The
+            depth of contigs missing from the alignment is not available.
+    """
+    import pysam
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bam_fp, index_fp = _index_bam(bam_fp, tmp_dir)
+        with pysam.AlignmentFile(bam_fp, "rb", index_filename=index_fp) as bam:
+            lengths = dict(zip(bam.references, bam.lengths))
+            for bin_id, fp in zip(bins["bin_id"], bins["filename"]):
+                for contig_id in _read_contig_ids(fp):
+                    length = lengths.get(contig_id)
+                    if length is None:
+                        rows.append((sample_id, bin_id, contig_id, *[np.nan] * 4))
+                        continue
+                    aligned, covered = _calculate_contig_depth(bam, contig_id, length)
+                    rows.append(
+                        (
+                            sample_id,
+                            bin_id,
+                            contig_id,
+                            length,
+                            aligned,
+                            covered,
+                            aligned / length if length else 0.0,
+                        )
+                    )
+    return pd.DataFrame(rows, columns=CONTIG_COVERAGE_COLS)
+
+
+def _calculate_coverage(
+    bins: MultiMAGSequencesDirFmt, alignments: BAMDirFmt, threads: int = 1
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Calculates the read depth of all the bins from read alignments.
+
+    Samples are processed in parallel and every BAM file is only queried
+    for the regions of the contigs found in the sample's bins.
+
+    Args:
+        bins (MultiMAGSequencesDirFmt): The bins to be analyzed.
+        alignments (BAMDirFmt): Reads of every sample aligned to
+            its contigs.
+        threads (int): Number of samples to be processed in parallel.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: Per-contig coverage table and
+            a table with sample_id, bin_id and COVERAGE_COLS of every bin.
+    """
+    manifest: pd.DataFrame = bins.manifest.view(pd.DataFrame).reset_index()
+    manifest = manifest.rename(columns={"sample-id": "sample_id", "mag-id": "bin_id"})
+    bams = _find_alignments(alignments)
+
+    missing = sorted(set(manifest["sample_id"]) - set(bams))
+    if missing:
+        warnings.warn(
+            f"Alignments of the following samples could not be found and their "
+            f"coverage will not be calculated: {', '.join(missing)}."
+        )
+
+    samples = [x for x in manifest["sample_id"].unique() if x in bams]
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        contigs = list(
+            executor.map(
+                lambda sample: _calculate_sample_coverage(
+                    sample, manifest[manifest["sample_id"] == sample], bams[sample]
+                ),
+                samples,
+            )
+        )
+    contigs = (
+        pd.concat(contigs, ignore_index=True)
+        if contigs
+        else pd.DataFrame(columns=CONTIG_COVERAGE_COLS)
+    ).astype(
+        {
+            "length": "Int64",
+            "aligned_bases": "Int64",
+            "covered_bases": "Int64",
+            "mean_depth": float,
+        }
+    )
+
+    unaligned = contigs["length"].isna()
+    if unaligned.any():
+        warnings.warn(
+            f"{unaligned.sum()} contigs could not be found in the alignments "
+            f"and will not be included in the coverage calculation."
+        )
+
+    totals = (
+        contigs[~unaligned]
+        .astype({"length": float, "aligned_bases": float, "covered_bases": float})
+        .groupby(["sample_id", "bin_id"], as_index=False)[
+            ["length", "aligned_bases", "covered_bases"]
+        ]
+        .sum()
+    )
+    totals["mean_depth"] = totals["aligned_bases"] / totals["length"]
+    totals["covered_fraction"] = totals["covered_bases"] / totals["length"]
+    coverage = manifest[["sample_id", "bin_id"]].merge(
+        totals[["sample_id", "bin_id", *COVERAGE_COLS]],
+        on=["sample_id", "bin_id"],
+        how="left",
+    )
+    return contigs, coverage
@@ -0,0 +1,249 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from typing import List
+
+# files and directories (relative to the database root) which need to be
+# present in every CheckM database
+CHECKM_DB_LAYOUT = [
+    "distributions",
+    "genome_tree",
+    os.path.join("hmms", "checkm.hmm"),
+    os.path.join("hmms", "phylo.hmm"),
+    os.path.join("img", "img_metadata.tsv"),
+    os.path.join("pfam", "Pfam-A.hmm.dat"),
+    "selected_marker_sets.tsv",
+    "taxon_marker_sets.tsv",
+]
+CHECKM_TREES = {
+    "full": os.path.join("genome_tree", "genome_tree_full.refpkg"),
+    "reduced": os.path.join("genome_tree", "genome_tree_reduced.refpkg"),
+}
+
+# name of the sidecar file (stored in the database root) holding the cached
+# database fingerprint
+FINGERPRINT_FILE = ".q2-checkm-fingerprint.json"
+
+# name of the database copy in the node-local cache and of the file (stored
+# in that copy) holding the fingerprint of the database it was staged from
+STAGED_DB_DIR = "checkm_db"
+STAGED_FINGERPRINT_FILE = ".q2-checkm-source-fingerprint"
+
+
+def _get_missing_db_files(db_path: str, reduced_tree: bool = False) -> List[str]:
+    """Finds all the files required by CheckM which are missing
+        from the database.
+
+    Args:
+        db_path (str): Path to the CheckM database.
+        reduced_tree (bool): Whether the reduced tree will be used.
+
+    Returns:
+        List[str]: Paths (relative to the database root) of
+            the missing files.
+    """
+    required = [
+        *CHECKM_DB_LAYOUT,
+        CHECKM_TREES["reduced" if reduced_tree else "full"],
+    ]
+    return [x for x in required if not os.path.exists(os.path.join(db_path, x))]
+
+
+def _get_quick_db_key(db_path: str) -> List[list]:
+    """Collects sizes and modification times of the database's top-level
+        entries and all the required files.
+
+    Changes to any of those invalidate the cached fingerprint.
+
+    Args:
+        db_path (str): Path to the CheckM database.
+
+    Returns:
+        List[list]: List of [path, size, mtime] entries.
+    """
+    paths = {*CHECKM_DB_LAYOUT, *CHECKM_TREES.values()}
+    paths.update(x for x in os.listdir(db_path) if x != FINGERPRINT_FILE)
+    key = []
+    for path in sorted(paths):
+        fp = os.path.join(db_path, path)
+        if os.path.exists(fp):
+            stat = os.stat(fp)
+            key.append([path, stat.st_size, stat.st_mtime_ns])
+    return key
+
+
+def _get_db_fingerprint(db_path: str) -> str:
+    """Computes a fingerprint of the CheckM database.
+
+    The fingerprint is a hash of paths, sizes and modification times of
+    all the files in the database - no file contents are read. It is cached
+    in a sidecar file inside the database directory (if writable) and reused
+    for as long as the top-level entries of the database remain unchanged.
+
+    Args:
+        db_path (str): Path to the CheckM database.
+
+    Returns:
+        str: The database fingerprint.
+    """
+    quick_key = _get_quick_db_key(db_path)
+    sidecar_fp = os.path.join(db_path, FINGERPRINT_FILE)
+    try:
+        with open(sidecar_fp, "r") as fh:
+            cached = json.load(fh)
+        if cached.get("key") == quick_key:
+            return cached["fingerprint"]
+    except (OSError, ValueError):
+        pass
+
+    entries = []
+    for root, dirs, files in os.walk(db_path):
+        dirs.sort()
+        for f in sorted(files):
+            fp = os.path.join(root, f)
+            rel_fp = os.path.relpath(fp, db_path)
+            if rel_fp == FINGERPRINT_FILE:
+                continue
+            stat = os.stat(fp)
+            entries.append(f"{rel_fp}\t{stat.st_size}\t{stat.st_mtime_ns}")
+    fingerprint = hashlib.sha256("\n".join(entries).encode()).hexdigest()
+
+    try:
+        with open(sidecar_fp, "w") as fh:
+            json.dump({"key": quick_key, "fingerprint": fingerprint}, fh)
+    except OSError:
+        # the database location may be read-only - the fingerprint
+        # will just need to be recomputed next time
+        pass
+
+    return fingerprint
+
+
+def _validate_checkm_db(db_path: str, reduced_tree: bool = False) -> str:
+    """Checks that the CheckM database has the expected layout.
+
+    Args:
+        db_path (str): Path to the CheckM database.
+        reduced_tree (bool): Whether the reduced tree will be used.
+
+    Returns:
+        str: The database fingerprint.
+    """
+    if not os.path.isdir(db_path):
+        raise FileNotFoundError(
+            f"CheckM database directory {db_path} could not be found."
+        )
+
+    missing = _get_missing_db_files(db_path, reduced_tree)
+    if missing:
+        raise FileNotFoundError(
+            f"CheckM database in {db_path} is incomplete. The following "
+            f"files could not be found: {', '.join(missing)}."
+        )
+
+    return _get_db_fingerprint(db_path)
+
+
+def _read_staged_fingerprint(staged_path: str) -> str:
+    """Reads the fingerprint of the database from which a copy was staged.
+
+    Args:
+        staged_path (str): Path to the staged database copy.
+
+    Returns:
+        str: The source database fingerprint or None if the copy is missing
+            or incomplete.
+    """
+    try:
+        with open(os.path.join(staged_path, STAGED_FINGERPRINT_FILE), "r") as fh:
+            return fh.read().strip()
+    except OSError:
+        return None
+
+
+def _refresh_staged_db(db_path: str, staged_path: str, fingerprint: str):
+    """Replaces the staged database copy with a fresh one.
+
+    The database is first copied next to the staged location and only then
+    swapped in, so that an interrupted copy never gets used.
+
+    Args:
+        db_path (str): Path to the source CheckM database.
+        staged_path (str): Path to the staged database copy.
+        fingerprint (str): Fingerprint of the source database.
+    """
+    # remove leftovers from copies which were interrupted
+    for leftover in glob.glob(f"{staged_path}.tmp-*"):
+        shutil.rmtree(leftover, ignore_errors=True)
+
+    tmp_path = f"{staged_path}.tmp-{os.getpid()}"
+    print(f"Staging CheckM database from {db_path} to {staged_path}.")
+    shutil.copytree(db_path, tmp_path, ignore=shutil.ignore_patterns(FINGERPRINT_FILE))
+    with open(os.path.join(tmp_path, STAGED_FINGERPRINT_FILE), "w") as fh:
+        fh.write(fingerprint)
+
+    if os.path.exists(staged_path):
+        old_path = f"{staged_path}.tmp-{os.getpid()}-old"
+        os.rename(staged_path, old_path)
+        os.rename(tmp_path, staged_path)
+        shutil.rmtree(old_path)
+    else:
+        os.rename(tmp_path, staged_path)
+
+
+@contextmanager
+def _staged_db(db_path: str, cache_dir: str = None, fingerprint: str = None):
+    """Provides a copy of the CheckM database staged in a node-local cache.
+
+    The database is copied into the cache only if the cache does not hold
+    a copy yet or if the fingerprint of the cached copy does not match the
+    one of the source database anymore. A lock file ensures that concurrent
+    invocations on the same node share one copy: the copy is used (and its
+    fingerprint checked) under a shared lock, so that any number of runs can
+    use it at the same time while it cannot be replaced. Only when the copy
+    needs to be refreshed is an exclusive lock taken for the time of the copy.
+
+    Args:
+        db_path (str): Path to the source CheckM database.
+        cache_dir (str): Path to the node-local cache directory. If not
+            provided, the source database is used directly.
+        fingerprint (str): Fingerprint of the source database. It will be
+            computed if not provided.
+
+    Yields:
+        str: Path to the database which should be used by CheckM.
+    """
+    if not cache_dir:
+        yield db_path
+        return
+
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = fingerprint or _get_db_fingerprint(db_path)
+    staged_path = os.path.join(cache_dir, STAGED_DB_DIR)
+
+    with open(f"{staged_path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        try:
+            # flock does not convert locks atomically - the copy is checked
+            # again whenever the shared lock is taken anew
+            while _read_staged_fingerprint(staged_path) != fingerprint:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # another run may have refreshed the copy in the meantime
+                if _read_staged_fingerprint(staged_path) != fingerprint:
+                    _refresh_staged_db(db_path, staged_path, fingerprint)
+                fcntl.flock(lock, fcntl.LOCK_SH)
+            yield staged_path
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,85 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+import warnings
+
+import pandas as pd
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+
+from q2_checkm._format import CheckMResultsDirFmt
+from q2_checkm.utils import _stage_bins
+
+
+def _get_quality_mask(
+    results: pd.DataFrame,
+    min_completeness: float = None,
+    max_contamination: float = None,
+) -> pd.Series:
+    """Finds bins which pass the provided CheckM quality thresholds.
+
+    Bins which were not evaluated by CheckM (i.e., without completeness or
+    contamination estimates) never pass a threshold on the missing value.
+
+    Args:
+        results (pd.DataFrame): The CheckM results table.
+        min_completeness (float): Minimum completeness (in %).
+        max_contamination (float): Maximum contamination (in %).
+
+    Returns:
+        pd.Series: Boolean mask indicating which bins passed all the
+            thresholds.
+    """
+    mask = pd.Series(True, index=results.index)
+    if min_completeness is not None:
+        mask &= results["completeness"] >= min_completeness
+    if max_contamination is not None:
+        mask &= results["contamination"] <= max_contamination
+    return mask
+
+
+def filter_mags(
+    mags: MultiMAGSequencesDirFmt,
+    results: CheckMResultsDirFmt,
+    min_completeness: float = None,
+    max_contamination: float = None,
+) -> MultiMAGSequencesDirFmt:
+    checkm_results = pd.read_csv(
+        os.path.join(str(results), "results.tsv"),
+        sep="\t",
+        usecols=["sample_id", "bin_id", "completeness", "contamination"],
+        dtype={"sample_id": str, "bin_id": str},
+    )
+    mask = _get_quality_mask(checkm_results, min_completeness, max_contamination)
+    retained = pd.MultiIndex.from_frame(
+        checkm_results.loc[mask, ["sample_id", "bin_id"]]
+    )
+
+    manifest: pd.DataFrame = mags.manifest.view(pd.DataFrame)
+    evaluated = manifest.index.isin(
+        pd.MultiIndex.from_frame(checkm_results[["sample_id", "bin_id"]])
+    )
+    if not evaluated.all():
+        warnings.warn(
+            f"{(~evaluated).sum()} MAGs could not be found in the CheckM "
+            f"results and will be removed."
+        )
+
+    retained_bins = set(manifest.index[manifest.index.isin(retained)])
+    if not retained_bins:
+        raise ValueError("None of the MAGs passed the filtering criteria.")
+    print(f"{len(retained_bins)} out of {len(manifest)} MAGs passed the filters.")
+
+    # MAGs are hardlinked into the new artifact whenever possible
+    filtered_mags = MultiMAGSequencesDirFmt()
+    _stage_bins(
+        mags,
+        str(filtered_mags),
+        bin_filter=lambda sample, mag: (sample, mag) in retained_bins,
+        allow_symlinks=False,
+    )
+    return filtered_mags
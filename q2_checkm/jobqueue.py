@@ -0,0 +1,439 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import argparse
+import glob
+import json
+import os
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Tuple
+
+from q2_checkm.database import _staged_db
+
+# subdirectories of the queue directory
+JOBS_DIR = "jobs"
+LEASES_DIR = "leases"
+DONE_DIR = "done"
+RUNS_DIR = "runs"
+
+LEASE_TIMEOUT = 600
+POLL_INTERVAL = 5
+# time after which the coordinator gives up if none of its jobs is picked up
+START_TIMEOUT = 3600
+LOG_TAIL_LINES = 20
+
+
+def _write_json_atomic(fp: str, content: dict):
+    """Writes a JSON file such that readers never see a partial file.
+
+    Args:
+        fp (str): Path to the file.
+        content (dict): Content to be written.
+    """
+    tmp_fp = f"{fp}.tmp-{socket.gethostname()}-{os.getpid()}"
+    with open(tmp_fp, "w") as fh:
+        json.dump(content, fh)
+    os.rename(tmp_fp, fp)
+
+
+def _read_log_tail(log_fp: str, lines: int = LOG_TAIL_LINES) -> str:
+    """Reads the last lines of a log file.
+
+    Args:
+        log_fp (str): Path to the log file.
+        lines (int): Number of lines to be read.
+
+    Returns:
+        str: The last lines of the log or an empty string if the log
+            could not be read.
+    """
+    try:
+        with open(log_fp, "r", errors="replace") as fh:
+            return "".join(fh.readlines()[-lines:])
+    except OSError:
+        return ""
+
+
+class _JobQueue:
+    """Coordinator side of the file-based job queue.
+
+    Jobs are JSON files placed in the jobs directory of a queue directory
+    shared between all the nodes. Workers (see run_worker) claim them by
+    creating a lease file, run them and report the outcome in the done
+    directory. Every run gets its own directory in the queue where all the
+    inputs and outputs of its jobs are stored - it is removed once the run
+    is finished.
+
+    Jobs whose leases are not renewed (because their worker died) do not
+    count as being run - the lease_timeout should match that of the workers.
+    """
+
+    def __init__(
+        self,
+        queue_dir: str,
+        poll_interval: float = POLL_INTERVAL,
+        start_timeout: float = START_TIMEOUT,
+        lease_timeout: float = LEASE_TIMEOUT,
+    ):
+        self.queue_dir = os.path.abspath(queue_dir)
+        self.poll_interval = poll_interval
+        self.start_timeout = start_timeout
+        self.lease_timeout = lease_timeout
+        self.run_id = uuid.uuid4().hex
+        self.run_dir = os.path.join(self.queue_dir, RUNS_DIR, self.run_id)
+        self.job_ids = []
+
+    def __enter__(self):
+        for subdir in [JOBS_DIR, LEASES_DIR, DONE_DIR]:
+            os.makedirs(os.path.join(self.queue_dir, subdir), exist_ok=True)
+        os.makedirs(self.run_dir)
+        return self
+
+    def __exit__(self, *exc):
+        for job_id in self.job_ids:
+            for fp in [
+                os.path.join(self.queue_dir, JOBS_DIR, f"{job_id}.json"),
+                os.path.join(self.queue_dir, DONE_DIR, f"{job_id}.json"),
+            ]:
+                if os.path.exists(fp):
+                    os.remove(fp)
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def submit(self, name: str, cmd: List[str], db_path: str, output_dir: str) -> str:
+        """Adds a new job to the queue.
+
+        Args:
+            name (str): Name of the job (unique within the run).
+            cmd (List[str]): Command to be executed.
+            db_path (str): Path to the CheckM database, as seen by workers.
+            output_dir (str): Directory into which the command writes its
+                outputs. It is removed before the job is (re-)started.
+
+        Returns:
+            str: ID of the submitted job.
+        """
+        job_id = f"{self.run_id}-{name}"
+        job = {
+            "job_id": job_id,
+            "cmd": cmd,
+            "db_path": db_path,
+            "output_dir": output_dir,
+            "log": os.path.join(self.run_dir, f"{name}.log"),
+        }
+        _write_json_atomic(
+            os.path.join(self.queue_dir, JOBS_DIR, f"{job_id}.json"), job
+        )
+        self.job_ids.append(job_id)
+        return job_id
+
+    def wait(self, job_ids: Iterable[str]) -> Dict[str, dict]:
+        """Waits until all the jobs are finished.
+
+        Args:
+            job_ids (Iterable[str]): IDs of the jobs to wait for.
+
+        Returns:
+            Dict[str, dict]: Outcome of every job, as reported by the worker.
+
+        Raises:
+            TimeoutError: If none of the remaining jobs was finished or held
+                under a live (not stale) lease by any worker for longer
+                than start_timeout.
+        """
+        pending, outcomes = set(job_ids), {}
+        print(
+            f"Waiting for {len(pending)} jobs in {self.queue_dir} - start "
+            f"workers using: q2-checkm-worker {self.queue_dir}"
+        )
+        last_active = time.monotonic()
+        while pending:
+            for job_id in sorted(pending):
+                done_fp = os.path.join(self.queue_dir, DONE_DIR, f"{job_id}.json")
+                if os.path.exists(done_fp):
+                    with open(done_fp, "r") as fh:
+                        outcomes[job_id] = json.load(fh)
+                    pending.remove(job_id)
+                    last_active = time.monotonic()
+                elif self._is_leased(job_id):
+                    last_active = time.monotonic()
+            if not pending:
+                break
+            if time.monotonic() - last_active > self.start_timeout:
+                raise TimeoutError(
+                    f"None of the {len(pending)} remaining jobs was picked up by "
+                    f"a worker (or kept alive by its worker) within "
+                    f"{self.start_timeout} seconds. Make sure that workers are "
+                    f"running: q2-checkm-worker {self.queue_dir}"
+                )
+            time.sleep(self.poll_interval)
+        return outcomes
+
+    def _is_leased(self, job_id: str) -> bool:
+        """Checks whether a job is held under a lease which is not stale.
+
+        Args:
+            job_id (str): ID of the job.
+
+        Returns:
+            bool: True if the lease of the job was renewed within lease_timeout.
+        """
+        lease_fp = os.path.join(self.queue_dir, LEASES_DIR, f"{job_id}.lease")
+        try:
+            return time.time() - os.path.getmtime(lease_fp) <= self.lease_timeout
+        except FileNotFoundError:
+            return False
+
+
+def _read_lease(lease_fp: str) -> Tuple[str, float]:
+    """Reads the owner and the time of the last renewal of a lease.
+
+    Args:
+        lease_fp (str): Path to the lease file.
+
+    Returns:
+        Tuple[str, float]: ID of the worker holding the lease and
+            the modification time of the lease.
+    """
+    mtime = os.path.getmtime(lease_fp)
+    with open(lease_fp, "r") as fh:
+        return fh.read(), mtime
+
+
+def _claim_job(queue_dir: str, worker_id: str, lease_timeout: float) -> dict:
+    """Claims the next available job from the queue.
+
+    A job is claimed by exclusively creating its lease file. Leases which
+    were not renewed for longer than lease_timeout (e.g., because their
+    worker died) are broken, so that the job can be claimed again. A lease
+    is only broken if it was not renewed or replaced after being checked.
+
+    Args:
+        queue_dir (str): Path to the queue directory.
+        worker_id (str): ID of the worker claiming the job.
+        lease_timeout (float): Time (in seconds) after which a lease
+            is considered stale.
+
+    Returns:
+        dict: The claimed job or None if no job is available.
+    """
+    for job_fp in sorted(glob.glob(os.path.join(queue_dir, JOBS_DIR, "*.json"))):
+        job_id = os.path.basename(job_fp)[: -len(".json")]
+        if os.path.exists(os.path.join(queue_dir, DONE_DIR, f"{job_id}.json")):
+            continue
+        lease_fp = os.path.join(queue_dir, LEASES_DIR, f"{job_id}.lease")
+
+        try:
+            lease = _read_lease(lease_fp)
+            if time.time() - lease[1] <= lease_timeout:
+                continue
+            # only one worker will manage to move a stale lease away
+            stale_fp = f"{lease_fp}.stale-{worker_id}"
+            os.rename(lease_fp, stale_fp)
+        except FileNotFoundError:
+            pass
+        else:
+            # the lease may have been broken and claimed again by another
+            # worker after it was checked - such a lease is put back
+            if _read_lease(stale_fp) != lease:
+                try:
+                    os.link(stale_fp, lease_fp)
+                except FileExistsError:
+                    pass
+                os.remove(stale_fp)
+                continue
+            os.remove(stale_fp)
+
+        try:
+            fd = os.open(lease_fp, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        with os.fdopen(fd, "w") as fh:
+            fh.write(worker_id)
+
+        try:
+            with open(job_fp, "r") as fh:
+                job = json.load(fh)
+        except FileNotFoundError:
+            # the job was finished and cleaned up in the meantime
+            os.remove(lease_fp)
+            continue
+        job["lease"] = lease_fp
+        return job
+    return None
+
+
+@contextmanager
+def _renewed_lease(lease_fp: str, interval: float):
+    """Keeps renewing a lease in the background until the block is left.
+
+    Args:
+        lease_fp (str): Path to the lease file.
+        interval (float): Time (in seconds) between renewals.
+    """
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(interval):
+            try:
+                os.utime(lease_fp)
+            except FileNotFoundError:
+                pass
+
+    renewer = threading.Thread(target=renew, daemon=True)
+    renewer.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        renewer.join()
+
+
+def _run_job(
+    queue_dir: str,
+    job: dict,
+    worker_id: str,
+    lease_timeout: float,
+    db_cache_dir: str = None,
+):
+    """Runs a claimed job and reports its outcome.
+
+    The lease is renewed periodically from the moment the job is picked up,
+    so that it does not go stale while the database is being staged.
+
+    Args:
+        queue_dir (str): Path to the queue directory.
+        job (dict): The job to be run.
+        worker_id (str): ID of the worker running the job.
+        lease_timeout (float): Time (in seconds) after which a lease
+            is considered stale.
+        db_cache_dir (str): Node-local directory to which the CheckM
+            database should be copied before running the job.
+    """
+    print(f"[{worker_id}] Running job {job['job_id']}.")
+    with _renewed_lease(job["lease"], lease_timeout / 3):
+        shutil.rmtree(job["output_dir"], ignore_errors=True)
+        try:
+            with _staged_db(job["db_path"], db_cache_dir) as db_path, open(
+                job["log"], "w"
+            ) as log:
+                returncode = subprocess.run(
+                    job["cmd"],
+                    env={**os.environ, "CHECKM_DATA_PATH": db_path},
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                ).returncode
+            log_tail = _read_log_tail(job["log"])
+        except OSError as e:
+            returncode, log_tail = -1, str(e)
+
+    _write_json_atomic(
+        os.path.join(queue_dir, DONE_DIR, f"{job['job_id']}.json"),
+        {
+            "job_id": job["job_id"],
+            "worker": worker_id,
+            "returncode": returncode,
+            "log_tail": log_tail,
+        },
+    )
+    # the coordinator may have cleaned up the job already
+    for fp in [
+        os.path.join(queue_dir, JOBS_DIR, f"{job['job_id']}.json"),
+        job["lease"],
+    ]:
+        try:
+            os.remove(fp)
+        except FileNotFoundError:
+            pass
+    print(f"[{worker_id}] Job {job['job_id']} finished with code {returncode}.")
+
+
+def run_worker(
+    queue_dir: str,
+    lease_timeout: float = LEASE_TIMEOUT,
+    poll_interval: float = POLL_INTERVAL,
+    idle_timeout: float = None,
+    db_cache_dir: str = None,
+) -> int:
+    """Claims and runs jobs from the queue until it stays empty.
+
+    Args:
+        queue_dir (str): Path to the queue directory.
+        lease_timeout (float): Time (in seconds) after which a lease
+            is considered stale.
+        poll_interval (float): Time (in seconds) between checks for new jobs.
+        idle_timeout (float): Time (in seconds) after which the worker exits
+            if no jobs are available. The worker runs forever if not provided.
+        db_cache_dir (str): Node-local directory to which the CheckM
+            database should be copied before running any jobs.
+
+    Returns:
+        int: Number of jobs run by the worker.
+    """
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    for subdir in [JOBS_DIR, LEASES_DIR, DONE_DIR]:
+        os.makedirs(os.path.join(queue_dir, subdir), exist_ok=True)
+
+    jobs_run, idle_since = 0, time.monotonic()
+    while True:
+        job = _claim_job(queue_dir, worker_id, lease_timeout)
+        if job is not None:
+            _run_job(queue_dir, job, worker_id, lease_timeout, db_cache_dir)
+            jobs_run, idle_since = jobs_run + 1, time.monotonic()
+            continue
+        if idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+            return jobs_run
+        time.sleep(poll_interval)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        prog="q2-checkm-worker",
+        description="Runs CheckM jobs submitted to a q2-checkm job queue.",
+    )
+    parser.add_argument("queue_dir", help="Shared queue directory.")
+    parser.add_argument(
+        "--lease-timeout",
+        type=float,
+        default=LEASE_TIMEOUT,
+        help="Seconds after which jobs of unresponsive workers are re-claimed.",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=POLL_INTERVAL,
+        help="Seconds between checks for new jobs.",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=None,
+        help="Exit after this many seconds without jobs (default: run forever).",
+    )
+    parser.add_argument(
+        "--db-cache-dir",
+        default=None,
+        help="Node-local directory to which the CheckM database is copied.",
+    )
+    args = parser.parse_args(argv)
+
+    run_worker(
+        args.queue_dir,
+        lease_timeout=args.lease_timeout,
+        poll_interval=args.poll_interval,
+        idle_timeout=args.idle_timeout,
+        db_cache_dir=args.db_cache_dir,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import glob
+import heapq
+import json
+import os
+import warnings
+from typing import Dict, List
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pandas as pd
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+
+from q2_checkm._format import CheckMResultsDirFmt
+from q2_checkm.utils import _link_or_copy, _stage_bins
+
+
+def _balance_samples(sample_sizes: pd.Series, num_partitions: int) -> List[List[str]]:
+    """Distributes samples into groups of similar total size.
+
+    Samples are assigned one by one (starting from the largest) to the group
+    with the smallest total size so far.
+
+    Args:
+        sample_sizes (pd.Series): Total size of bins per sample.
+        num_partitions (int): Number of groups to be created.
+
+    Returns:
+        List[List[str]]: Sample IDs in every group.
+    """
+    groups = [[] for _ in range(num_partitions)]
+    loads = [(0, i) for i in range(num_partitions)]
+    for sample, size in sample_sizes.sort_values(
+        ascending=False, kind="stable"
+    ).items():
+        load, i = heapq.heappop(loads)
+        groups[i].append(sample)
+        heapq.heappush(loads, (load + size, i))
+    return groups
+
+
+def partition_mags(
+    mags: MultiMAGSequencesDirFmt, num_partitions: int = None
+) -> Dict[str, MultiMAGSequencesDirFmt]:
+    manifest: pd.DataFrame = mags.manifest.view(pd.DataFrame).reset_index()
+    if manifest.empty:
+        raise ValueError("No MAGs were found in the provided artifact.")
+
+    manifest["size"] = manifest["filename"].apply(os.path.getsize)
+    sample_sizes = manifest.groupby("sample-id", sort=False)["size"].sum()
+
+    num_samples = len(sample_sizes)
+    if num_partitions is None:
+        num_partitions = num_samples
+    elif num_partitions > num_samples:
+        warnings.warn(
+            f"You have requested a number of partitions ({num_partitions}) "
+            f"that is greater than the number of samples ({num_samples}). "
+            f"The MAGs will be split into {num_samples} partitions."
+        )
+        num_partitions = num_samples
+
+    partitioned_mags = {}
+    for i, samples in enumerate(_balance_samples(sample_sizes, num_partitions)):
+        samples = set(samples)
+        partition = MultiMAGSequencesDirFmt()
+        _stage_bins(
+            mags,
+            str(partition),
+            bin_filter=lambda sample, mag: sample in samples,
+            allow_symlinks=False,
+        )
+        partitioned_mags[str(i)] = partition
+
+    return partitioned_mags
+
+
+def collate_checkm_results(
+    results: List[CheckMResultsDirFmt],
+) -> CheckMResultsDirFmt:
+    collated = CheckMResultsDirFmt()
+
+    # keep all the values as they are - the tables are only concatenated
+    dfs = [
+        pd.read_csv(
+            os.path.join(str(result), "results.tsv"),
+            sep="\t",
+            dtype=str,
+            keep_default_na=False,
+        )
+        for result in results
+    ]
+    df = pd.concat(dfs, ignore_index=True)
+    duplicated = df[df.duplicated(subset=["sample_id", "bin_id"])]
+    if not duplicated.empty:
+        raise ValueError(
+            "The following samples were found in more than one partition: "
+            f"{', '.join(duplicated['sample_id'].unique())}."
+        )
+    df.to_csv(os.path.join(str(collated), "results.tsv"), sep="\t", index=False)
+
+    # per-contig coverage is only available if alignments were provided
+    coverage_fps = [
+        os.path.join(str(result), "contig_coverage.tsv")
+        for result in results
+        if os.path.isfile(os.path.join(str(result), "contig_coverage.tsv"))
+    ]
+    if coverage_fps:
+        pd.concat(
+            [
+                pd.read_csv(fp, sep="\t", dtype=str, keep_default_na=False)
+                for fp in coverage_fps
+            ],
+            ignore_index=True,
+        ).to_csv(
+            os.path.join(str(collated), "contig_coverage.tsv"), sep="\t", index=False
+        )
+
+    # CheckM's raw bin statistics are stored per sample so they can
+    # simply be linked into the collated artifact
+    for result in results:
+        for stats_fp in glob.glob(
+            os.path.join(str(result), "bin_stats", "*", "bin_stats_ext.tsv")
+        ):
+            rel_fp = os.path.relpath(stats_fp, str(result))
+            os.makedirs(os.path.join(str(collated), os.path.dirname(rel_fp)))
+            _link_or_copy(
+                stats_fp, os.path.join(str(collated), rel_fp), allow_symlinks=False
+            )
+
+    # keep the run info of every partition
+    run_infos = []
+    for result in results:
+        run_info_fp = os.path.join(str(result), "run_info.json")
+        if os.path.isfile(run_info_fp):
+            with open(run_info_fp, "r") as fh:
+                run_infos.append(json.load(fh))
+    if run_infos:
+        with open(os.path.join(str(collated), "run_info.json"), "w") as fh:
+            json.dump({"partitions": run_infos}, fh, indent=2)
+
+    with ZipFile(os.path.join(str(collated), "checkm_plots.zip"), "w") as out:
+        for result in results:
+            with ZipFile(os.path.join(str(result), "checkm_plots.zip"), "r") as zf:
+                for item in zf.infolist():
+                    out.writestr(item, zf.read(item))
+
+    # logs are kept per sample, so the archives can simply be merged
+    log_zips = [
+        os.path.join(str(result), "checkm_logs.zip")
+        for result in results
+        if os.path.isfile(os.path.join(str(result), "checkm_logs.zip"))
+    ]
+    if log_zips:
+        with ZipFile(
+            os.path.join(str(collated), "checkm_logs.zip"),
+            "w",
+            compression=ZIP_DEFLATED,
+        ) as out:
+            for log_zip in log_zips:
+                with ZipFile(log_zip, "r") as zf:
+                    for item in zf.infolist():
+                        out.writestr(item, zf.read(item))
+
+    return collated
@@ -9,8 +9,41 @@ import altair as alt
 import pandas as pd
 from altair import Chart
 
+# cohorts of at least this many bins are drawn on a canvas rather than as SVG,
+# which is too slow to lay out in the browser for that many marks
+CANVAS_RENDERER_MIN_BINS = 1000
 
-def _draw_detailed_plots(df: pd.DataFrame) -> dict:  # pragma: no cover
+# names of the selections shared by all the views of the sample details page
+SAMPLE_SELECTION = "sample"
+BIN_SELECTION = "bins"
+
+# columns shown in the contig plots of the sample details page
+CONTIG_PLOT_COLUMNS = {
+    "longest_contig": "Longest contig length [bp]",
+    "n50_contigs": "N50 contigs [bp]",
+    "mean_contig_length": "Mean contig length [bp]",
+    "ambiguous_bases": "Count of ambiguous bases",
+}
+
+# columns of the scatter plots in which bins can be brushed - the bin
+# selection is applied to their values also in the contig plots' view
+BRUSHED_COLUMNS = [
+    "completeness",
+    "contamination",
+    "gc",
+    "coding_density",
+    "genome_size",
+    "predicted_genes",
+    "contigs",
+]
+
+
+def _get_vega_renderer(n_bins: int) -> str:
+    """Chooses the Vega renderer (svg or canvas) for the given cohort size."""
+    return "canvas" if n_bins >= CANVAS_RENDERER_MIN_BINS else "svg"
+
+
+def _draw_detailed_plots(df: pd.DataFrame) -> list:  # pragma: no cover
     # rename columns for better plot labels
     col_names = {
         "count0": "0",
@@ -29,10 +62,13 @@ def _draw_detailed_plots(df: pd.DataFrame) -> dict:  # pragma: no cover
     sample_ids = df["sample_id"].unique()
     sample_dropdown = alt.binding_select(options=sample_ids, name="Sample ID  ")
     sample_selection = alt.selection_single(
-        fields=["sample_id"], bind=sample_dropdown, init={"sample_id": sample_ids[0]}
+        name=SAMPLE_SELECTION,
+        fields=["sample_id"],
+        bind=sample_dropdown,
+        init={"sample_id": sample_ids[0]},
     )
 
-    bin_selection = alt.selection_interval()
+    bin_selection = alt.selection_interval(name=BIN_SELECTION)
 
     base = alt.Chart(df).transform_fold(list(col_names.values()))
 
@@ -75,7 +111,6 @@ def _draw_detailed_plots(df: pd.DataFrame) -> dict:  # pragma: no cover
             width=880,
             height=250,
         ),
-        contig_plots=_prep_contig_plots(base, sample_selection, bin_selection),
         genes_plot=_prep_scatter_plot(
             base,
             "genome_size",
@@ -98,7 +133,28 @@ def _draw_detailed_plots(df: pd.DataFrame) -> dict:  # pragma: no cover
         ),
     )
 
-    return final_plot.to_dict()
+    # the contig plots are drawn in a separate view, which is only embedded
+    # once scrolled into view - it receives the selections of the main view,
+    # so it only embeds the columns of its plots and of those selections
+    contig_base = alt.Chart(
+        df[["sample_id", "bin_id", *CONTIG_PLOT_COLUMNS, *BRUSHED_COLUMNS]]
+    )
+    contig_plot = _concatenate_contig_plots(
+        selector_plot=_prep_selector_plot(
+            contig_base,
+            alt.selection_single(
+                name=SAMPLE_SELECTION,
+                fields=["sample_id"],
+                init={"sample_id": sample_ids[0]},
+            ),
+            bin_selection,
+        ),
+        contig_plots=_prep_contig_plots(contig_base, sample_selection, bin_selection),
+    )
+
+    # embed all the rows, also for cohorts above Altair's default limit
+    with alt.data_transformers.disable_max_rows():
+        return [final_plot.to_dict(), contig_plot.to_dict()]
 
 
 def _draw_overview_plots(df: pd.DataFrame) -> dict:  # pragma: no cover
@@ -121,6 +177,24 @@ def _draw_overview_plots(df: pd.DataFrame) -> dict:  # pragma: no cover
 
     base = alt.Chart(df).transform_fold(list(col_names.values()))
 
+    coverage_plot = None
+    if "mean_depth" in df.columns and df["mean_depth"].notna().any():
+        coverage_plot = _prep_scatter_plot(
+            base,
+            "genome_size",
+            "mean_depth",
+            "Genome size [Mbp]",
+            "Mean depth",
+            primary_selection=sample_selection,
+            selection_col="sample_id:N",
+            selection_title="Sample ID",
+            primary_filter=None,
+            interactive=False,
+            more_tooltips=[
+                alt.Tooltip("covered_fraction:Q", title="Covered fraction", format=".2")
+            ],
+        )
+
     # prep and concatenate all plots
     final_plot = _concatenate_overview_plots(
         completeness_samples_plot=_prep_scatter_plot(
@@ -166,20 +240,95 @@ def _draw_overview_plots(df: pd.DataFrame) -> dict:  # pragma: no cover
             width=900,
             height=350,
         ),
+        mimag_summary_plot=_prep_bar_plot(
+            base,
+            sample_selection,
+            x_col="sample_id",
+            y_col="distinct(bin_id):Q",
+            x_title="Sample ID",
+            y_title="Bin count",
+            color_shorthand="mimag_quality:N",
+            color_title="MIMAG quality",
+            color_map="greens",
+            sort="ascending",
+            bin_selection=None,
+            width=900,
+            height=350,
+        ),
+        coverage_plot=coverage_plot,
     )
 
-    return final_plot.to_dict()
+    # embed all the rows, also for cohorts above Altair's default limit
+    with alt.data_transformers.disable_max_rows():
+        return final_plot.to_dict()
+
+
+def _draw_stats_plots(df: pd.DataFrame) -> dict:  # pragma: no cover
+    # convert genome size to Mbp
+    df = df.copy()
+    df["genome_size"] = df["genome_size"] / 10**6
+
+    # prepare required selectors
+    sample_selection = alt.selection_interval()
+
+    base = alt.Chart(df)
+
+    # prep and concatenate all plots
+    final_plot = _concatenate_stats_plots(
+        contigs_plot=_prep_scatter_plot(
+            base,
+            "contigs",
+            "genome_size",
+            "Contigs",
+            "Genome size [Mbp]",
+            primary_selection=sample_selection,
+            selection_col="sample_id:N",
+            selection_title="Sample ID",
+            primary_filter=None,
+            interactive=False,
+        ),
+        n50_plot=_prep_scatter_plot(
+            base,
+            "gc",
+            "n50_contigs",
+            "GC content",
+            "N50 contigs [bp]",
+            primary_selection=sample_selection,
+            selection_col="sample_id:N",
+            selection_title="Sample ID",
+            primary_filter=None,
+            interactive=False,
+        ),
+        summary_plot=_prep_bar_plot(
+            base,
+            sample_selection,
+            x_col="sample_id",
+            y_col="sum(genome_size):Q",
+            x_title="Sample ID",
+            y_title="Total genome size [Mbp]",
+            color_shorthand="sample_id:N",
+            color_title="Sample ID",
+            color_map="tableau10",
+            sort="ascending",
+            bin_selection=None,
+            width=900,
+            height=350,
+        ),
+    )
+
+    # embed all the rows, also for cohorts above Altair's default limit
+    with alt.data_transformers.disable_max_rows():
+        return final_plot.to_dict()
 
 
 def _concatenate_detailed_plots(
-    completeness_plot, gc_plot, marker_plot, contig_plots, genes_plot, contig_count_plot
+    completeness_plot, gc_plot, marker_plot, genes_plot, contig_count_plot
 ):  # pragma: no cover
     plot = (
         alt.vconcat(
             alt.hconcat(completeness_plot, gc_plot, spacing=40),
             alt.hconcat(genes_plot, contig_count_plot, spacing=40),
             marker_plot,
-            *contig_plots.values(),
             spacing=40,
         )
         .resolve_scale(color="independent")
@@ -189,21 +338,46 @@ def _concatenate_detailed_plots(
     return plot
 
 
+def _concatenate_contig_plots(selector_plot, contig_plots):  # pragma: no cover
+    plot = (
+        alt.vconcat(selector_plot, *contig_plots.values(), spacing=40)
+        .configure_axis(labelFontSize=12, titleFontSize=15)
+        .configure_legend(labelFontSize=12, titleFontSize=14)
+    )
+    return plot
+
+
 def _concatenate_overview_plots(
     completeness_samples_plot,
     completeness_contigs_plot,
-    # coverage_plot,
     completeness_summary_plot,
+    mimag_summary_plot,
+    coverage_plot=None,
 ):  # pragma: no cover
+    rows = [
+        alt.hconcat(
+            completeness_samples_plot, completeness_contigs_plot, spacing=40
+        ).resolve_scale(color="independent"),
+        completeness_summary_plot,
+        mimag_summary_plot,
+    ]
+    # coverage is only available if read alignments were provided
+    if coverage_plot is not None:
+        rows.insert(1, coverage_plot)
+    plot = (
+        alt.vconcat(*rows, spacing=40)
+        .resolve_scale(color="independent")
+        .configure_axis(labelFontSize=12, titleFontSize=15)
+        .configure_legend(labelFontSize=12, titleFontSize=14)
+    )
+    return plot
+
+
+def _concatenate_stats_plots(contigs_plot, n50_plot, summary_plot):  # pragma: no cover
     plot = (
         alt.vconcat(
-            alt.hconcat(
-                completeness_samples_plot, completeness_contigs_plot, spacing=40
-            ).resolve_scale(color="independent"),
-            # alt.hconcat(
-            #     coverage_plot, completeness_summary_plot, spacing=40
-            # ),
-            completeness_summary_plot,
+            alt.hconcat(contigs_plot, n50_plot, spacing=40),
+            summary_plot,
             spacing=40,
         )
         .resolve_scale(color="independent")
@@ -215,13 +389,7 @@ def _concatenate_overview_plots(
 
 def _prep_contig_plots(base_plot, sample_selection, bin_selection):
     contig_plots = {}
-    contig_cols = {
-        "longest_contig": "Longest contig length [bp]",
-        "n50_contigs": "N50 contigs [bp]",
-        "mean_contig_length": "Mean contig length [bp]",
-        "ambiguous_bases": "Count of ambiguous bases",
-    }
-    for y, title in contig_cols.items():
+    for y, title in CONTIG_PLOT_COLUMNS.items():
         contig_plots[y] = (
             base_plot.mark_bar()
             .encode(
@@ -235,6 +403,22 @@ def _prep_contig_plots(base_plot, sample_selection, bin_selection):
     return contig_plots
 
 
+def _prep_selector_plot(base_plot, *selections):
+    # an invisible, empty plot which only defines the selections - their
+    # state is set from another view, so that the other plots of this view
+    # can be filtered using the same selections
+    return (
+        base_plot.mark_point(opacity=0)
+        .encode(
+            x=alt.X("completeness:Q", axis=None),
+            y=alt.Y("contamination:Q", axis=None),
+        )
+        .add_selection(*selections)
+        .transform_filter("false")
+        .properties(width=1, height=1)
+    )
+
+
 def _prep_scatter_plot(
     base_plot,
     x_col: str,
@@ -5,13 +5,30 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
-from q2_types.per_sample_sequences import MAGs
+from q2_types.per_sample_sequences import AlignmentMap, MAGs
 from q2_types.sample_data import SampleData
-from qiime2.core.type import Bool, Float, Int, Range, Str
+from qiime2.core.type import (
+    Bool,
+    Collection,
+    Float,
+    Int,
+    List,
+    Range,
+    Str,
+    Visualization,
+)
 from qiime2.plugin import Citations, Plugin
 
 import q2_checkm
 from q2_checkm import __version__
+from q2_checkm._format import (
+    CheckMContigCoverageFormat,
+    CheckMLogsFormat,
+    CheckMPlotsFormat,
+    CheckMResultsDirFmt,
+    CheckMResultsFormat,
+)
+from q2_checkm._type import CheckMResults
 
 citations = Citations.load("citations.bib", package="q2_checkm")
 
@@ -40,6 +57,18 @@ checkm_params = {
     "length": Float % Range(0, 1),
     "threads": Int % Range(1, None),
     "pplacer_threads": Int % Range(1, None),
+    "scratch_dir": Str,
+    "ram_disk_budget": Int % Range(1, None),
+    "keep_intermediates": Bool,
+    "db_cache_dir": Str,
+    "min_genome_size": Int % Range(1, None),
+    "min_n50": Int % Range(1, None),
+    "max_contigs": Int % Range(1, None),
+    "queue_dir": Str,
+    "auto_threads": Bool,
+    "progress_file": Str,
+    "continue_on_error": Bool,
+    "resume_dir": Str,
 }
 
 # fmt: off
@@ -66,18 +95,85 @@ checkm_param_descriptions = {
     "length": "Percent overlap between target and query. Default: 0.7.",
     "threads": "Number of threads. Default: 1.",
     "pplacer_threads": "Number of threads used by pplacer (memory usage increases "
-                       "linearly with additional threads). Default: 1."
+                       "linearly with additional threads). Default: 1.",
+    "scratch_dir": "Directory in which CheckM's intermediate files should be "
+                   "stored. Default: system's temporary directory.",
+    "ram_disk_budget": "Maximum space (in MB) on the RAM disk (/dev/shm) that "
+                       "can be used for CheckM's intermediate files. Samples "
+                       "whose intermediates do not fit into the budget will "
+                       "be processed in the scratch directory. "
+                       "Default: RAM disk is not used.",
+    "keep_intermediates": "Keep all of CheckM's intermediate files until the "
+                          "analysis is finished. By default, files which are "
+                          "not required by later steps are removed as soon as "
+                          "possible to reduce the scratch space footprint.",
+    "db_cache_dir": "Node-local directory to which the CheckM database should "
+                    "be copied before running CheckM. The copy is shared by "
+                    "all the invocations on the same node and refreshed "
+                    "whenever the original database changes. Default: the "
+                    "database is used directly from db_path.",
+    "min_genome_size": "Minimum genome size (in bp) of a bin for it to be "
+                       "evaluated by CheckM. Bins below the threshold will "
+                       "only be reported with their sequence statistics.",
+    "min_n50": "Minimum contig N50 (in bp) of a bin for it to be evaluated by "
+               "CheckM. Bins below the threshold will only be reported with "
+               "their sequence statistics.",
+    "max_contigs": "Maximum number of contigs in a bin for it to be evaluated "
+                   "by CheckM. Bins above the threshold will only be reported "
+                   "with their sequence statistics.",
+    "queue_dir": "Shared directory to which per-sample CheckM jobs should be "
+                 "submitted instead of running them locally. The jobs are "
+                 "executed by any number of workers started (on any node with "
+                 "access to this directory) with: q2-checkm-worker "
+                 "<queue_dir>. The bins are linked or copied into this directory "
+                 "and the CheckM database needs to be accessible from all the "
+                 "nodes under the same path.",
+    "auto_threads": "Choose the number of threads, pplacer threads and "
+                    "samples evaluated at the same time automatically, based "
+                    "on the number of bins per sample and on the CPUs and "
+                    "memory available on this machine. Overrides threads and "
+                    "pplacer_threads. The chosen plan is stored in "
+                    "run_info.json.",
+    "progress_file": "File to which the progress of the run should be "
+                     "appended as one JSON record per line: the number of "
+                     "completed, running, pending and failed CheckM jobs "
+                     "(overall and per stage), the elapsed time and the "
+                     "estimated remaining time (in seconds). Records are "
+                     "written whenever a job starts or finishes and every "
+                     "30 seconds in between. Default: progress is only "
+                     "printed.",
+    "continue_on_error": "Keep evaluating the remaining samples when CheckM "
+                         "fails for some of them. Failed samples (with the "
+                         "failed step, CheckM's exit code and the last lines "
+                         "of its error output) are recorded in run_info.json "
+                         "and listed in the visualization, while their bins "
+                         "are left out of the results. By default, the first "
+                         "failure stops the analysis.",
+    "resume_dir": "Directory in which the lineage_wf results of every "
+                  "successfully evaluated sample are kept. Samples with "
+                  "results in this directory (from a run with the same "
+                  "database, CheckM parameters apart from the threads and "
+                  "bins) are not evaluated "
+                  "again, so rerunning a failed analysis only evaluates the "
+                  "samples which failed or never ran.",
 }
 # fmt: on
+alignments_description = (
+    "Reads of every sample aligned to its contigs. If provided, the mean read "
+    "depth and the fraction of every bin covered by reads are calculated and "
+    "the per-contig depth is stored in contig_coverage.tsv."
+)
 
 plugin.visualizers.register_function(
     function=q2_checkm.evaluate_bins,
     inputs={
         "bins": SampleData[MAGs],
+        "alignments": SampleData[AlignmentMap],
     },
     parameters=checkm_params,
     input_descriptions={
         "bins": "MAGs to be analyzed.",
+        "alignments": alignments_description,
     },
     parameter_descriptions=checkm_param_descriptions,
     name="Evaluate quality of the generated MAGs using CheckM.",
@@ -89,3 +185,193 @@ plugin.visualizers.register_function(
         citations["hmmer2022"],
     ],
 )
+
+plugin.methods.register_function(
+    function=q2_checkm.run_checkm,
+    inputs={
+        "bins": SampleData[MAGs],
+        "alignments": SampleData[AlignmentMap],
+    },
+    parameters=checkm_params,
+    outputs=[("results", CheckMResults)],
+    input_descriptions={
+        "bins": "MAGs to be analyzed.",
+        "alignments": alignments_description,
+    },
+    parameter_descriptions=checkm_param_descriptions,
+    output_descriptions={
+        "results": "CheckM results table together with all the plots "
+        "generated by CheckM.",
+    },
+    name="Evaluate quality of the generated MAGs using CheckM.",
+    description="This method uses CheckM to assess the quality of assembled MAGs "
+    "and stores the results as an artifact which can be visualized using "
+    "visualize_checkm.",
+    citations=[
+        citations["matsen2010"],
+        citations["hyatt2012"],
+        citations["parks2015b"],
+        citations["hmmer2022"],
+    ],
+)
+
+plugin.visualizers.register_function(
+    function=q2_checkm.visualize_checkm,
+    inputs={
+        "results": CheckMResults,
+    },
+    parameters={},
+    input_descriptions={
+        "results": "CheckM results to be visualized.",
+    },
+    parameter_descriptions={},
+    name="Visualize CheckM results.",
+    description="This method visualizes the results generated by run_checkm.",
+)
+
+plugin.methods.register_function(
+    function=q2_checkm.partition_mags,
+    inputs={
+        "mags": SampleData[MAGs],
+    },
+    parameters={"num_partitions": Int % Range(1, None)},
+    outputs=[("partitioned_mags", Collection[SampleData[MAGs]])],
+    input_descriptions={
+        "mags": "MAGs to be partitioned.",
+    },
+    parameter_descriptions={
+        "num_partitions": "Number of partitions to split the MAGs into. "
+        "Samples are distributed such that the partitions contain similar "
+        "amounts of sequence data. Default: one partition per sample.",
+    },
+    output_descriptions={
+        "partitioned_mags": "Partitioned MAGs.",
+    },
+    name="Partition MAGs.",
+    description="This method splits MAGs into groups of samples which can be "
+    "processed independently.",
+)
+
+plugin.methods.register_function(
+    function=q2_checkm.collate_checkm_results,
+    inputs={
+        "results": List[CheckMResults],
+    },
+    parameters={},
+    outputs=[("collated_results", CheckMResults)],
+    input_descriptions={
+        "results": "CheckM results from all the partitions.",
+    },
+    parameter_descriptions={},
+    output_descriptions={
+        "collated_results": "Collated CheckM results.",
+    },
+    name="Collate CheckM results.",
+    description="This method merges CheckM results of several partitions "
+    "into a single artifact.",
+)
+
+plugin.methods.register_function(
+    function=q2_checkm.filter_mags,
+    inputs={
+        "mags": SampleData[MAGs],
+        "results": CheckMResults,
+    },
+    parameters={
+        "min_completeness": Float % Range(0, 100, inclusive_end=True),
+        "max_contamination": Float % Range(0, None),
+    },
+    outputs=[("filtered_mags", SampleData[MAGs])],
+    input_descriptions={
+        "mags": "MAGs to be filtered.",
+        "results": "CheckM results of the MAGs.",
+    },
+    parameter_descriptions={
+        "min_completeness": "Minimum completeness (in %) of a MAG to be retained.",
+        "max_contamination": "Maximum contamination (in %) of a MAG to be retained.",
+    },
+    output_descriptions={
+        "filtered_mags": "MAGs which passed all the quality thresholds.",
+    },
+    name="Filter MAGs by CheckM quality.",
+    description="This method filters MAGs based on their completeness and "
+    "contamination estimated by CheckM. MAGs which were not evaluated by CheckM "
+    "are removed whenever the corresponding threshold is set.",
+)
+
+plugin.pipelines.register_function(
+    function=q2_checkm.evaluate_bins_parallel,
+    inputs={
+        "bins": SampleData[MAGs],
+        "alignments": SampleData[AlignmentMap],
+    },
+    parameters={
+        **checkm_params,
+        "num_partitions": Int % Range(1, None),
+    },
+    outputs=[
+        ("results", CheckMResults),
+        ("visualization", Visualization),
+    ],
+    input_descriptions={
+        "bins": "MAGs to be analyzed.",
+        "alignments": alignments_description,
+    },
+    parameter_descriptions={
+        **checkm_param_descriptions,
+        "progress_file": checkm_param_descriptions["progress_file"]
+        + " Every partition writes its progress into a separate file named "
+        "after the partition, e.g., progress.0.jsonl for progress.jsonl.",
+        "num_partitions": "Number of partitions to split the MAGs into. Every "
+        "partition is evaluated by a separate run_checkm job which can be "
+        "distributed according to the parallel execution configuration. "
+        "Default: one partition per sample.",
+    },
+    output_descriptions={
+        "results": "CheckM results table together with all the plots "
+        "generated by CheckM.",
+        "visualization": "Visualization of the CheckM results.",
+    },
+    name="Evaluate quality of the generated MAGs using CheckM in parallel.",
+    description="This pipeline partitions the MAGs by sample, evaluates every "
+    "partition using CheckM, collates the results and visualizes them. Run it "
+    "with parallel execution enabled to distribute the partitions.",
+    citations=[
+        citations["matsen2010"],
+        citations["hyatt2012"],
+        citations["parks2015b"],
+        citations["hmmer2022"],
+    ],
+)
+
+plugin.visualizers.register_function(
+    function=q2_checkm.evaluate_bin_stats,
+    inputs={
+        "bins": SampleData[MAGs],
+    },
+    parameters={"threads": Int % Range(1, None)},
+    input_descriptions={
+        "bins": "MAGs to be analyzed.",
+    },
+    parameter_descriptions={
+        "threads": "Number of bins to be processed in parallel. Default: 1."
+    },
+    name="Calculate sequence statistics of the generated MAGs.",
+    description="This method calculates assembly statistics (GC content, "
+    "genome size, contig and scaffold counts, N50 etc.) of the MAGs without "
+    "running CheckM's marker gene analysis. It produces the same results "
+    "table as evaluate_bins, leaving completeness- and contamination-related "
+    "columns empty, and can be used to quickly triage large numbers of bins.",
+)
+
+plugin.register_formats(
+    CheckMResultsFormat,
+    CheckMContigCoverageFormat,
+    CheckMPlotsFormat,
+    CheckMLogsFormat,
+    CheckMResultsDirFmt,
+)
+plugin.register_semantic_types(CheckMResults)
+plugin.register_semantic_type_to_format(
+    CheckMResults, artifact_format=CheckMResultsDirFmt
+)
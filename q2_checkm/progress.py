@@ -0,0 +1,253 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import datetime
+import json
+import threading
+import time
+import uuid
+from typing import Dict, Mapping, Optional, Tuple
+
+# stages of a CheckM run, in the order in which they are executed
+STAGES = ["lineage_wf", "gc_plot", "nx_plot", "coding_plot"]
+JOB_STATUSES = ["pending", "running", "completed", "failed", "skipped"]
+
+# how often (in seconds) the progress file is updated while jobs are running
+PROGRESS_INTERVAL = 30
+
+
+def _format_duration(seconds: Optional[float]) -> str:
+    """Formats a duration for display, e.g. 0:05:12."""
+    if seconds is None:
+        return "unknown"
+    return str(datetime.timedelta(seconds=round(seconds)))
+
+
+def _estimate_remaining_time(
+    jobs: Mapping[Tuple[str, str], dict],
+    concurrency: Mapping[str, int],
+    now: float,
+) -> Optional[float]:
+    """Estimates the time required to finish all the remaining jobs.
+
+    The time per bin is calculated for every stage from the jobs which
+    have already completed. Stages without any completed jobs use the
+    time per bin observed across all the stages so far. Stages are run
+    one after another, while the jobs of a stage may run concurrently.
+
+    Args:
+        jobs (Mapping[Tuple[str, str], dict]): Jobs per (stage, sample) with
+            their status, number of bins and start and end times.
+        concurrency (Mapping[str, int]): Number of jobs run at the same time
+            in every stage.
+        now (float): Current time (in seconds, same clock as the jobs').
+
+    Returns:
+        Optional[float]: Estimated remaining time (in seconds) or None if
+            no job has completed yet.
+    """
+    durations, bins = {}, {}
+    for (stage, _), job in jobs.items():
+        if job["status"] == "completed":
+            durations[stage] = durations.get(stage, 0) + job["end"] - job["start"]
+            bins[stage] = bins.get(stage, 0) + job["bins"]
+    if not durations:
+        return None
+    overall_rate = sum(durations.values()) / max(sum(bins.values()), 1)
+
+    remaining = {}
+    for (stage, _), job in jobs.items():
+        rate = durations[stage] / max(bins[stage], 1) if stage in bins else overall_rate
+        expected = job["bins"] * rate
+        if job["status"] == "pending":
+            remaining[stage] = remaining.get(stage, 0) + expected
+        elif job["status"] == "running":
+            elapsed = now - job["start"]
+            remaining[stage] = remaining.get(stage, 0) + max(expected - elapsed, 0)
+    return sum(x / max(concurrency.get(stage, 1), 1) for stage, x in remaining.items())
+
+
+class _ProgressTracker:
+    """Tracks the progress of CheckM jobs across all the stages of a run.
+
+    Every job corresponds to one stage (see STAGES) of one sample. A short
+    summary is printed whenever a job finishes and, if a progress file is
+    provided, a JSON record with the number of jobs in every status (see
+    JOB_STATUSES), the elapsed time and the estimated remaining time is
+    appended to it on every change and periodically while jobs are running.
+    All the methods can be called concurrently for different jobs.
+
+    Args:
+        progress_file (str): Path to the file to which progress records
+            should be appended (one JSON object per line). Progress is
+            only printed if not provided.
+        interval (float): Time (in seconds) between the periodic records.
+        verbose (bool): Whether a summary should be printed when a job
+            finishes.
+    """
+
+    def __init__(
+        self,
+        progress_file: str = None,
+        interval: float = PROGRESS_INTERVAL,
+        verbose: bool = True,
+    ):
+        self.progress_file = progress_file
+        self.interval = interval
+        self.verbose = verbose
+        self.run_id = uuid.uuid4().hex
+        self.jobs: Dict[Tuple[str, str], dict] = {}
+        self.concurrency: Dict[str, int] = {}
+        self.status = "running"
+        self._start = time.monotonic()
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._start = time.monotonic()
+        if self.progress_file:
+            self.write()
+            self._thread = threading.Thread(target=self._write_periodically)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.status = "failed" if exc_type is not None else "completed"
+        if self.progress_file:
+            self.write()
+
+    def _write_periodically(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def add_jobs(
+        self, stage: str, bins_per_sample: Mapping[str, int], concurrency: int = 1
+    ):
+        """Registers the jobs of a stage as pending.
+
+        Args:
+            stage (str): The stage (one of STAGES).
+            bins_per_sample (Mapping[str, int]): Number of bins of every
+                sample processed in this stage.
+            concurrency (int): Number of the stage's jobs run at the same time.
+        """
+        with self._lock:
+            self.concurrency[stage] = concurrency
+            for sample, n_bins in bins_per_sample.items():
+                self.jobs[(stage, sample)] = {
+                    "status": "pending",
+                    "bins": int(n_bins),
+                    "start": None,
+                    "end": None,
+                }
+
+    def start(self, stage: str, sample: str):
+        """Marks a job as running."""
+        with self._lock:
+            job = self.jobs.setdefault(
+                (stage, sample), {"bins": 0, "start": None, "end": None}
+            )
+            job.update(status="running", start=time.monotonic())
+        if self.progress_file:
+            self.write()
+
+    def finish(self, stage: str, sample: str, failed: bool = False):
+        """Marks a job as completed (or failed)."""
+        with self._lock:
+            job = self.jobs[(stage, sample)]
+            job.update(status="failed" if failed else "completed", end=time.monotonic())
+            duration = job["end"] - job["start"] if job["start"] is not None else None
+            snapshot = self.snapshot()
+        if self.verbose:
+            jobs = snapshot["jobs"]
+            print(
+                f"Progress: {stage} of sample {sample} "
+                f"{'failed' if failed else 'completed'} in "
+                f"{_format_duration(duration)} - "
+                f"{jobs['completed']}/{jobs['total']} jobs completed, "
+                f"{jobs['running']} running, {jobs['pending']} pending. "
+                f"Estimated time remaining: {_format_duration(snapshot['eta'])}."
+            )
+        if self.progress_file:
+            self.write(snapshot)
+
+    def skip(self, stage: str, sample: str):
+        """Marks a job as skipped (e.g., restored from a previous run).
+
+        Skipped jobs are not used to estimate the throughput.
+        """
+        with self._lock:
+            if (stage, sample) in self.jobs:
+                self.jobs[(stage, sample)]["status"] = "skipped"
+        if self.progress_file:
+            self.write()
+
+    @contextlib.contextmanager
+    def track(self, stage: str, sample: str):
+        """Marks a job as running for the duration of the context."""
+        self.start(stage, sample)
+        try:
+            yield
+        except BaseException:
+            self.finish(stage, sample, failed=True)
+            raise
+        self.finish(stage, sample)
+
+    def snapshot(self) -> dict:
+        """Summarizes the current progress.
+
+        Returns:
+            dict: Progress record with the job counts (overall and per stage),
+                the number of completed bins per stage, the elapsed time and
+                the estimated remaining time (eta, in seconds).
+        """
+        with self._lock:
+            now = time.monotonic()
+            stages = {}
+            for (stage, _), job in self.jobs.items():
+                counts = stages.setdefault(
+                    stage, {**{x: 0 for x in JOB_STATUSES}, "bins_completed": 0}
+                )
+                counts[job["status"]] += 1
+                if job["status"] == "completed":
+                    counts["bins_completed"] += job["bins"]
+            jobs = {x: sum(s[x] for s in stages.values()) for x in JOB_STATUSES}
+            eta = _estimate_remaining_time(self.jobs, self.concurrency, now)
+            return {
+                "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                "run_id": self.run_id,
+                "status": self.status,
+                "elapsed": round(now - self._start, 1),
+                "eta": round(eta, 1) if eta is not None else None,
+                "jobs": {**jobs, "total": len(self.jobs)},
+                "stages": {
+                    stage: stages[stage]
+                    for stage in sorted(
+                        stages,
+                        key=lambda x: STAGES.index(x) if x in STAGES else len(STAGES),
+                    )
+                },
+            }
+
+    def write(self, snapshot: dict = None):
+        """Appends a progress record to the progress file.
+
+        Args:
+            snapshot (dict): The record to be written. Current progress is
+                used if not provided.
+        """
+        snapshot = snapshot or self.snapshot()
+        with self._lock:
+            with open(self.progress_file, "a") as fh:
+                fh.write(json.dumps(snapshot) + "\n")
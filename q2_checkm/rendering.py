@@ -0,0 +1,65 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import os
+import shutil
+from typing import Dict
+
+# manifest of the JS/CSS libraries bundled with the pages (see fetch-assets.py)
+VENDOR_MANIFEST = "vendor.json"
+
+# directories (next to the templates) holding the assets used by the pages
+ASSET_DIRS = ["css", "js", "vendor"]
+
+
+def _get_vendor_assets(templates_dir: str) -> Dict[str, dict]:
+    """Finds the location of every JS/CSS library used by the pages.
+
+    Libraries bundled with the plugin (see fetch-assets.py) are referenced
+    locally, the remaining ones are loaded from the CDN.
+
+    Args:
+        templates_dir (str): Directory containing the templates and
+            the vendor directory.
+
+    Returns:
+        Dict[str, dict]: URL of every library and, for libraries loaded
+            from the CDN, their integrity hash (if known).
+    """
+    vendor_dir = os.path.join(templates_dir, "vendor")
+    with open(os.path.join(vendor_dir, VENDOR_MANIFEST), "r") as fh:
+        manifest = json.load(fh)
+    return {
+        name: (
+            {"url": f"vendor/{asset['file']}", "integrity": None}
+            if os.path.isfile(os.path.join(vendor_dir, asset["file"]))
+            else {"url": asset["url"], "integrity": asset.get("integrity")}
+        )
+        for name, asset in manifest.items()
+    }
+
+
+def _copy_assets(templates_dir: str, output_dir: str):
+    """Copies the plugin's own assets into the visualization.
+
+    Assets of q2templates' base templates are placed by q2templates.render,
+    only the directories next to the plugin's templates are copied here.
+    The vendor manifest is not used by the pages, so it is skipped.
+
+    Args:
+        templates_dir (str): Directory containing the templates and
+            their asset directories.
+        output_dir (str): The visualization's output directory.
+    """
+    for asset_dir in ASSET_DIRS:
+        shutil.copytree(
+            os.path.join(templates_dir, asset_dir),
+            os.path.join(output_dir, asset_dir),
+            dirs_exist_ok=True,
+            ignore=shutil.ignore_patterns(VENDOR_MANIFEST),
+        )
@@ -0,0 +1,101 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+from typing import List
+
+MEMINFO_PATH = "/proc/meminfo"
+
+# approximate memory required by every pplacer thread when placing bins
+# in CheckM's full and reduced reference trees
+PPLACER_MEMORY = {"full": 40 * 1024**3, "reduced": 14 * 1024**3}
+
+
+def _get_available_cpus() -> int:
+    """Finds the number of CPUs the current process is allowed to use.
+
+    Returns:
+        int: Number of available CPUs.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _get_available_memory(meminfo_path: str = MEMINFO_PATH) -> int:
+    """Finds the amount of memory available for new processes.
+
+    Args:
+        meminfo_path (str): Path to the meminfo file.
+
+    Returns:
+        int: Available memory (in bytes) or None if it could not be determined.
+    """
+    try:
+        with open(meminfo_path, "r") as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _plan_threads(
+    bins_per_sample: List[int],
+    cpus: int,
+    memory: int = None,
+    reduced_tree: bool = False,
+) -> dict:
+    """Splits the available CPUs between concurrently evaluated samples.
+
+    CheckM processes the bins of a sample in parallel, so a sample cannot
+    make use of more threads than it has bins - the remaining CPUs are used
+    to evaluate several samples at once. pplacer's memory usage grows with
+    every thread, so the number of pplacer threads across all the concurrent
+    samples is limited by the available memory.
+
+    Args:
+        bins_per_sample (List[int]): Number of bins in every sample.
+        cpus (int): Number of available CPUs.
+        memory (int): Available memory (in bytes). Only the CPUs are
+            considered if not provided.
+        reduced_tree (bool): Whether the reduced tree will be used.
+
+    Returns:
+        dict: The plan, including the number of concurrently evaluated
+            samples (concurrency) as well as threads and pplacer_threads to
+            be used for every sample.
+    """
+    cpus = max(1, cpus)
+    samples = len([x for x in bins_per_sample if x > 0])
+    bins_per_sample = sorted(x for x in bins_per_sample if x > 0) or [1]
+    typical_bins = bins_per_sample[len(bins_per_sample) // 2]
+    pplacer_memory = PPLACER_MEMORY["reduced" if reduced_tree else "full"]
+    memory_slots = max(1, memory // pplacer_memory) if memory else cpus
+
+    concurrency = max(
+        1,
+        min(
+            len(bins_per_sample),
+            memory_slots,
+            cpus // min(typical_bins, cpus),
+        ),
+    )
+    threads = max(1, min(cpus // concurrency, bins_per_sample[-1]))
+    pplacer_threads = max(1, min(threads, memory_slots // concurrency))
+
+    return {
+        "cpus": cpus,
+        "memory_available": memory,
+        "samples": samples,
+        "max_bins_per_sample": bins_per_sample[-1],
+        "concurrency": concurrency,
+        "threads": threads,
+        "pplacer_threads": pplacer_threads,
+    }
@@ -0,0 +1,136 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Iterable, List
+
+# file stored with every saved sample, describing the bins it was run on
+RESUME_MARKER = "resume.json"
+
+# CheckM parameters which do not change the results of lineage_wf
+RESUME_IGNORED_PARAMS = ["threads", "pplacer_threads"]
+
+
+def _get_resume_dir(resume_dir: str, db_fingerprint: str, checkm_params: dict) -> str:
+    """Finds the location of the results which can be reused by a run.
+
+    Results are only reused by runs with the same CheckM database and
+    the same CheckM parameters (apart from the number of threads).
+
+    Args:
+        resume_dir (str): Directory in which the results of all the runs
+            are kept.
+        db_fingerprint (str): Fingerprint of the CheckM database.
+        checkm_params (dict): Parameters passed to CheckM.
+
+    Returns:
+        str: The (created) subdirectory of the resume_dir for this run.
+    """
+    key = json.dumps(
+        {
+            "db": db_fingerprint,
+            "params": {
+                k: v
+                for k, v in checkm_params.items()
+                if k not in RESUME_IGNORED_PARAMS and v is not None
+            },
+        },
+        sort_keys=True,
+    )
+    run_dir = os.path.join(
+        resume_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    )
+    os.makedirs(run_dir, exist_ok=True)
+    return run_dir
+
+
+def _get_bins_key(bin_fps: Iterable[str]) -> List[list]:
+    """Describes the bins of a sample, to check whether saved results apply.
+
+    Bins are identified by their file names and the SHA-256 hashes of their
+    contents, so that results of bins which were re-assembled under the same
+    name are never reused.
+
+    Args:
+        bin_fps (Iterable[str]): Paths to the sample's bins.
+
+    Returns:
+        List[list]: Sorted list of [file name, hash] entries.
+    """
+    key = []
+    for fp in bin_fps:
+        digest = hashlib.sha256()
+        with open(fp, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                digest.update(chunk)
+        key.append([os.path.basename(fp), digest.hexdigest()])
+    return sorted(key)
+
+
+def _restore_sample(
+    resume_dir: str, sample: str, bins_key: List[list], sample_results: str
+) -> bool:
+    """Copies the saved lineage_wf results of a sample, if there are any.
+
+    Args:
+        resume_dir (str): The run's directory in the resume directory.
+        sample (str): The sample ID.
+        bins_key (List[list]): Description of the sample's bins (see
+            _get_bins_key) - results are only restored if they were
+            generated from the same bins.
+        sample_results (str): The sample's results directory.
+
+    Returns:
+        bool: Whether the results were restored.
+    """
+    saved_dir = os.path.join(resume_dir, sample)
+    try:
+        with open(os.path.join(saved_dir, RESUME_MARKER), "r") as fh:
+            saved_bins = json.load(fh)["bins"]
+    except (OSError, ValueError, KeyError):
+        return False
+    if saved_bins != bins_key:
+        return False
+
+    shutil.copytree(
+        saved_dir,
+        sample_results,
+        ignore=shutil.ignore_patterns(RESUME_MARKER),
+        dirs_exist_ok=True,
+    )
+    return True
+
+
+def _save_sample(
+    resume_dir: str, sample: str, bins_key: List[list], sample_results: str
+):
+    """Saves the lineage_wf results of a sample so that later runs can
+        reuse them.
+
+    Results are first copied into a temporary directory which is then
+    renamed, so that partially saved results are never restored.
+
+    Args:
+        resume_dir (str): The run's directory in the resume directory.
+        sample (str): The sample ID.
+        bins_key (List[list]): Description of the sample's bins (see
+            _get_bins_key).
+        sample_results (str): The sample's results directory.
+    """
+    tmp_dir = tempfile.mkdtemp(dir=resume_dir, prefix=f".{sample}-")
+    shutil.copytree(sample_results, tmp_dir, dirs_exist_ok=True)
+    with open(os.path.join(tmp_dir, RESUME_MARKER), "w") as fh:
+        json.dump({"bins": bins_key}, fh)
+
+    saved_dir = os.path.join(resume_dir, sample)
+    if os.path.isdir(saved_dir):
+        shutil.rmtree(saved_dir)
+    os.rename(tmp_dir, saved_dir)
@@ -0,0 +1,119 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# file (inside the visualization) holding the index, loaded by js/binSearch.js
+SEARCH_INDEX_FILE = "search_index.js"
+
+# columns which can be searched by prefix
+SEARCH_FIELDS = ["bin_id", "sample_id", "marker_lineage"]
+
+# length of the longest prefix stored in the index - longer queries are
+# resolved by a binary search within the range of their stored prefix
+SEARCH_PREFIX_LENGTH = 3
+
+# columns shown in the results table (if present in the CheckM results)
+SEARCH_TABLE_COLUMNS = [
+    "sample_id",
+    "bin_id",
+    "marker_lineage",
+    "completeness",
+    "contamination",
+    "mimag_quality",
+    "genome_size",
+    "contigs",
+    "n50_contigs",
+    "gc",
+]
+
+
+def _index_field(values: pd.Series, prefix_length: int) -> dict:
+    """Builds the prefix index of a single column.
+
+    Rows are sorted by their (lowercase) value, so that all the rows
+    starting with the same prefix form a contiguous range of that order.
+
+    Args:
+        values (pd.Series): Values of the column.
+        prefix_length (int): Length of the longest prefix to be stored.
+
+    Returns:
+        dict: The order of the rows and the [start, end) range of
+            that order covered by every prefix.
+    """
+    keys = values.fillna("").astype(str).str.lower()
+    order = np.argsort(keys.to_numpy(dtype=object), kind="stable")
+    sorted_keys = keys.iloc[order].reset_index(drop=True)
+    positions = pd.Series(np.arange(len(sorted_keys)))
+
+    prefixes = {}
+    for length in range(1, prefix_length + 1):
+        prefix = sorted_keys.str[:length]
+        # shorter values were already stored with their own length
+        prefix = prefix[sorted_keys.str.len() >= length]
+        ranges = positions[prefix.index].groupby(prefix, sort=False).agg(["min", "max"])
+        prefixes.update(
+            (key, [int(start), int(end) + 1]) for key, start, end in ranges.itertuples()
+        )
+    return {"order": order.tolist(), "prefixes": prefixes}
+
+
+def _build_search_index(
+    checkm_results: pd.DataFrame, prefix_length: int = SEARCH_PREFIX_LENGTH
+) -> dict:
+    """Builds the index used to search for bins in the visualization.
+
+    Args:
+        checkm_results (pd.DataFrame): The CheckM results.
+        prefix_length (int): Length of the longest prefix to be stored.
+
+    Returns:
+        dict: The rows of the results table (stored column-wise) and
+            the prefix index of every searchable column.
+    """
+    columns = [c for c in SEARCH_TABLE_COLUMNS if c in checkm_results.columns]
+    table = checkm_results[columns].reset_index(drop=True)
+    numeric = table.select_dtypes("number").columns
+    table[numeric] = table[numeric].round(2)
+    table = table.astype(object).where(table.notna(), None)
+
+    return {
+        "prefix_length": prefix_length,
+        "columns": columns,
+        "rows": {col: table[col].tolist() for col in columns},
+        "fields": {
+            field: _index_field(checkm_results[field], prefix_length)
+            for field in SEARCH_FIELDS
+            if field in checkm_results.columns
+        },
+    }
+
+
+def _write_search_index(output_dir: str, checkm_results: pd.DataFrame) -> str:
+    """Writes the search index into the visualization.
+
+    The index is stored as a script (rather than plain JSON) so that
+    the page can load it on demand also when opened from the disk.
+
+    Args:
+        output_dir (str): The visualization's output directory.
+        checkm_results (pd.DataFrame): The CheckM results.
+
+    Returns:
+        str: Path to the index, relative to the visualization.
+    """
+    index = _build_search_index(checkm_results)
+    with open(os.path.join(output_dir, SEARCH_INDEX_FILE), "w") as fh:
+        fh.write("window.checkmSearchIndex = ")
+        json.dump(index, fh, separators=(",", ":"), allow_nan=False)
+        fh.write(";\n")
+    return SEARCH_INDEX_FILE
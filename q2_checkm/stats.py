@@ -0,0 +1,256 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+
+# columns of the results table which can be calculated directly
+# from the bin sequences (without running CheckM)
+SEQUENCE_STATS_COLS = [
+    "gc",
+    "gc_std",
+    "genome_size",
+    "ambiguous_bases",
+    "scaffolds",
+    "contigs",
+    "longest_scaffold",
+    "longest_contig",
+    "n50_scaffolds",
+    "n50_contigs",
+    "mean_scaffold_length",
+    "mean_contig_length",
+]
+
+# the values below follow the definitions used by CheckM (binStatistics.py):
+# scaffolds are split into contigs on runs of at least CONTIG_BREAK_LEN Ns
+# and only scaffolds longer than MIN_SEQ_LEN_GC_STD contribute to the GC std,
+# which is calculated around the GC content of the whole bin; like CheckM's
+# baseCount, GC content is calculated relative to the A/C/G/T/U bases (so U
+# counts as A/T and other ambiguous bases are ignored) and scaffolds without
+# any of those bases have a GC content of 0
+CONTIG_BREAK_LEN = 10
+MIN_SEQ_LEN_GC_STD = 1000
+
+
+def _build_lut(chars: str) -> np.ndarray:
+    """Creates a byte lookup table marking the provided characters.
+
+    Args:
+        chars (str): Characters to be marked (case-insensitive).
+
+    Returns:
+        np.ndarray: Boolean array of length 256.
+    """
+    lut = np.zeros(256, dtype=bool)
+    for char in chars:
+        lut[ord(char.upper())] = lut[ord(char.lower())] = True
+    return lut
+
+
+GC_LUT = _build_lut("GC")
+AT_LUT = _build_lut("ATU")
+N_LUT = _build_lut("N")
+WHITESPACE_LUT = _build_lut(" \t\r\n")
+
+
+def _read_sequences(fp: str) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Reads all the sequences from a FASTA file.
+
+    The file is memory-mapped and processed at the byte level: all header
+    lines and whitespace are masked out and the remaining bytes are assigned
+    to the scaffold they belong to.
+
+    Args:
+        fp (str): Path to the FASTA file.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, int]: Sequence bytes of all the
+            scaffolds, scaffold index of every byte and the total
+            scaffold count.
+    """
+    if os.path.getsize(fp) == 0:
+        return np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.int64), 0
+    data = np.memmap(fp, dtype=np.uint8, mode="r")
+
+    newlines = np.flatnonzero(data == ord("\n"))
+    line_starts = np.concatenate(([0], newlines + 1))
+    line_starts = line_starts[line_starts < data.size]
+    header_starts = line_starts[data[line_starts] == ord(">")]
+    header_ends = np.append(newlines, data.size)[
+        np.searchsorted(newlines, header_starts)
+    ]
+
+    # mark all the bytes belonging to header lines
+    header_bounds = np.zeros(data.size + 1, dtype=np.int8)
+    header_bounds[header_starts] = 1
+    header_bounds[header_ends] -= 1
+    in_header = np.cumsum(header_bounds[:-1], dtype=np.int8).astype(bool)
+
+    scaffold_starts = np.zeros(data.size, dtype=bool)
+    scaffold_starts[header_starts] = True
+    scaffold_ids = np.cumsum(scaffold_starts, dtype=np.int64) - 1
+
+    # anything preceding the first header is not part of any scaffold
+    mask = ~in_header & ~WHITESPACE_LUT[data] & (scaffold_ids >= 0)
+    return np.asarray(data[mask]), scaffold_ids[mask], header_starts.size
+
+
+def _calculate_n50(lengths: np.ndarray) -> int:
+    """Calculates the N50 of the provided sequence lengths.
+
+    Args:
+        lengths (np.ndarray): Sequence lengths.
+
+    Returns:
+        int: The N50 value.
+    """
+    if lengths.size == 0:
+        return 0
+    lengths = np.sort(lengths)[::-1]
+    cumulative = np.cumsum(lengths)
+    return int(lengths[np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+
+def _get_contig_lengths(seq: np.ndarray, scaffold_ids: np.ndarray) -> np.ndarray:
+    """Splits scaffolds into contigs on runs of Ns and finds their lengths.
+
+    Args:
+        seq (np.ndarray): Sequence bytes of all the scaffolds.
+        scaffold_ids (np.ndarray): Scaffold index of every byte.
+
+    Returns:
+        np.ndarray: Lengths of all the contigs.
+    """
+    if seq.size == 0:
+        return np.empty(0, dtype=np.int64)
+    new_scaffold = np.ones(seq.size, dtype=bool)
+    new_scaffold[1:] = scaffold_ids[1:] != scaffold_ids[:-1]
+
+    # find runs of Ns which are long enough to break a scaffold
+    is_n = N_LUT[seq]
+    run_starts = is_n & (new_scaffold | ~np.concatenate(([False], is_n[:-1])))
+    run_ids = np.cumsum(run_starts) - 1
+    run_lengths = np.bincount(run_ids[is_n], minlength=int(run_starts.sum()))
+    is_break = np.zeros(seq.size, dtype=bool)
+    is_break[is_n] = run_lengths[run_ids[is_n]] >= CONTIG_BREAK_LEN
+
+    # everything else forms the contigs
+    in_contig = ~is_break
+    contig_starts = in_contig & (
+        new_scaffold | ~np.concatenate(([False], in_contig[:-1]))
+    )
+    contig_ids = np.cumsum(contig_starts) - 1
+    return np.bincount(contig_ids[in_contig], minlength=int(contig_starts.sum()))
+
+
+def _calculate_bin_stats(fp: str) -> dict:
+    """Calculates sequence statistics of a single bin.
+
+    Args:
+        fp (str): Path to the bin's FASTA file.
+
+    Returns:
+        dict: Dictionary with all the SEQUENCE_STATS_COLS statistics.
+    """
+    seq, scaffold_ids, scaffold_count = _read_sequences(fp)
+
+    scaffold_lengths = np.bincount(scaffold_ids, minlength=scaffold_count)
+    gc_counts = np.bincount(scaffold_ids, GC_LUT[seq], minlength=scaffold_count)
+    at_counts = np.bincount(scaffold_ids, AT_LUT[seq], minlength=scaffold_count)
+    acgt_counts = gc_counts + at_counts
+
+    gc = gc_counts.sum() / acgt_counts.sum() if acgt_counts.sum() > 0 else 0.0
+    gc_per_scaffold = np.divide(
+        gc_counts,
+        acgt_counts,
+        out=np.zeros(scaffold_count, dtype=float),
+        where=acgt_counts > 0,
+    )
+    gc_std_mask = scaffold_lengths > MIN_SEQ_LEN_GC_STD
+    if gc_std_mask.sum() > 1:
+        gc_std = np.sqrt(np.mean((gc_per_scaffold[gc_std_mask] - gc) ** 2))
+    else:
+        gc_std = 0.0
+
+    contig_lengths = _get_contig_lengths(seq, scaffold_ids)
+
+    return {
+        "gc": float(gc),
+        "gc_std": float(gc_std),
+        "genome_size": int(seq.size),
+        "ambiguous_bases": int(N_LUT[seq].sum()),
+        "scaffolds": int(scaffold_count),
+        "contigs": int(contig_lengths.size),
+        "longest_scaffold": int(scaffold_lengths.max(initial=0)),
+        "longest_contig": int(contig_lengths.max(initial=0)),
+        "n50_scaffolds": _calculate_n50(scaffold_lengths),
+        "n50_contigs": _calculate_n50(contig_lengths),
+        "mean_scaffold_length": (
+            float(scaffold_lengths.mean()) if scaffold_count else 0.0
+        ),
+        "mean_contig_length": (
+            float(contig_lengths.mean()) if contig_lengths.size else 0.0
+        ),
+    }
+
+
+def _calculate_sequence_stats(
+    bins: MultiMAGSequencesDirFmt, threads: int = 1
+) -> pd.DataFrame:
+    """Calculates sequence statistics of all the bins.
+
+    Args:
+        bins (MultiMAGSequencesDirFmt): The bins to be analyzed.
+        threads (int): Number of bins to be processed in parallel.
+
+    Returns:
+        pd.DataFrame: A pandas DataFrame with one row per bin containing
+            sample and bin IDs as well as all the SEQUENCE_STATS_COLS.
+    """
+    manifest: pd.DataFrame = bins.manifest.view(pd.DataFrame).reset_index()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        stats = list(executor.map(_calculate_bin_stats, manifest["filename"]))
+
+    df = pd.DataFrame(stats, columns=SEQUENCE_STATS_COLS)
+    df.insert(0, "sample_id", manifest["sample-id"].values)
+    df.insert(1, "bin_id", manifest["mag-id"].values)
+    return df
+
+
+def _prefilter_bins(
+    stats: pd.DataFrame,
+    min_genome_size: int = None,
+    min_n50: int = None,
+    max_contigs: int = None,
+) -> pd.Series:
+    """Finds bins which pass the provided sequence statistics thresholds.
+
+    Args:
+        stats (pd.DataFrame): Sequence statistics of all the bins, as
+            returned by _calculate_sequence_stats.
+        min_genome_size (int): Minimum genome size (in bp).
+        min_n50 (int): Minimum contig N50 (in bp).
+        max_contigs (int): Maximum number of contigs.
+
+    Returns:
+        pd.Series: Boolean mask indicating which bins passed all the
+            thresholds.
+    """
+    mask = pd.Series(True, index=stats.index)
+    if min_genome_size:
+        mask &= stats["genome_size"] >= min_genome_size
+    if min_n50:
+        mask &= stats["n50_contigs"] >= min_n50
+    if max_contigs:
+        mask &= stats["contigs"] <= max_contigs
+    return mask
@@ -6,28 +6,50 @@
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
 import contextlib
+import io
 import json
 import os
 import shutil
+import subprocess
 import tempfile
 import unittest
-from unittest.mock import call, patch
+from unittest.mock import MagicMock, call, patch
 from zipfile import ZipFile
 
 import pandas as pd
 from pandas._testing import assert_frame_equal
-from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+from q2_types.per_sample_sequences import BAMDirFmt, MultiMAGSequencesDirFmt
 from qiime2.plugin.testing import TestPluginBase
 
+from q2_checkm._format import CheckMResultsDirFmt
 from q2_checkm.checkm import (
+    CHECKM_COLUMNS,
+    MIMAG_TIERS,
+    NON_CHECKM_PARAMS,
+    QC_CATEGORIES,
+    _classify_bins,
     _classify_completeness,
+    _classify_mimag_quality,
     _draw_checkm_plots,
     _evaluate_bins,
+    _get_failure_record,
+    _get_thread_plan,
     _parse_checkm_reports,
     _parse_single_checkm_report,
+    _read_failures,
+    _render_report,
+    _run_checkm,
+    _visualize_checkm_results,
     _zip_checkm_plots,
+    evaluate_bin_stats,
+    evaluate_bins,
+    evaluate_bins_parallel,
+    run_checkm,
+    visualize_checkm,
 )
-from q2_checkm.utils import _get_plots_per_sample
+from q2_checkm.jobqueue import _JobQueue
+from q2_checkm.progress import STAGES, _ProgressTracker
+from q2_checkm.utils import _get_plots_per_sample, _ScratchSpace
 
 
 class TestCheckM(TestPluginBase):
@@ -91,10 +113,60 @@ class TestCheckM(TestPluginBase):
         assert_frame_equal(exp, obs, check_less_precise=2)
 
     def test_classify_completeness(self):
-        self.assertEqual("near", _classify_completeness(90.5))
-        self.assertEqual("substantial", _classify_completeness(75.0))
-        self.assertEqual("moderate", _classify_completeness(52.0))
-        self.assertEqual("partial", _classify_completeness(25.0))
+        obs = _classify_completeness(
+            pd.Series(
+                [90.5, 90.0, 75.0, 52.0, 25.0, float("nan")], index=list("abcdef")
+            )
+        )
+        exp = pd.Series(
+            pd.Categorical(
+                ["near", "near", "substantial", "moderate", "partial", "not evaluated"],
+                categories=QC_CATEGORIES,
+            ),
+            index=list("abcdef"),
+        )
+        pd.testing.assert_series_equal(obs, exp)
+
+    def test_classify_mimag_quality(self):
+        obs = _classify_mimag_quality(
+            pd.Series([95.0, 90.0, 95.0, 50.0, 49.9, 99.0, float("nan"), 80.0]),
+            pd.Series([4.9, 1.0, 5.0, 9.9, 0.0, 10.0, 1.0, float("nan")]),
+        )
+        exp = pd.Series(
+            pd.Categorical(
+                [
+                    "high",
+                    "medium",
+                    "medium",
+                    "medium",
+                    "low",
+                    "contaminated",
+                    "not evaluated",
+                    "not evaluated",
+                ],
+                categories=MIMAG_TIERS,
+            )
+        )
+        pd.testing.assert_series_equal(obs, exp)
+
+    def test_classify_bins(self):
+        results = pd.DataFrame(
+            {
+                "bin_id": ["b1", "b2"],
+                "completeness": [92.0, 60.0],
+                "contamination": [1.0, 12.0],
+            }
+        )
+        obs = _classify_bins(results)
+
+        self.assertListEqual(obs["qc_category"].tolist(), ["near", "moderate"])
+        self.assertListEqual(obs["mimag_quality"].tolist(), ["high", "contaminated"])
+        self.assertNotIn("qc_category", results.columns)
+
+    def test_parse_checkm_reports_empty(self):
+        obs = _parse_checkm_reports({})
+        self.assertTrue(obs.empty)
+        self.assertListEqual(list(obs.columns), ["sample_id", *CHECKM_COLUMNS.values()])
 
     @patch("subprocess.run")
     def test_draw_checkm_plots(self, p1):
@@ -223,6 +295,722 @@ class TestCheckM(TestPluginBase):
                 common_args=["--reduced_tree", "--threads", "2"],
             )
 
+    @patch("subprocess.run")
+    def test_evaluate_bins_concurrent(self, p1):
+        shutil.copytree(
+            self.get_data_path("checkm_reports"), self._tmp, dirs_exist_ok=True
+        )
+        progress = _ProgressTracker(verbose=False)
+        progress.add_jobs("lineage_wf", {"samp1": 2, "samp2": 1}, concurrency=2)
+        obs_fps = _evaluate_bins(
+            results_dir=self._tmp,
+            bins=self.bins,
+            db_path=self.db_path,
+            common_args=["--threads", "2"],
+            concurrency=2,
+            progress=progress,
+        )
+
+        obs_progress = progress.snapshot()["stages"]["lineage_wf"]
+        self.assertEqual(obs_progress["completed"], 2)
+        self.assertEqual(obs_progress["bins_completed"], 3)
+        self.assertEqual(p1.call_count, 2)
+        self.assertSetEqual(
+            {x.args[0][-1] for x in p1.call_args_list},
+            {os.path.join(self._tmp, f"samp{x}") for x in range(1, 3)},
+        )
+        self.assertListEqual(sorted(obs_fps.keys()), ["samp1", "samp2"])
+
+    def test_get_thread_plan_manual(self):
+        obs = _get_thread_plan(self.bins, {"threads": 4, "pplacer_threads": None})
+        self.assertDictEqual(
+            obs,
+            {
+                "auto_threads": False,
+                "concurrency": 1,
+                "threads": 4,
+                "pplacer_threads": None,
+            },
+        )
+
+    @patch("q2_checkm.checkm._get_available_memory", return_value=64 * 1024**3)
+    @patch("q2_checkm.checkm._get_available_cpus", return_value=8)
+    def test_get_thread_plan_auto(self, p1, p2):
+        with self.assertWarnsRegex(UserWarning, "ignored when auto_threads"):
+            obs = _get_thread_plan(
+                self.bins, {"auto_threads": True, "threads": 2, "reduced_tree": True}
+            )
+
+        self.assertTrue(obs["auto_threads"])
+        self.assertEqual(obs["cpus"], 8)
+        self.assertEqual(obs["samples"], 2)
+        self.assertEqual(obs["max_bins_per_sample"], 2)
+        self.assertEqual(obs["concurrency"], 2)
+        self.assertEqual(obs["threads"], 2)
+        self.assertEqual(obs["pplacer_threads"], 2)
+
+    def fake_queue_wait(self, queue, returncode=0, intermediates=()):
+        # emulates workers by placing CheckM's reports (and, optionally,
+        # some of its intermediate files) in the job outputs
+        def wait(job_ids):
+            outcomes = {}
+            for job_id in job_ids:
+                with open(
+                    os.path.join(queue.queue_dir, "jobs", f"{job_id}.json")
+                ) as fh:
+                    job = json.load(fh)
+                sample = os.path.basename(job["output_dir"])
+                shutil.copytree(
+                    self.get_data_path(f"checkm_reports/{sample}"), job["output_dir"]
+                )
+                for fp in intermediates:
+                    fp = os.path.join(job["output_dir"], fp)
+                    os.makedirs(os.path.dirname(fp), exist_ok=True)
+                    open(fp, "w").close()
+                with open(job["log"], "w") as fh:
+                    fh.write("oops\n")
+                outcomes[job_id] = {"returncode": returncode, "log_tail": "oops"}
+            return outcomes
+
+        return wait
+
+    @patch("subprocess.run")
+    def test_evaluate_bins_queued(self, p1):
+        results_dir = os.path.join(self._tmp, "results")
+        with _JobQueue(os.path.join(self._tmp, "queue")) as queue:
+            with patch.object(queue, "wait", side_effect=self.fake_queue_wait(queue)):
+                obs_fps = _evaluate_bins(
+                    results_dir=results_dir,
+                    bins=self.bins,
+                    db_path=self.db_path,
+                    common_args=["--threads", "2"],
+                    job_queue=queue,
+                )
+
+            p1.assert_not_called()
+            for x in range(1, 3):
+                with open(
+                    os.path.join(
+                        queue.queue_dir, "jobs", f"{queue.run_id}-samp{x}.json"
+                    )
+                ) as fh:
+                    job = json.load(fh)
+                self.assertListEqual(
+                    job["cmd"],
+                    [
+                        "checkm",
+                        "lineage_wf",
+                        "--threads",
+                        "2",
+                        "-x",
+                        "fasta",
+                        os.path.join(queue.run_dir, "bins", f"samp{x}"),
+                        os.path.join(queue.run_dir, "results", f"samp{x}"),
+                    ],
+                )
+                self.assertEqual(job["db_path"], self.db_path)
+                self.assertEqual(
+                    os.readlink(os.path.join(results_dir, f"samp{x}")),
+                    os.path.join(queue.run_dir, "results", f"samp{x}"),
+                )
+                self.assertTrue(os.path.isfile(obs_fps[f"samp{x}"]))
+
+    def test_evaluate_bins_queued_resume_pruned(self):
+        resume_dir = os.path.join(self._tmp, "resume")
+        os.makedirs(resume_dir)
+        intermediates = ["lineage.ms", "bins/bin1/genes.faa", "bins/bin1/genes.gff"]
+        with _ScratchSpace(scratch_dir=self._tmp) as scratch, _JobQueue(
+            os.path.join(self._tmp, "queue")
+        ) as queue:
+            with patch.object(
+                queue,
+                "wait",
+                side_effect=self.fake_queue_wait(queue, intermediates=intermediates),
+            ):
+                _evaluate_bins(
+                    results_dir=os.path.join(self._tmp, "results"),
+                    bins=self.bins,
+                    db_path=self.db_path,
+                    common_args=[],
+                    scratch=scratch,
+                    job_queue=queue,
+                    resume_dir=resume_dir,
+                )
+
+        # only the files required by the later stages are saved
+        saved = sorted(
+            os.path.relpath(os.path.join(root, fn), os.path.join(resume_dir, "samp1"))
+            for root, _, files in os.walk(os.path.join(resume_dir, "samp1"))
+            for fn in files
+        )
+        self.assertListEqual(
+            saved, ["bins/bin1/genes.gff", "resume.json", "storage/bin_stats_ext.tsv"]
+        )
+
+    def test_evaluate_bins_queued_failed(self):
+        progress = _ProgressTracker(verbose=False)
+        with _JobQueue(os.path.join(self._tmp, "queue")) as queue:
+            with patch.object(
+                queue, "wait", side_effect=self.fake_queue_wait(queue, returncode=1)
+            ):
+                with self.assertRaises(subprocess.CalledProcessError) as cm:
+                    _evaluate_bins(
+                        results_dir=os.path.join(self._tmp, "results"),
+                        bins=self.bins,
+                        db_path=self.db_path,
+                        common_args=[],
+                        job_queue=queue,
+                        progress=progress,
+                    )
+        self.assertEqual(cm.exception.output, "oops")
+        self.assertEqual(progress.snapshot()["jobs"]["failed"], 2)
+
+    def fake_lineage_wf(self, failing=()):
+        # emulates CheckM by placing its reports in the results directory
+        def run(cmd, **kwargs):
+            sample = os.path.basename(cmd[-1])
+            if sample in failing:
+                output = "".join(f"line {i}\n" for i in range(30))
+                if "stdout" in kwargs:
+                    kwargs["stdout"].write(output)
+                    raise subprocess.CalledProcessError(1, cmd)
+                raise subprocess.CalledProcessError(1, cmd, stderr=output)
+            shutil.copytree(
+                self.get_data_path(f"checkm_reports/{sample}"),
+                cmd[-1],
+                dirs_exist_ok=True,
+            )
+            return MagicMock(stderr="")
+
+        return run
+
+    def test_get_failure_record(self):
+        error = subprocess.CalledProcessError(
+            2, ["checkm"], stderr="".join(f"line {i}\n" for i in range(30))
+        )
+        obs = _get_failure_record("samp1", "gc_plot", error)
+
+        self.assertEqual(obs["sample_id"], "samp1")
+        self.assertEqual(obs["stage"], "gc_plot")
+        self.assertEqual(obs["returncode"], 2)
+        self.assertEqual(obs["error"].splitlines()[0], "line 10")
+        self.assertEqual(obs["error"].splitlines()[-1], "line 29")
+
+    def test_get_failure_record_missing_report(self):
+        obs = _get_failure_record("samp1", "lineage_wf", FileNotFoundError("gone"))
+        self.assertIsNone(obs["returncode"])
+        self.assertEqual(obs["error"], "gone")
+
+    def test_evaluate_bins_continue_on_error(self):
+        failures = []
+        with patch(
+            "subprocess.run", side_effect=self.fake_lineage_wf(failing=["samp1"])
+        ):
+            obs_fps = _evaluate_bins(
+                results_dir=self._tmp,
+                bins=self.bins,
+                db_path=self.db_path,
+                common_args=[],
+                failures=failures,
+            )
+
+        self.assertListEqual(list(obs_fps), ["samp2"])
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0]["sample_id"], "samp1")
+        self.assertEqual(failures[0]["stage"], "lineage_wf")
+        self.assertEqual(failures[0]["returncode"], 1)
+        self.assertEqual(failures[0]["error"].splitlines()[-1], "line 29")
+
+    def test_evaluate_bins_logs(self):
+        log_dir = os.path.join(self._tmp, "logs")
+        failures = []
+        with patch(
+            "subprocess.run", side_effect=self.fake_lineage_wf(failing=["samp1"])
+        ) as p1, contextlib.redirect_stderr(io.StringIO()):
+            _evaluate_bins(
+                results_dir=os.path.join(self._tmp, "results"),
+                bins=self.bins,
+                db_path=self.db_path,
+                common_args=[],
+                failures=failures,
+                log_dir=log_dir,
+            )
+
+        self.assertEqual(p1.call_args.kwargs["stderr"], subprocess.STDOUT)
+        self.assertListEqual(sorted(os.listdir(log_dir)), ["samp1", "samp2"])
+        with open(os.path.join(log_dir, "samp1", "lineage_wf.log")) as fh:
+            obs = fh.read()
+        self.assertTrue(obs.startswith("Command: checkm lineage_wf -x fasta"))
+        self.assertTrue(obs.endswith("line 29\n"))
+        # the failure is reported from the log
+        self.assertEqual(failures[0]["error"].splitlines()[-1], "line 29")
+        self.assertTrue(
+            os.path.isfile(os.path.join(log_dir, "samp2", "lineage_wf.log"))
+        )
+
+    def test_evaluate_bins_continue_on_error_missing_report(self):
+        failures = []
+        with patch("subprocess.run", return_value=MagicMock(stderr="")):
+            obs_fps = _evaluate_bins(
+                results_dir=self._tmp,
+                bins=self.bins,
+                db_path=self.db_path,
+                common_args=[],
+                failures=failures,
+            )
+
+        self.assertDictEqual(obs_fps, {})
+        self.assertListEqual([x["sample_id"] for x in failures], ["samp1", "samp2"])
+        self.assertTrue(all(x["returncode"] is None for x in failures))
+
+    def test_evaluate_bins_queued_continue_on_error(self):
+        failures = []
+        with _JobQueue(os.path.join(self._tmp, "queue")) as queue:
+            with patch.object(
+                queue, "wait", side_effect=self.fake_queue_wait(queue, returncode=1)
+            ):
+                obs_fps = _evaluate_bins(
+                    results_dir=os.path.join(self._tmp, "results"),
+                    bins=self.bins,
+                    db_path=self.db_path,
+                    common_args=[],
+                    job_queue=queue,
+                    failures=failures,
+                    log_dir=os.path.join(self._tmp, "logs"),
+                )
+
+        self.assertDictEqual(obs_fps, {})
+        # workers' logs are collected
+        with open(os.path.join(self._tmp, "logs", "samp1", "lineage_wf.log")) as fh:
+            self.assertEqual(fh.read(), "oops\n")
+        self.assertListEqual(
+            [(x["sample_id"], x["returncode"], x["error"]) for x in failures],
+            [("samp1", 1, "oops"), ("samp2", 1, "oops")],
+        )
+
+    def test_evaluate_bins_resume(self):
+        resume_dir = os.path.join(self._tmp, "resume")
+        os.makedirs(resume_dir)
+        with patch(
+            "subprocess.run", side_effect=self.fake_lineage_wf(failing=["samp2"])
+        ):
+            _evaluate_bins(
+                results_dir=os.path.join(self._tmp, "run1"),
+                bins=self.bins,
+                db_path=self.db_path,
+                common_args=[],
+                failures=[],
+                resume_dir=resume_dir,
+            )
+        self.assertListEqual(sorted(os.listdir(resume_dir)), ["samp1"])
+
+        # only the failed sample is evaluated again
+        progress = _ProgressTracker(verbose=False)
+        progress.add_jobs("lineage_wf", {"samp1": 2, "samp2": 1})
+        with patch("subprocess.run", side_effect=self.fake_lineage_wf()) as p1:
+            obs_fps = _evaluate_bins(
+                results_dir=os.path.join(self._tmp, "run2"),
+                bins=self.bins,
+                db_path=self.db_path,
+                common_args=[],
+                failures=[],
+                resume_dir=resume_dir,
+                progress=progress,
+            )
+
+        self.assertEqual(p1.call_count, 1)
+        self.assertEqual(
+            p1.call_args.args[0][-1], os.path.join(self._tmp, "run2", "samp2")
+        )
+        self.assertListEqual(sorted(obs_fps), ["samp1", "samp2"])
+        self.assertEqual(
+            obs_fps["samp1"],
+            os.path.join(self._tmp, "run2", "samp1", "storage", "bin_stats_ext.tsv"),
+        )
+        self.assertTrue(os.path.isfile(obs_fps["samp1"]))
+        self.assertListEqual(sorted(os.listdir(resume_dir)), ["samp1", "samp2"])
+        obs_progress = progress.snapshot()["jobs"]
+        self.assertEqual(obs_progress["skipped"], 1)
+        self.assertEqual(obs_progress["completed"], 1)
+
+    def test_draw_checkm_plots_continue_on_error(self):
+        def run(cmd, **kwargs):
+            if cmd[-4].endswith("samp1"):
+                raise subprocess.CalledProcessError(1, cmd, stderr="no plot")
+            return MagicMock(stderr="")
+
+        failures = []
+        with patch("subprocess.run", side_effect=run):
+            obs = _draw_checkm_plots(
+                results_dir=self._tmp,
+                bins=self.bins,
+                db_path=self.db_path,
+                plot_type="gc",
+                failures=failures,
+            )
+
+        self.assertListEqual(list(obs), ["samp2"])
+        self.assertListEqual(
+            failures,
+            [
+                {
+                    "sample_id": "samp1",
+                    "stage": "gc_plot",
+                    "returncode": 1,
+                    "error": "no plot",
+                }
+            ],
+        )
+
+    def test_read_failures(self):
+        failure = {"sample_id": "samp1", "stage": "lineage_wf"}
+        with open(os.path.join(self._tmp, "run_info.json"), "w") as fh:
+            json.dump({"thread_plan": {}, "failures": [failure]}, fh)
+        self.assertListEqual(_read_failures(self._tmp), [failure])
+
+        with open(os.path.join(self._tmp, "run_info.json"), "w") as fh:
+            json.dump(
+                {"partitions": [{"failures": [failure]}, {"thread_plan": {}}]}, fh
+            )
+        self.assertListEqual(_read_failures(self._tmp), [failure])
+
+        os.remove(os.path.join(self._tmp, "run_info.json"))
+        self.assertListEqual(_read_failures(self._tmp), [])
+
+    def test_render_report(self):
+        def render(templates, output_dir, context):
+            # q2templates copies its own assets, including Bootstrap 3
+            for fp in ["css/bootstrap.min.css", "js/bootstrap.min.js"]:
+                os.makedirs(
+                    os.path.join(output_dir, "q2templateassets", os.path.dirname(fp)),
+                    exist_ok=True,
+                )
+                open(os.path.join(output_dir, "q2templateassets", fp), "w").close()
+
+        with patch("q2templates.render", side_effect=render) as p2:
+            _render_report(self._tmp, {"fake": "context"}, ["index.html"])
+
+        p2.assert_called_once()
+        self.assertTrue(p2.call_args.args[0][0].endswith("index.html"))
+        self.assertIn("vega", p2.call_args.kwargs["context"]["vendor"])
+        self.assertTrue(os.path.isfile(os.path.join(self._tmp, "css", "styles.css")))
+        self.assertFalse(
+            os.path.exists(os.path.join(self._tmp, "vendor", "vendor.json"))
+        )
+        self.assertListEqual(
+            os.listdir(os.path.join(self._tmp, "q2templateassets", "css")), []
+        )
+
+    @patch("q2_checkm.checkm._render_report")
+    @patch("q2_checkm.plots._draw_overview_plots", return_value={"fake": "spec"})
+    @patch("q2_checkm.plots._draw_detailed_plots", return_value=[{"fake": "spec"}])
+    def test_visualize_checkm_results_search_index(self, p1, p2, p3):
+        results = pd.read_csv(self.get_data_path("results/results.tsv"), sep="\t")
+        _visualize_checkm_results(self._tmp, results)
+
+        context = p3.call_args.args[1]
+        self.assertEqual(context["search_index"], "search_index.js")
+        with open(os.path.join(self._tmp, "search_index.js")) as fh:
+            self.assertIn('"bin_id":["bin1","bin2","bin1","bin2"]', fh.read())
+
+    @patch("q2_checkm.checkm._render_report")
+    def test_visualize_checkm_results_all_failed(self, p1):
+        results = pd.DataFrame(columns=["sample_id", *CHECKM_COLUMNS.values()])
+        failures = [_get_failure_record("samp1", "lineage_wf", OSError("boom"))]
+
+        _visualize_checkm_results(self._tmp, results, failures=failures)
+
+        context = p1.call_args.args[1]
+        self.assertListEqual(context["failures"], failures)
+        for key in ["vega_plots_detailed", "vega_plots_overview", "search_index"]:
+            self.assertNotIn(key, context)
+        self.assertListEqual(os.listdir(self._tmp), [])
+
+    @patch("q2_checkm.checkm._render_report")
+    @patch("q2_checkm.plots._draw_stats_plots", return_value={"fake": "spec"})
+    def test_evaluate_bin_stats(self, p1, p2):
+        evaluate_bin_stats(self._tmp, self.bins)
+
+        obs = pd.read_csv(os.path.join(self._tmp, "results.tsv"), sep="\t")
+        self.assertListEqual(list(obs.columns), ["sample_id", *CHECKM_COLUMNS.values()])
+        self.assertListEqual(obs["bin_id"].tolist(), ["bin1", "bin2", "bin1"])
+        self.assertTrue(obs["completeness"].isna().all())
+        self.assertTrue(obs["marker_lineage"].isna().all())
+        self.assertTrue((obs["genome_size"] > 0).all())
+
+        p2.assert_called_once()
+        self.assertTrue(p2.call_args.args[1]["stats_only"])
+        self.assertEqual(
+            p2.call_args.args[1]["vega_plots_overview"], '{"fake": "spec"}'
+        )
+
+    def fake_checkm(self, calls):
+        # emulates all the CheckM commands: lineage_wf reports the fixture
+        # results of the bins it was given, plots are written as empty files
+        def run(cmd, **kwargs):
+            calls.append(cmd[1])
+            if cmd[1] == "lineage_wf":
+                bins_dir, sample_results = cmd[-2], cmd[-1]
+                sample = os.path.basename(sample_results)
+                bins = {os.path.splitext(fn)[0] for fn in os.listdir(bins_dir)}
+                with open(
+                    self.get_data_path(
+                        f"checkm_reports/{sample}/storage/bin_stats_ext.tsv"
+                    )
+                ) as fh:
+                    report = [x for x in fh if x.split("\t")[0] in bins]
+                os.makedirs(os.path.join(sample_results, "storage"))
+                with open(
+                    os.path.join(sample_results, "storage", "bin_stats_ext.tsv"), "w"
+                ) as fh:
+                    fh.writelines(report)
+            else:
+                plot_dir = next(x for x in cmd if f"{os.sep}plots{os.sep}" in x)
+                os.makedirs(plot_dir)
+                open(os.path.join(plot_dir, f"{cmd[1]}.svg"), "w").close()
+            return MagicMock(stderr="")
+
+        return run
+
+    def run_checkm_end_to_end(self, output_dir, params, **kwargs):
+        # runs the full _run_checkm path with all the CheckM commands emulated
+        calls = []
+        os.makedirs(output_dir)
+        with patch(
+            "q2_checkm.checkm._validate_checkm_db", return_value="fingerprint"
+        ), patch("subprocess.run", side_effect=self.fake_checkm(calls)):
+            obs = _run_checkm(output_dir, self.bins, params, **kwargs)
+        return obs, calls
+
+    def test_run_checkm_end_to_end_prefilter(self):
+        output_dir = os.path.join(self._tmp, "run")
+        obs, calls = self.run_checkm_end_to_end(
+            output_dir,
+            {"db_path": self.db_path, "threads": 2, "min_genome_size": 40000},
+        )
+
+        # only the bin passing the prefilter was evaluated by CheckM,
+        # the remaining ones got stats-only rows
+        self.assertListEqual(calls, ["lineage_wf", "gc_plot", "nx_plot", "coding_plot"])
+        self.assertListEqual(
+            obs[["sample_id", "bin_id"]].values.tolist(),
+            [["samp1", "bin2"], ["samp1", "bin1"], ["samp2", "bin1"]],
+        )
+        self.assertAlmostEqual(obs["completeness"][0], 93.87, places=2)
+        self.assertTrue(obs["completeness"][1:].isna().all())
+        self.assertListEqual(obs["qc_category"].tolist()[1:], ["not evaluated"] * 2)
+        # sizes reported by CheckM are kept, the remaining ones are calculated
+        self.assertListEqual(obs["genome_size"].tolist(), [5895359, 37838, 37838])
+
+        written = pd.read_csv(os.path.join(output_dir, "results.tsv"), sep="\t")
+        self.assertListEqual(written["bin_id"].tolist(), obs["bin_id"].tolist())
+        # plots are only drawn for the evaluated bins
+        with ZipFile(os.path.join(output_dir, "checkm_plots.zip")) as zf:
+            self.assertListEqual(
+                sorted(zf.namelist()),
+                [
+                    "coding/samp1/coding_plot.svg",
+                    "gc/samp1/gc_plot.svg",
+                    "nx/samp1/nx_plot.svg",
+                ],
+            )
+
+    def test_run_checkm_end_to_end_raw_stats(self):
+        output_dir = os.path.join(self._tmp, "run")
+        self.run_checkm_end_to_end(
+            output_dir,
+            {"db_path": self.db_path, "min_genome_size": 40000},
+            raw_stats_dir=os.path.join(output_dir, "bin_stats"),
+        )
+
+        # raw statistics are only kept for samples evaluated by CheckM
+        self.assertListEqual(
+            os.listdir(os.path.join(output_dir, "bin_stats")), ["samp1"]
+        )
+        with open(
+            os.path.join(output_dir, "bin_stats", "samp1", "bin_stats_ext.tsv")
+        ) as fh:
+            self.assertListEqual([x.split("\t")[0] for x in fh], ["bin2"])
+
+    @patch("q2_checkm.checkm._get_available_memory", return_value=64 * 1024**3)
+    @patch("q2_checkm.checkm._get_available_cpus", return_value=8)
+    def test_run_checkm_end_to_end_thread_plan(self, p1, p2):
+        output_dir = os.path.join(self._tmp, "run")
+        params = {"db_path": self.db_path, "auto_threads": True}
+        self.run_checkm_end_to_end(output_dir, params)
+
+        # the plan used for the run is stored with the results
+        with open(os.path.join(output_dir, "run_info.json")) as fh:
+            run_info = json.load(fh)
+        self.assertDictEqual(
+            run_info["thread_plan"], _get_thread_plan(self.bins, params)
+        )
+        self.assertTrue(run_info["thread_plan"]["auto_threads"])
+
+    def test_run_checkm_end_to_end_mimag_quality(self):
+        output_dir = os.path.join(self._tmp, "run")
+        obs, _ = self.run_checkm_end_to_end(
+            output_dir, {"db_path": self.db_path, "min_genome_size": 40000}
+        )
+
+        # bins filtered out before CheckM are not evaluated
+        self.assertListEqual(
+            obs["mimag_quality"].tolist(), ["high", "not evaluated", "not evaluated"]
+        )
+        written = pd.read_csv(os.path.join(output_dir, "results.tsv"), sep="\t")
+        self.assertListEqual(
+            written["mimag_quality"].tolist(), obs["mimag_quality"].tolist()
+        )
+
+    def test_run_checkm_end_to_end_coverage(self):
+        output_dir = os.path.join(self._tmp, "run")
+        obs, _ = self.run_checkm_end_to_end(
+            output_dir,
+            {"db_path": self.db_path, "min_genome_size": 40000},
+            alignments=BAMDirFmt(self.get_data_path("alignments"), "r"),
+        )
+
+        # coverage is calculated for all the bins, also the filtered ones
+        self.assertTrue(obs["mean_depth"].notna().all())
+        self.assertTrue(obs["covered_fraction"].notna().all())
+        contig_coverage = pd.read_csv(
+            os.path.join(output_dir, "contig_coverage.tsv"), sep="\t"
+        )
+        self.assertListEqual(
+            sorted(contig_coverage["sample_id"].unique()), ["samp1", "samp2"]
+        )
+
+    def test_run_checkm_end_to_end_resume(self):
+        params = {
+            "db_path": self.db_path,
+            "min_genome_size": 40000,
+            "resume_dir": os.path.join(self._tmp, "resume"),
+        }
+        obs, _ = self.run_checkm_end_to_end(os.path.join(self._tmp, "run1"), params)
+
+        # the evaluated sample is restored from the saved results
+        obs_resumed, calls = self.run_checkm_end_to_end(
+            os.path.join(self._tmp, "run2"), params
+        )
+        self.assertListEqual(calls, ["gc_plot", "nx_plot", "coding_plot"])
+        assert_frame_equal(obs_resumed, obs)
+
+    def test_run_checkm_end_to_end_logs(self):
+        output_dir = os.path.join(self._tmp, "run")
+        self.run_checkm_end_to_end(
+            output_dir, {"db_path": self.db_path, "min_genome_size": 40000}
+        )
+
+        # every CheckM command run for the evaluated sample gets its own log
+        with ZipFile(os.path.join(output_dir, "checkm_logs.zip")) as zf:
+            self.assertListEqual(
+                sorted(zf.namelist()),
+                [f"samp1/{x}.log" for x in sorted(STAGES)],
+            )
+
+    @patch("q2_checkm.checkm._run_checkm")
+    def test_run_checkm(self, p1):
+        obs = run_checkm(self.bins, self.db_path, reduced_tree=True, threads=2)
+
+        self.assertIsInstance(obs, CheckMResultsDirFmt)
+        p1.assert_called_once()
+        output_dir, bins, params = p1.call_args.args
+        self.assertEqual(output_dir, str(obs))
+        self.assertIs(bins, self.bins)
+        self.assertEqual(params["db_path"], self.db_path)
+        self.assertTrue(params["reduced_tree"])
+        self.assertEqual(params["threads"], 2)
+        self.assertIsNone(params["min_n50"])
+        self.assertEqual(
+            p1.call_args.kwargs["raw_stats_dir"], os.path.join(str(obs), "bin_stats")
+        )
+        self.assertIsNone(p1.call_args.kwargs["alignments"])
+        self.assertIn("alignments", NON_CHECKM_PARAMS)
+
+    @patch("q2_checkm.checkm._visualize_checkm_results")
+    def test_visualize_checkm(self, p1):
+        results = CheckMResultsDirFmt(self.get_data_path("results"), "r")
+        visualize_checkm(self._tmp, results)
+
+        for fn in [
+            "results.tsv",
+            "checkm_plots.zip",
+            "checkm_logs.zip",
+            "run_info.json",
+        ]:
+            self.assertTrue(os.path.isfile(os.path.join(self._tmp, fn)))
+        p1.assert_called_once()
+        self.assertEqual(p1.call_args.args[0], self._tmp)
+        assert_frame_equal(
+            p1.call_args.args[1],
+            pd.read_csv(self.get_data_path("results/results.tsv"), sep="\t"),
+        )
+
+    @patch("q2_checkm.checkm._visualize_checkm_results")
+    @patch("q2_checkm.checkm._run_checkm", return_value="fake results")
+    def test_evaluate_bins_compute_and_render(self, p1, p2):
+        evaluate_bins(self._tmp, self.bins, self.db_path, unique=5)
+
+        p1.assert_called_once()
+        self.assertEqual(p1.call_args.args[0], self._tmp)
+        self.assertEqual(p1.call_args.args[2]["unique"], 5)
+        p2.assert_called_once_with(self._tmp, "fake results", failures=[])
+
+    def test_evaluate_bins_parallel(self):
+        actions = {
+            "partition_mags": MagicMock(
+                return_value=({"0": "partition0", "1": "partition1"},)
+            ),
+            "run_checkm": MagicMock(side_effect=[("results0",), ("results1",)]),
+            "collate_checkm_results": MagicMock(return_value=("collated",)),
+            "visualize_checkm": MagicMock(return_value=("viz",)),
+        }
+        ctx = MagicMock()
+        ctx.get_action.side_effect = lambda plugin, action: actions[action]
+
+        obs = evaluate_bins_parallel(
+            ctx, self.bins, self.db_path, threads=3, num_partitions=2
+        )
+
+        self.assertTupleEqual(obs, ("collated", "viz"))
+        actions["partition_mags"].assert_called_once_with(self.bins, 2)
+        self.assertListEqual(
+            [x.args[0] for x in actions["run_checkm"].call_args_list],
+            ["partition0", "partition1"],
+        )
+        run_kwargs = actions["run_checkm"].call_args.kwargs
+        self.assertEqual(run_kwargs["db_path"], self.db_path)
+        self.assertEqual(run_kwargs["threads"], 3)
+        self.assertNotIn("num_partitions", run_kwargs)
+        actions["collate_checkm_results"].assert_called_once_with(
+            ["results0", "results1"]
+        )
+        actions["visualize_checkm"].assert_called_once_with("collated")
+
+    def test_evaluate_bins_parallel_progress_file(self):
+        actions = {
+            "partition_mags": MagicMock(
+                return_value=({"0": "partition0", "1": "partition1"},)
+            ),
+            "run_checkm": MagicMock(side_effect=[("results0",), ("results1",)]),
+            "collate_checkm_results": MagicMock(return_value=("collated",)),
+            "visualize_checkm": MagicMock(return_value=("viz",)),
+        }
+        ctx = MagicMock()
+        ctx.get_action.side_effect = lambda plugin, action: actions[action]
+        progress_fp = os.path.join(self._tmp, "progress.jsonl")
+
+        evaluate_bins_parallel(ctx, self.bins, self.db_path, progress_file=progress_fp)
+
+        # every partition gets its own progress file
+        self.assertListEqual(
+            [x.kwargs["progress_file"] for x in actions["run_checkm"].call_args_list],
+            [
+                os.path.join(self._tmp, "progress.0.jsonl"),
+                os.path.join(self._tmp, "progress.1.jsonl"),
+            ],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,168 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from q2_types.per_sample_sequences import BAMDirFmt, MultiMAGSequencesDirFmt
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.coverage import (
+    CONTIG_COVERAGE_COLS,
+    COVERAGE_COLS,
+    _calculate_coverage,
+    _calculate_sample_coverage,
+    _find_alignments,
+    _index_bam,
+    _read_contig_ids,
+)
+
+
+def contig_lengths(fp):
+    lengths, contig_id = {}, None
+    with open(fp) as fh:
+        for line in fh:
+            if line.startswith(">"):
+                contig_id = line[1:].split()[0]
+                lengths[contig_id] = 0
+            else:
+                lengths[contig_id] += len(line.strip())
+    return lengths
+
+
+class TestCoverage(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.bins = MultiMAGSequencesDirFmt(self.get_data_path("bins"), "r")
+        self.alignments = BAMDirFmt(self.get_data_path("alignments"), "r")
+        self.lengths = {
+            (sample, mag): contig_lengths(self.get_data_path(f"bins/{sample}/{mag}.fa"))
+            for sample, mag in [("samp1", "bin1"), ("samp1", "bin2"), ("samp2", "bin1")]
+        }
+
+    def test_read_contig_ids(self):
+        obs = _read_contig_ids(self.get_data_path("bins/samp1/bin1.fa"))
+        self.assertListEqual(obs, list(self.lengths[("samp1", "bin1")]))
+
+    def test_find_alignments(self):
+        obs = _find_alignments(self.alignments)
+        self.assertDictEqual(
+            obs,
+            {
+                "samp1": self.get_data_path("alignments/samp1_alignment.bam"),
+                "samp2": self.get_data_path("alignments/samp2_alignment.bam"),
+            },
+        )
+
+    def test_index_bam_sorted(self):
+        bam_fp = self.get_data_path("alignments/samp1_alignment.bam")
+        obs_bam, obs_index = _index_bam(bam_fp, self._tmp)
+
+        self.assertEqual(obs_bam, bam_fp)
+        self.assertEqual(os.path.dirname(obs_index), self._tmp)
+        self.assertTrue(os.path.isfile(obs_index))
+        self.assertFalse(os.path.exists(f"{bam_fp}.bai"))
+
+    def test_index_bam_unsorted(self):
+        bam_fp = self.get_data_path("alignments/samp2_alignment.bam")
+        obs_bam, obs_index = _index_bam(bam_fp, self._tmp)
+
+        self.assertEqual(obs_bam, os.path.join(self._tmp, "samp2_alignment.sorted.bam"))
+        self.assertTrue(os.path.isfile(obs_bam))
+        self.assertTrue(os.path.isfile(obs_index))
+
+    def test_calculate_sample_coverage(self):
+        bins = pd.DataFrame(
+            {
+                "bin_id": ["bin1", "bin2"],
+                "filename": [
+                    self.get_data_path("bins/samp1/bin1.fa"),
+                    self.get_data_path("bins/samp1/bin2.fa"),
+                ],
+            }
+        )
+        obs = _calculate_sample_coverage(
+            "samp1", bins, self.get_data_path("alignments/samp1_alignment.bam")
+        )
+
+        self.assertListEqual(list(obs.columns), CONTIG_COVERAGE_COLS)
+        self.assertEqual(
+            len(obs),
+            len(self.lengths[("samp1", "bin1")]) + len(self.lengths[("samp1", "bin2")]),
+        )
+        obs = obs.set_index("contig_id")
+        # overlapping reads at 0 and 50 only cover 150 bases
+        node8 = obs.loc["NODE_8_length_2049_cov_1.733701"]
+        self.assertEqual(node8["bin_id"], "bin1")
+        self.assertEqual(node8["length"], 2049)
+        self.assertEqual(node8["aligned_bases"], 400)
+        self.assertEqual(node8["covered_bases"], 350)
+        self.assertAlmostEqual(node8["mean_depth"], 400 / 2049)
+        node2 = obs.loc["NODE_2_length_4483_cov_1.839883"]
+        self.assertEqual(node2["aligned_bases"], 900)
+        self.assertEqual(node2["covered_bases"], 900)
+        self.assertEqual(obs["aligned_bases"].sum(), 1300)
+
+    def test_calculate_coverage(self):
+        with self.assertWarnsRegex(UserWarning, "1 contigs could not be found"):
+            contigs, obs = _calculate_coverage(self.bins, self.alignments, threads=2)
+
+        self.assertListEqual(list(obs.columns), ["sample_id", "bin_id", *COVERAGE_COLS])
+        self.assertListEqual(
+            list(zip(obs["sample_id"], obs["bin_id"])),
+            [("samp1", "bin1"), ("samp1", "bin2"), ("samp2", "bin1")],
+        )
+        samp1_bin1 = sum(self.lengths[("samp1", "bin1")].values())
+        samp1_bin2 = sum(self.lengths[("samp1", "bin2")].values())
+        # NODE_14 is missing from the alignments of samp2
+        samp2_bin1 = sum(
+            v
+            for k, v in self.lengths[("samp2", "bin1")].items()
+            if not k.startswith("NODE_14_")
+        )
+        exp_depth = [400 / samp1_bin1, 900 / samp1_bin2, 250 / samp2_bin1]
+        exp_covered = [350 / samp1_bin1, 900 / samp1_bin2, 250 / samp2_bin1]
+        for obs_x, exp_x in zip(obs["mean_depth"], exp_depth):
+            self.assertAlmostEqual(obs_x, exp_x)
+        for obs_x, exp_x in zip(obs["covered_fraction"], exp_covered):
+            self.assertAlmostEqual(obs_x, exp_x)
+
+        self.assertEqual(str(contigs["aligned_bases"].dtype), "Int64")
+        missing = contigs[contigs["length"].isna()]
+        self.assertListEqual(
+            missing["contig_id"].tolist(), ["NODE_14_length_1939_cov_1.524416"]
+        )
+        self.assertTrue(missing["mean_depth"].isna().all())
+
+    def test_calculate_coverage_missing_sample(self):
+        os.makedirs(os.path.join(self._tmp, "alignments"))
+        shutil.copy2(
+            self.get_data_path("alignments/samp1_alignment.bam"),
+            os.path.join(self._tmp, "alignments", "samp1_alignment.bam"),
+        )
+        alignments = BAMDirFmt(os.path.join(self._tmp, "alignments"), "r")
+
+        with self.assertWarnsRegex(UserWarning, "following samples.*: samp2"):
+            contigs, obs = _calculate_coverage(self.bins, alignments)
+
+        self.assertSetEqual(set(contigs["sample_id"]), {"samp1"})
+        self.assertListEqual(obs["sample_id"].tolist(), ["samp1", "samp1", "samp2"])
+        self.assertTrue(obs["mean_depth"].iloc[:2].notna().all())
+        self.assertTrue(obs["mean_depth"].iloc[2:].isna().all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,203 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.database import (
+    CHECKM_DB_LAYOUT,
+    CHECKM_TREES,
+    FINGERPRINT_FILE,
+    STAGED_DB_DIR,
+    STAGED_FINGERPRINT_FILE,
+    _get_db_fingerprint,
+    _get_missing_db_files,
+    _read_staged_fingerprint,
+    _staged_db,
+    _validate_checkm_db,
+)
+
+
+class TestCheckMDatabase(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.db_path = os.path.join(self._tmp, "checkm_db")
+        self.create_fake_db(self.db_path)
+
+    @staticmethod
+    def create_fake_db(db_path, skip=()):
+        for path in [*CHECKM_DB_LAYOUT, *CHECKM_TREES.values()]:
+            if path in skip:
+                continue
+            fp = os.path.join(db_path, path)
+            if "." in os.path.basename(path) and not path.endswith(".refpkg"):
+                os.makedirs(os.path.dirname(fp), exist_ok=True)
+                with open(fp, "w") as fh:
+                    fh.write(path)
+            else:
+                os.makedirs(fp, exist_ok=True)
+
+    def test_get_missing_db_files_complete(self):
+        self.assertListEqual(_get_missing_db_files(self.db_path), [])
+        self.assertListEqual(_get_missing_db_files(self.db_path, True), [])
+
+    def test_get_missing_db_files_missing(self):
+        db_path = os.path.join(self._tmp, "incomplete_db")
+        self.create_fake_db(
+            db_path, skip=(os.path.join("hmms", "phylo.hmm"), CHECKM_TREES["full"])
+        )
+
+        obs = _get_missing_db_files(db_path)
+        self.assertListEqual(
+            obs, [os.path.join("hmms", "phylo.hmm"), CHECKM_TREES["full"]]
+        )
+        obs = _get_missing_db_files(db_path, reduced_tree=True)
+        self.assertListEqual(obs, [os.path.join("hmms", "phylo.hmm")])
+
+    def test_validate_checkm_db_missing_dir(self):
+        with self.assertRaisesRegex(FileNotFoundError, "directory .* not be found"):
+            _validate_checkm_db(os.path.join(self._tmp, "missing"))
+
+    def test_validate_checkm_db_incomplete(self):
+        db_path = os.path.join(self._tmp, "incomplete_db")
+        self.create_fake_db(db_path, skip=("taxon_marker_sets.tsv",))
+
+        with self.assertRaisesRegex(
+            FileNotFoundError, "incomplete.*: taxon_marker_sets.tsv."
+        ):
+            _validate_checkm_db(db_path)
+
+    def test_validate_checkm_db(self):
+        obs = _validate_checkm_db(self.db_path)
+        self.assertEqual(obs, _get_db_fingerprint(self.db_path))
+
+    def test_get_db_fingerprint_cached(self):
+        obs1 = _get_db_fingerprint(self.db_path)
+        with open(os.path.join(self.db_path, FINGERPRINT_FILE)) as fh:
+            self.assertEqual(json.load(fh)["fingerprint"], obs1)
+
+        with patch("os.walk") as p1:
+            obs2 = _get_db_fingerprint(self.db_path)
+        p1.assert_not_called()
+        self.assertEqual(obs1, obs2)
+
+    def test_get_db_fingerprint_changed(self):
+        obs1 = _get_db_fingerprint(self.db_path)
+        with open(os.path.join(self.db_path, "taxon_marker_sets.tsv"), "a") as fh:
+            fh.write("more markers")
+
+        obs2 = _get_db_fingerprint(self.db_path)
+        self.assertNotEqual(obs1, obs2)
+
+    def test_get_db_fingerprint_read_only(self):
+        with patch("builtins.open", side_effect=PermissionError):
+            obs = _get_db_fingerprint(self.db_path)
+
+        self.assertEqual(len(obs), 64)
+        self.assertFalse(os.path.exists(os.path.join(self.db_path, FINGERPRINT_FILE)))
+
+    def test_staged_db_no_cache(self):
+        with _staged_db(self.db_path) as obs:
+            self.assertEqual(obs, self.db_path)
+
+    def test_staged_db(self):
+        cache_dir = os.path.join(self._tmp, "cache")
+        fingerprint = _get_db_fingerprint(self.db_path)
+
+        with _staged_db(self.db_path, cache_dir) as obs:
+            self.assertEqual(obs, os.path.join(cache_dir, STAGED_DB_DIR))
+            self.assertListEqual(_get_missing_db_files(obs), [])
+            self.assertFalse(os.path.exists(os.path.join(obs, FINGERPRINT_FILE)))
+            self.assertEqual(_read_staged_fingerprint(obs), fingerprint)
+
+            # the copy should be locked while in use
+            with open(f"{obs}.lock", "a") as lock:
+                with self.assertRaises(BlockingIOError):
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(lock, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def test_staged_db_shared(self):
+        cache_dir = os.path.join(self._tmp, "cache")
+        entered, release = threading.Event(), threading.Event()
+
+        def use_db():
+            with _staged_db(self.db_path, cache_dir):
+                entered.set()
+                release.wait(timeout=10)
+
+        with _staged_db(self.db_path, cache_dir):
+            # a concurrent run uses the copy without waiting for this one
+            worker = threading.Thread(target=use_db)
+            worker.start()
+            self.assertTrue(entered.wait(timeout=10))
+            release.set()
+            worker.join(timeout=10)
+        self.assertFalse(worker.is_alive())
+
+    def test_staged_db_refresh_waits_for_users(self):
+        cache_dir = os.path.join(self._tmp, "cache")
+        refreshed = threading.Event()
+
+        def use_new_db():
+            with _staged_db(self.db_path, cache_dir, fingerprint="new"):
+                refreshed.set()
+
+        with _staged_db(self.db_path, cache_dir) as obs:
+            worker = threading.Thread(target=use_new_db)
+            worker.start()
+            # the copy cannot be replaced while it is still in use
+            self.assertFalse(refreshed.wait(timeout=0.5))
+            self.assertNotEqual(_read_staged_fingerprint(obs), "new")
+        worker.join(timeout=10)
+
+        self.assertTrue(refreshed.is_set())
+        self.assertEqual(_read_staged_fingerprint(obs), "new")
+
+    def test_staged_db_reused(self):
+        cache_dir = os.path.join(self._tmp, "cache")
+        with _staged_db(self.db_path, cache_dir):
+            pass
+
+        with patch("shutil.copytree") as p1:
+            with _staged_db(self.db_path, cache_dir) as obs:
+                self.assertEqual(obs, os.path.join(cache_dir, STAGED_DB_DIR))
+        p1.assert_not_called()
+
+    def test_staged_db_refreshed(self):
+        cache_dir = os.path.join(self._tmp, "cache")
+        with _staged_db(self.db_path, cache_dir):
+            pass
+        with open(os.path.join(self.db_path, "selected_marker_sets.tsv"), "w") as fh:
+            fh.write("new markers")
+        os.makedirs(os.path.join(cache_dir, f"{STAGED_DB_DIR}.tmp-123"))
+
+        with _staged_db(self.db_path, cache_dir) as obs:
+            with open(os.path.join(obs, "selected_marker_sets.tsv")) as fh:
+                self.assertEqual(fh.read(), "new markers")
+            with open(os.path.join(obs, STAGED_FINGERPRINT_FILE)) as fh:
+                self.assertEqual(fh.read(), _get_db_fingerprint(self.db_path))
+        self.assertListEqual(
+            sorted(os.listdir(cache_dir)), [STAGED_DB_DIR, f"{STAGED_DB_DIR}.lock"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
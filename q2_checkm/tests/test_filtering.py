@@ -0,0 +1,86 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm._format import CheckMResultsDirFmt
+from q2_checkm.filtering import _get_quality_mask, filter_mags
+
+
+class TestFiltering(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.bins = MultiMAGSequencesDirFmt(self.get_data_path("bins"), "r")
+        self.results = CheckMResultsDirFmt(self.get_data_path("results"), "r")
+
+    def create_results(self, df_func):
+        results_dir = os.path.join(self._tmp, "results")
+        shutil.copytree(self.get_data_path("results"), results_dir)
+        df = pd.read_csv(os.path.join(results_dir, "results.tsv"), sep="\t")
+        df_func(df).to_csv(
+            os.path.join(results_dir, "results.tsv"), sep="\t", index=False
+        )
+        return CheckMResultsDirFmt(results_dir, "r")
+
+    def get_bins(self, mags):
+        manifest = mags.manifest.view(pd.DataFrame).reset_index()
+        return list(zip(manifest["sample-id"], manifest["mag-id"]))
+
+    def test_get_quality_mask(self):
+        results = pd.DataFrame(
+            {
+                "completeness": [95.0, 60.0, 95.0, None],
+                "contamination": [1.0, 1.0, 12.0, None],
+            }
+        )
+        obs = _get_quality_mask(results, min_completeness=90, max_contamination=10)
+        self.assertListEqual(obs.tolist(), [True, False, False, False])
+
+    def test_get_quality_mask_no_thresholds(self):
+        results = pd.DataFrame({"completeness": [95.0, None]})
+        obs = _get_quality_mask(results)
+        self.assertListEqual(obs.tolist(), [True, True])
+
+    def test_filter_mags(self):
+        obs = filter_mags(self.bins, self.results, min_completeness=95.0)
+
+        self.assertListEqual(self.get_bins(obs), [("samp1", "bin1"), ("samp2", "bin1")])
+        manifest = obs.manifest.view(pd.DataFrame)
+        for fp in manifest["filename"]:
+            self.assertTrue(os.path.isfile(fp))
+            self.assertFalse(os.path.islink(fp))
+        self.assertFalse(os.path.exists(os.path.join(str(obs), "samp1", "bin2.fa")))
+
+    def test_filter_mags_not_evaluated(self):
+        results = self.create_results(lambda df: df[df["bin_id"] != "bin2"])
+
+        with self.assertWarnsRegex(UserWarning, "1 MAGs could not be found"):
+            obs = filter_mags(self.bins, results, max_contamination=5.0)
+        self.assertListEqual(self.get_bins(obs), [("samp1", "bin1"), ("samp2", "bin1")])
+
+    def test_filter_mags_none_passed(self):
+        results = self.create_results(lambda df: df.assign(completeness=None))
+
+        with self.assertRaisesRegex(ValueError, "None of the MAGs passed"):
+            filter_mags(self.bins, results, min_completeness=50.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
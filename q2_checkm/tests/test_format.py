@@ -0,0 +1,142 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from qiime2.plugin import ValidationError
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm._format import (
+    CheckMBinStatsFormat,
+    CheckMContigCoverageFormat,
+    CheckMLogsFormat,
+    CheckMPlotsFormat,
+    CheckMResultsDirFmt,
+    CheckMResultsFormat,
+    CheckMRunInfoFormat,
+)
+
+
+class TestCheckMFormats(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+
+    def test_results_format(self):
+        fmt = CheckMResultsFormat(self.get_data_path("results/results.tsv"), "r")
+        fmt.validate()
+
+    def test_results_format_missing_columns(self):
+        fp = os.path.join(self._tmp, "results.tsv")
+        with open(fp, "w") as fh:
+            fh.write("sample_id\tbin_id\tgc\nsamp1\tbin1\t0.5\n")
+
+        fmt = CheckMResultsFormat(fp, "r")
+        with self.assertRaisesRegex(
+            ValidationError, "missing .* columns: completeness, contamination"
+        ):
+            fmt.validate()
+
+    def test_contig_coverage_format(self):
+        fp = os.path.join(self._tmp, "contig_coverage.tsv")
+        with open(fp, "w") as fh:
+            fh.write(
+                "sample_id\tbin_id\tcontig_id\tlength\tmean_depth\n"
+                "samp1\tbin1\tNODE_1\t100\t2.5\n"
+            )
+
+        CheckMContigCoverageFormat(fp, "r").validate()
+
+    def test_contig_coverage_format_missing_columns(self):
+        fp = os.path.join(self._tmp, "contig_coverage.tsv")
+        with open(fp, "w") as fh:
+            fh.write("sample_id\tbin_id\tlength\nsamp1\tbin1\t100\n")
+
+        fmt = CheckMContigCoverageFormat(fp, "r")
+        with self.assertRaisesRegex(
+            ValidationError, "missing .* columns: contig_id, mean_depth"
+        ):
+            fmt.validate()
+
+    def test_bin_stats_format(self):
+        fmt = CheckMBinStatsFormat(
+            self.get_data_path("results/bin_stats/samp2/bin_stats_ext.tsv"), "r"
+        )
+        fmt.validate()
+
+    def test_bin_stats_format_invalid(self):
+        fp = os.path.join(self._tmp, "bin_stats_ext.tsv")
+        with open(fp, "w") as fh:
+            fh.write("bin1\t{'GC': 0.5}\nbin2\t0.5\n")
+
+        fmt = CheckMBinStatsFormat(fp, "r")
+        with self.assertRaisesRegex(ValidationError, "Line 2 .* expected format"):
+            fmt.validate()
+
+    def test_plots_format(self):
+        fmt = CheckMPlotsFormat(self.get_data_path("results/checkm_plots.zip"), "r")
+        fmt.validate()
+
+    def test_plots_format_not_zip(self):
+        fmt = CheckMPlotsFormat(self.get_data_path("results/results.tsv"), "r")
+        with self.assertRaisesRegex(ValidationError, "not a valid zip"):
+            fmt.validate()
+
+    def test_logs_format(self):
+        fmt = CheckMLogsFormat(self.get_data_path("results/checkm_logs.zip"), "r")
+        fmt.validate()
+
+    def test_logs_format_not_zip(self):
+        fmt = CheckMLogsFormat(self.get_data_path("results/results.tsv"), "r")
+        with self.assertRaisesRegex(ValidationError, "not a valid zip"):
+            fmt.validate()
+
+    def test_run_info_format(self):
+        fmt = CheckMRunInfoFormat(self.get_data_path("results/run_info.json"), "r")
+        fmt.validate()
+
+    def test_run_info_format_invalid(self):
+        fp = os.path.join(self._tmp, "run_info.json")
+        for content, error in [("{not json", "not a valid JSON"), ("[]", "mapping")]:
+            with open(fp, "w") as fh:
+                fh.write(content)
+            with self.assertRaisesRegex(ValidationError, error):
+                CheckMRunInfoFormat(fp, "r").validate()
+
+    def test_results_dir_format(self):
+        fmt = CheckMResultsDirFmt(self.get_data_path("results"), "r")
+        fmt.validate()
+
+    def test_results_dir_format_no_bin_stats(self):
+        results_dir = os.path.join(self._tmp, "results")
+        shutil.copytree(self.get_data_path("results"), results_dir)
+        shutil.rmtree(os.path.join(results_dir, "bin_stats"))
+        os.remove(os.path.join(results_dir, "run_info.json"))
+
+        fmt = CheckMResultsDirFmt(results_dir, "r")
+        fmt.validate()
+
+    def test_results_dir_format_missing_plots(self):
+        results_dir = os.path.join(self._tmp, "results")
+        os.makedirs(results_dir)
+        shutil.copy(self.get_data_path("results/results.tsv"), results_dir)
+
+        fmt = CheckMResultsDirFmt(results_dir, "r")
+        with self.assertRaises(ValidationError):
+            fmt.validate()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,257 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.jobqueue import (
+    DONE_DIR,
+    JOBS_DIR,
+    LEASES_DIR,
+    _claim_job,
+    _JobQueue,
+    _read_lease,
+    _run_job,
+    main,
+    run_worker,
+)
+
+# writes a marker file into the output directory, records the run in a log
+# shared by all the jobs (so that duplicated runs are detected) and prints
+# the database path
+FAKE_JOB = (
+    "import os, sys; "
+    "os.makedirs(sys.argv[1]); "
+    "open(os.path.join(sys.argv[1], 'done'), 'w').close(); "
+    "fh = open(sys.argv[3], 'a'); fh.write(os.path.basename(sys.argv[1]) + '\\n'); "
+    "fh.close(); "
+    "print(os.environ['CHECKM_DATA_PATH']); "
+    "sys.exit(int(sys.argv[2]))"
+)
+
+
+class TestJobQueue(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.queue_dir = os.path.join(self._tmp, "queue")
+        self.db_path = os.path.join(self._tmp, "db")
+        self.runs_log = os.path.join(self._tmp, "runs.log")
+
+    def submit(self, queue, name, exit_code=0):
+        output_dir = os.path.join(queue.run_dir, name)
+        cmd = [
+            sys.executable,
+            "-c",
+            FAKE_JOB,
+            output_dir,
+            str(exit_code),
+            self.runs_log,
+        ]
+        return queue.submit(name, cmd, self.db_path, output_dir)
+
+    def test_submit_and_claim(self):
+        with _JobQueue(self.queue_dir) as queue:
+            job_id = self.submit(queue, "samp1")
+
+            obs = _claim_job(self.queue_dir, "worker1", lease_timeout=60)
+            self.assertEqual(obs["job_id"], job_id)
+            self.assertEqual(obs["db_path"], self.db_path)
+            with open(obs["lease"]) as fh:
+                self.assertEqual(fh.read(), "worker1")
+
+            # the job is leased, so nobody else can claim it
+            self.assertIsNone(_claim_job(self.queue_dir, "worker2", 60))
+
+    def test_claim_stale_lease(self):
+        with _JobQueue(self.queue_dir) as queue:
+            job_id = self.submit(queue, "samp1")
+            job = _claim_job(self.queue_dir, "worker1", lease_timeout=60)
+            os.utime(job["lease"], (time.time() - 120, time.time() - 120))
+
+            obs = _claim_job(self.queue_dir, "worker2", lease_timeout=60)
+            self.assertEqual(obs["job_id"], job_id)
+            with open(obs["lease"]) as fh:
+                self.assertEqual(fh.read(), "worker2")
+
+    def test_claim_stale_lease_replaced(self):
+        with _JobQueue(self.queue_dir) as queue:
+            self.submit(queue, "samp1")
+            job = _claim_job(self.queue_dir, "worker1", lease_timeout=60)
+            os.utime(job["lease"], (time.time() - 120, time.time() - 120))
+
+            def replace_lease(lease_fp):
+                # another worker breaks the stale lease and claims the job
+                # right after it was checked by this worker
+                obs = _read_lease(lease_fp)
+                if lease_fp == job["lease"]:
+                    os.remove(lease_fp)
+                    with open(lease_fp, "w") as fh:
+                        fh.write("worker3")
+                return obs
+
+            with patch("q2_checkm.jobqueue._read_lease", side_effect=replace_lease):
+                obs = _claim_job(self.queue_dir, "worker2", lease_timeout=60)
+
+            self.assertIsNone(obs)
+            self.assertListEqual(
+                os.listdir(os.path.join(self.queue_dir, LEASES_DIR)),
+                [os.path.basename(job["lease"])],
+            )
+            with open(job["lease"]) as fh:
+                self.assertEqual(fh.read(), "worker3")
+
+    def test_run_job_lease_renewed_while_staging(self):
+        with _JobQueue(self.queue_dir) as queue:
+            self.submit(queue, "samp1")
+            job = _claim_job(self.queue_dir, "worker1", lease_timeout=0.3)
+            lease_ages = []
+
+            @contextlib.contextmanager
+            def slow_staging(db_path, cache_dir):
+                time.sleep(0.6)
+                lease_ages.append(time.time() - os.path.getmtime(job["lease"]))
+                yield db_path
+
+            with patch("q2_checkm.jobqueue._staged_db", side_effect=slow_staging):
+                _run_job(self.queue_dir, job, "worker1", lease_timeout=0.3)
+
+            self.assertLess(lease_ages[0], 0.3)
+            self.assertFalse(os.path.exists(job["lease"]))
+
+    def test_wait_no_workers(self):
+        with _JobQueue(self.queue_dir, poll_interval=0.01, start_timeout=0.1) as queue:
+            job_id = self.submit(queue, "samp1")
+            with self.assertRaisesRegex(TimeoutError, "picked up by a worker"):
+                queue.wait([job_id])
+
+    def test_wait_leased_job(self):
+        with _JobQueue(self.queue_dir, poll_interval=0.01, start_timeout=0.1) as queue:
+            job_id = self.submit(queue, "samp1")
+            job = _claim_job(self.queue_dir, "worker1", lease_timeout=60)
+
+            # a job which is being run does not time out
+            worker = threading.Timer(
+                0.3, _run_job, args=(self.queue_dir, job, "worker1", 60)
+            )
+            worker.start()
+            obs = queue.wait([job_id])
+            worker.join()
+
+        self.assertEqual(obs[job_id]["returncode"], 0)
+
+    def test_wait_worker_killed(self):
+        with _JobQueue(
+            self.queue_dir, poll_interval=0.01, start_timeout=0.3, lease_timeout=0.3
+        ) as queue:
+            output_dir = os.path.join(queue.run_dir, "samp1")
+            job_id = queue.submit("samp1", ["sleep", "2"], self.db_path, output_dir)
+            worker = multiprocessing.get_context("fork").Process(
+                target=run_worker,
+                args=(self.queue_dir,),
+                kwargs={"lease_timeout": 0.3, "poll_interval": 0.01},
+            )
+            worker.start()
+            lease_fp = os.path.join(self.queue_dir, LEASES_DIR, f"{job_id}.lease")
+            while not os.path.exists(lease_fp):
+                time.sleep(0.01)
+            # the worker dies while holding the lease, which then goes stale
+            worker.kill()
+            worker.join()
+
+            with self.assertRaisesRegex(TimeoutError, "kept alive by its worker"):
+                queue.wait([job_id])
+            self.assertTrue(os.path.exists(lease_fp))
+
+    def test_run_worker(self):
+        with _JobQueue(self.queue_dir, poll_interval=0.01) as queue:
+            job1 = self.submit(queue, "samp1")
+            job2 = self.submit(queue, "samp2", exit_code=3)
+
+            obs = run_worker(self.queue_dir, poll_interval=0.01, idle_timeout=0)
+            self.assertEqual(obs, 2)
+
+            outcomes = queue.wait([job1, job2])
+            self.assertEqual(outcomes[job1]["returncode"], 0)
+            self.assertEqual(outcomes[job1]["log_tail"].strip(), self.db_path)
+            self.assertEqual(outcomes[job2]["returncode"], 3)
+            self.assertTrue(
+                os.path.isfile(os.path.join(queue.run_dir, "samp1", "done"))
+            )
+            for subdir in [JOBS_DIR, LEASES_DIR]:
+                self.assertListEqual(
+                    os.listdir(os.path.join(self.queue_dir, subdir)), []
+                )
+
+        # everything related to the run should be gone
+        self.assertFalse(os.path.exists(queue.run_dir))
+        self.assertListEqual(os.listdir(os.path.join(self.queue_dir, DONE_DIR)), [])
+
+    def test_run_multiple_workers(self):
+        with _JobQueue(self.queue_dir, poll_interval=0.01) as queue:
+            job_ids = [self.submit(queue, f"samp{i}") for i in range(8)]
+
+            workers = [
+                threading.Thread(
+                    target=run_worker,
+                    args=(self.queue_dir,),
+                    kwargs={"poll_interval": 0.01, "idle_timeout": 0.5},
+                )
+                for _ in range(3)
+            ]
+            for worker in workers:
+                worker.start()
+            outcomes = queue.wait(job_ids)
+            for worker in workers:
+                worker.join()
+
+        self.assertListEqual(
+            [outcomes[job_id]["returncode"] for job_id in job_ids], [0] * 8
+        )
+        # every job ran exactly once
+        with open(self.runs_log) as fh:
+            self.assertListEqual(
+                sorted(fh.read().splitlines()), [f"samp{i}" for i in range(8)]
+            )
+
+    def test_main(self):
+        with patch("q2_checkm.jobqueue.run_worker") as p1:
+            main([self.queue_dir, "--idle-timeout", "10", "--db-cache-dir", "cache"])
+        p1.assert_called_once_with(
+            self.queue_dir,
+            lease_timeout=600,
+            poll_interval=5,
+            idle_timeout=10.0,
+            db_cache_dir="cache",
+        )
+
+    def test_job_file_content(self):
+        with _JobQueue(self.queue_dir) as queue:
+            job_id = self.submit(queue, "samp1")
+            with open(os.path.join(self.queue_dir, JOBS_DIR, f"{job_id}.json")) as fh:
+                obs = json.load(fh)
+
+        self.assertEqual(obs["output_dir"], os.path.join(queue.run_dir, "samp1"))
+        self.assertEqual(obs["log"], os.path.join(queue.run_dir, "samp1.log"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from zipfile import ZipFile
+
+import pandas as pd
+from pandas._testing import assert_frame_equal
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm._format import CheckMResultsDirFmt
+from q2_checkm.partition import (
+    _balance_samples,
+    collate_checkm_results,
+    partition_mags,
+)
+
+
+class TestPartition(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.bins = MultiMAGSequencesDirFmt(self.get_data_path("bins"), "r")
+
+    def get_manifest(self, mags):
+        return mags.manifest.view(pd.DataFrame).reset_index()
+
+    def create_results(self, name, df, plots):
+        results_dir = os.path.join(self._tmp, name)
+        os.makedirs(results_dir)
+        with open(os.path.join(results_dir, "run_info.json"), "w") as fh:
+            json.dump({"thread_plan": {"threads": name}}, fh)
+        for sample in df["sample_id"].unique():
+            shutil.copytree(
+                self.get_data_path(f"results/bin_stats/{sample}"),
+                os.path.join(results_dir, "bin_stats", sample),
+            )
+        df.to_csv(os.path.join(results_dir, "results.tsv"), sep="\t", index=False)
+        with ZipFile(os.path.join(results_dir, "checkm_plots.zip"), "w") as zf:
+            for plot in plots:
+                zf.writestr(plot, f"<svg>{plot}</svg>")
+        return CheckMResultsDirFmt(results_dir, "r")
+
+    def test_balance_samples(self):
+        sizes = pd.Series({"s1": 10, "s2": 50, "s3": 30, "s4": 25})
+        obs = _balance_samples(sizes, 2)
+        self.assertListEqual(obs, [["s2", "s1"], ["s3", "s4"]])
+
+    def test_partition_mags_per_sample(self):
+        obs = partition_mags(self.bins)
+
+        self.assertListEqual(sorted(obs.keys()), ["0", "1"])
+        manifests = [self.get_manifest(obs[k]) for k in sorted(obs.keys())]
+        samples = sorted(tuple(m["sample-id"].unique()) for m in manifests)
+        self.assertListEqual(samples, [("samp1",), ("samp2",)])
+        for manifest in manifests:
+            for fp in manifest["filename"]:
+                self.assertTrue(os.path.isfile(fp))
+                self.assertFalse(os.path.islink(fp))
+
+    def test_partition_mags_too_many(self):
+        with self.assertWarnsRegex(UserWarning, "split into 2 partitions"):
+            obs = partition_mags(self.bins, num_partitions=5)
+        self.assertEqual(len(obs), 2)
+
+    def test_partition_mags_single(self):
+        obs = partition_mags(self.bins, num_partitions=1)
+
+        manifest = self.get_manifest(obs["0"])
+        self.assertListEqual(
+            list(zip(manifest["sample-id"], manifest["mag-id"])),
+            [("samp1", "bin1"), ("samp1", "bin2"), ("samp2", "bin1")],
+        )
+
+    def test_collate_checkm_results(self):
+        df = pd.read_csv(self.get_data_path("results/results.tsv"), sep="\t")
+        results1 = self.create_results(
+            "r1", df[df["sample_id"] == "samp1"], ["gc/samp1/gc.svg"]
+        )
+        results2 = self.create_results(
+            "r2", df[df["sample_id"] == "samp2"], ["gc/samp2/gc.svg", "nx/samp2/nx.svg"]
+        )
+
+        obs = collate_checkm_results([results1, results2])
+
+        obs_df = pd.read_csv(os.path.join(str(obs), "results.tsv"), sep="\t")
+        assert_frame_equal(obs_df, df)
+        with ZipFile(os.path.join(str(obs), "checkm_plots.zip")) as zf:
+            self.assertListEqual(
+                zf.namelist(), ["gc/samp1/gc.svg", "gc/samp2/gc.svg", "nx/samp2/nx.svg"]
+            )
+            self.assertEqual(zf.read("nx/samp2/nx.svg"), b"<svg>nx/samp2/nx.svg</svg>")
+        # logs are only collated if the partitions have them
+        self.assertFalse(os.path.exists(os.path.join(str(obs), "checkm_logs.zip")))
+        with open(os.path.join(str(obs), "run_info.json")) as fh:
+            self.assertDictEqual(
+                json.load(fh),
+                {
+                    "partitions": [
+                        {"thread_plan": {"threads": "r1"}},
+                        {"thread_plan": {"threads": "r2"}},
+                    ]
+                },
+            )
+        for sample in ["samp1", "samp2"]:
+            with open(
+                os.path.join(str(obs), "bin_stats", sample, "bin_stats_ext.tsv")
+            ) as fh:
+                obs_stats = fh.read()
+            with open(
+                self.get_data_path(f"results/bin_stats/{sample}/bin_stats_ext.tsv")
+            ) as fh:
+                self.assertEqual(obs_stats, fh.read())
+
+    def test_collate_checkm_results_contig_coverage(self):
+        df = pd.read_csv(self.get_data_path("results/results.tsv"), sep="\t")
+        results = []
+        for sample in ["samp1", "samp2"]:
+            result = self.create_results(sample, df[df["sample_id"] == sample], [])
+            pd.DataFrame(
+                {
+                    "sample_id": [sample],
+                    "bin_id": ["bin1"],
+                    "contig_id": ["NODE_1"],
+                    "mean_depth": [1.5],
+                }
+            ).to_csv(
+                os.path.join(str(result), "contig_coverage.tsv"), sep="\t", index=False
+            )
+            results.append(result)
+
+        obs = collate_checkm_results(results)
+
+        obs_df = pd.read_csv(os.path.join(str(obs), "contig_coverage.tsv"), sep="\t")
+        self.assertListEqual(obs_df["sample_id"].tolist(), ["samp1", "samp2"])
+        self.assertListEqual(obs_df["mean_depth"].tolist(), [1.5, 1.5])
+
+    def test_collate_checkm_results_logs(self):
+        df = pd.read_csv(self.get_data_path("results/results.tsv"), sep="\t")
+        results = []
+        for sample in ["samp1", "samp2"]:
+            result = self.create_results(sample, df[df["sample_id"] == sample], [])
+            with ZipFile(os.path.join(str(result), "checkm_logs.zip"), "w") as zf:
+                zf.writestr(f"{sample}/lineage_wf.log", f"{sample} done")
+            results.append(result)
+
+        obs = collate_checkm_results(results)
+
+        with ZipFile(os.path.join(str(obs), "checkm_logs.zip")) as zf:
+            self.assertListEqual(
+                zf.namelist(), ["samp1/lineage_wf.log", "samp2/lineage_wf.log"]
+            )
+            self.assertEqual(zf.read("samp2/lineage_wf.log"), b"samp2 done")
+
+    def test_collate_checkm_results_duplicated(self):
+        shutil.copytree(self.get_data_path("results"), os.path.join(self._tmp, "r1"))
+        results = CheckMResultsDirFmt(os.path.join(self._tmp, "r1"), "r")
+
+        with self.assertRaisesRegex(ValueError, "more than one partition: samp1"):
+            collate_checkm_results([results, results])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,7 +12,18 @@ import pandas as pd
 from altair import Color, FilterTransform, MarkDef, Scale, Tooltip, Undefined, X, Y
 from qiime2.plugin.testing import TestPluginBase
 
-from q2_checkm.plots import _prep_bar_plot, _prep_contig_plots, _prep_scatter_plot
+from q2_checkm.checkm import _classify_bins
+from q2_checkm.plots import (
+    BRUSHED_COLUMNS,
+    CANVAS_RENDERER_MIN_BINS,
+    CONTIG_PLOT_COLUMNS,
+    _draw_detailed_plots,
+    _get_vega_renderer,
+    _prep_bar_plot,
+    _prep_contig_plots,
+    _prep_scatter_plot,
+    _prep_selector_plot,
+)
 
 
 class TestCheckMPlots(TestPluginBase):
@@ -209,6 +220,36 @@ class TestCheckMPlots(TestPluginBase):
         for obs_spec, exp_spec in zip(obs_specs.values(), exp_specs):
             self.assertPlot(obs_spec, exp_spec)
 
+    def test_prep_selector_plot(self):
+        obs_spec = _prep_selector_plot(self.base_plot, self.filter, self.selection)
+
+        self.assertEqual(len(obs_spec.selection), 2)
+        self.assertEqual(obs_spec.mark.opacity, 0)
+        self.assertEqual(obs_spec.encoding.x.axis, None)
+        # nothing is drawn
+        self.assertEqual(obs_spec.transform[0].filter, "false")
+        self.assertEqual((obs_spec.width, obs_spec.height), (1, 1))
+
+    def test_draw_detailed_plots_contig_columns(self):
+        results = _classify_bins(
+            pd.read_csv(self.get_data_path("results/results.tsv"), sep="\t")
+        )
+        main_spec, contig_spec = _draw_detailed_plots(results)
+
+        # the contig view only embeds the columns it needs
+        (contig_data,) = contig_spec["datasets"].values()
+        self.assertEqual(len(contig_data), len(results))
+        self.assertSetEqual(
+            set(contig_data[0]),
+            {"sample_id", "bin_id", *CONTIG_PLOT_COLUMNS, *BRUSHED_COLUMNS},
+        )
+        (main_data,) = main_spec["datasets"].values()
+        self.assertIn("gcn0", main_data[0])
+
+    def test_get_vega_renderer(self):
+        self.assertEqual(_get_vega_renderer(10), "svg")
+        self.assertEqual(_get_vega_renderer(CANVAS_RENDERER_MIN_BINS), "canvas")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,43 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import subprocess
+import sys
+import unittest
+
+from qiime2.plugin.testing import TestPluginBase
+
+# modules which should only be imported once the plugin's actions are run
+HEAVY_MODULES = ["altair", "q2templates", "pkg_resources", "pysam"]
+
+
+class TestPluginSetup(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def test_plugin_setup_skips_heavy_modules(self):
+        # only count the modules imported by the plugin itself, on top of
+        # those already imported by the framework
+        code = (
+            "import sys\n"
+            "import qiime2.plugin\n"
+            "import q2_types.per_sample_sequences, q2_types.sample_data\n"
+            "before = set(sys.modules)\n"
+            "import q2_checkm.plugin_setup\n"
+            "print(' '.join(sorted(set(sys.modules) - before)))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        imported = {x.split(".")[0] for x in result.stdout.split()}
+
+        self.assertIn("q2_checkm", imported)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, imported)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.progress import (
+    _estimate_remaining_time,
+    _format_duration,
+    _ProgressTracker,
+)
+
+
+def make_job(status, bins, start=None, end=None):
+    return {"status": status, "bins": bins, "start": start, "end": end}
+
+
+class TestProgress(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.progress_fp = os.path.join(self._tmp, "progress.jsonl")
+
+    def read_records(self):
+        with open(self.progress_fp, "r") as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_format_duration(self):
+        self.assertEqual(_format_duration(312.4), "0:05:12")
+        self.assertEqual(_format_duration(None), "unknown")
+
+    def test_estimate_remaining_time_nothing_completed(self):
+        jobs = {
+            ("lineage_wf", "s1"): make_job("running", 10, start=0),
+            ("lineage_wf", "s2"): make_job("pending", 10),
+        }
+        self.assertIsNone(_estimate_remaining_time(jobs, {"lineage_wf": 1}, now=5))
+
+    def test_estimate_remaining_time(self):
+        jobs = {
+            # 2 seconds per bin
+            ("lineage_wf", "s1"): make_job("completed", 10, start=0, end=20),
+            # 20 seconds expected, 5 already elapsed
+            ("lineage_wf", "s2"): make_job("running", 10, start=20, end=None),
+            ("lineage_wf", "s3"): make_job("pending", 5),
+            ("lineage_wf", "s4"): make_job("failed", 5, start=0, end=1),
+            # no plots drawn yet - the overall rate is used
+            ("gc_plot", "s1"): make_job("pending", 10),
+        }
+        obs = _estimate_remaining_time(jobs, {"lineage_wf": 2, "gc_plot": 1}, now=25)
+        self.assertAlmostEqual(obs, (15 + 10) / 2 + 20)
+
+    def test_estimate_remaining_time_overdue(self):
+        jobs = {
+            ("lineage_wf", "s1"): make_job("completed", 1, start=0, end=2),
+            ("lineage_wf", "s2"): make_job("running", 1, start=2, end=None),
+        }
+        self.assertEqual(_estimate_remaining_time(jobs, {}, now=100), 0)
+
+    def test_tracker_snapshot(self):
+        progress = _ProgressTracker(verbose=False)
+        progress.add_jobs("lineage_wf", {"s1": 2, "s2": 3}, concurrency=2)
+        progress.add_jobs("gc_plot", {"s1": 2, "s2": 3})
+
+        with progress.track("lineage_wf", "s1"):
+            obs = progress.snapshot()
+            self.assertEqual(obs["jobs"]["running"], 1)
+            self.assertIsNone(obs["eta"])
+        progress.start("lineage_wf", "s2")
+        obs = progress.snapshot()
+
+        self.assertEqual(obs["status"], "running")
+        self.assertDictEqual(
+            obs["jobs"],
+            {
+                "pending": 2,
+                "running": 1,
+                "completed": 1,
+                "failed": 0,
+                "skipped": 0,
+                "total": 4,
+            },
+        )
+        self.assertListEqual(list(obs["stages"]), ["lineage_wf", "gc_plot"])
+        self.assertDictEqual(
+            obs["stages"]["lineage_wf"],
+            {
+                "pending": 0,
+                "running": 1,
+                "completed": 1,
+                "failed": 0,
+                "skipped": 0,
+                "bins_completed": 2,
+            },
+        )
+        self.assertIsNotNone(obs["eta"])
+
+    def test_tracker_failed_job(self):
+        progress = _ProgressTracker(verbose=False)
+        progress.add_jobs("lineage_wf", {"s1": 2})
+
+        with self.assertRaisesRegex(RuntimeError, "boom"):
+            with progress.track("lineage_wf", "s1"):
+                raise RuntimeError("boom")
+
+        obs = progress.snapshot()
+        self.assertEqual(obs["jobs"]["failed"], 1)
+        self.assertEqual(obs["stages"]["lineage_wf"]["bins_completed"], 0)
+
+    def test_tracker_skipped_job(self):
+        progress = _ProgressTracker(verbose=False)
+        progress.add_jobs("lineage_wf", {"s1": 2, "s2": 2})
+
+        progress.skip("lineage_wf", "s1")
+        obs = progress.snapshot()
+
+        self.assertEqual(obs["jobs"]["skipped"], 1)
+        self.assertEqual(obs["jobs"]["pending"], 1)
+        # skipped jobs do not count towards the throughput
+        self.assertIsNone(obs["eta"])
+
+    def test_tracker_prints_summary(self):
+        progress = _ProgressTracker()
+        progress.add_jobs("lineage_wf", {"s1": 2, "s2": 1})
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            with progress.track("lineage_wf", "s1"):
+                pass
+
+        self.assertIn(
+            "lineage_wf of sample s1 completed in 0:00:00 - 1/2 jobs completed, "
+            "0 running, 1 pending.",
+            out.getvalue(),
+        )
+
+    def test_tracker_progress_file(self):
+        with _ProgressTracker(self.progress_fp, verbose=False) as progress:
+            progress.add_jobs("lineage_wf", {"s1": 2})
+            with progress.track("lineage_wf", "s1"):
+                pass
+
+        obs = self.read_records()
+        # initial record, job started, job finished and final record
+        self.assertEqual(len(obs), 4)
+        self.assertEqual(len({x["run_id"] for x in obs}), 1)
+        self.assertListEqual([x["jobs"]["completed"] for x in obs], [0, 0, 1, 1])
+        self.assertEqual(obs[-1]["status"], "completed")
+        self.assertEqual(obs[-1]["eta"], 0)
+
+    def test_tracker_progress_file_failed_run(self):
+        with self.assertRaises(ValueError):
+            with _ProgressTracker(self.progress_fp, verbose=False):
+                raise ValueError()
+
+        self.assertEqual(self.read_records()[-1]["status"], "failed")
+
+    def test_tracker_progress_file_periodic(self):
+        with _ProgressTracker(self.progress_fp, interval=0.01, verbose=False):
+            time.sleep(0.2)
+
+        obs = self.read_records()
+        self.assertGreater(len(obs), 3)
+        self.assertTrue(all(x["status"] == "running" for x in obs[:-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import json
+import os
+import tempfile
+import unittest
+
+import jinja2
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.checkm import TEMPLATES
+from q2_checkm.rendering import _copy_assets, _get_vendor_assets
+
+TABBED_TEMPLATE = """<html>
+<head>
+<link href="q2templateassets/css/base.css" rel="stylesheet">
+{% block head %}{% endblock %}
+</head>
+<body>
+{% for tab in tabs %}<a href="{{ tab.url }}">{{ tab.title }}</a>{% endfor %}
+{% block tabcontent %}{% endblock %}
+</body>
+</html>
+"""
+
+
+class TestRendering(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.templates_dir = os.path.join(TEMPLATES, "checkm")
+
+        # emulates the base templates of q2templates
+        self.q2templates_dir = os.path.join(self._tmp, "q2templates")
+        os.makedirs(self.q2templates_dir)
+        with open(os.path.join(self.q2templates_dir, "tabbed.html"), "w") as fh:
+            fh.write(TABBED_TEMPLATE)
+
+        self.context = {
+            "tabs": [{"title": "QC overview", "url": "index.html"}],
+            "samples": json.dumps(["samp1"]),
+            "vega_plots_overview": json.dumps({"fake": "spec"}),
+            "vega_plots_detailed": json.dumps([{"fake": "spec"}]),
+            "vega_renderer": "canvas",
+            "failures": [
+                {
+                    "sample_id": "samp2",
+                    "stage": "lineage_wf",
+                    "returncode": 1,
+                    "error": "boom",
+                }
+            ],
+            "vendor": _get_vendor_assets(self.templates_dir),
+            "search_index": "search_index.js",
+        }
+
+    def render(self, template):
+        # renders the template like q2templates.render does (without
+        # autoescaping)
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader([self.templates_dir, self.q2templates_dir])
+        )
+        return env.get_template(template).render(**self.context)
+
+    def list_files(self, path):
+        return sorted(
+            os.path.relpath(os.path.join(root, fn), path)
+            for root, _, files in os.walk(path)
+            for fn in files
+        )
+
+    def test_copy_assets(self):
+        output_dir = os.path.join(self._tmp, "viz")
+        _copy_assets(self.templates_dir, output_dir)
+
+        # the vendor manifest is not copied
+        self.assertListEqual(
+            self.list_files(output_dir),
+            [
+                "css/styles.css",
+                "js/binSearch.js",
+                "js/bootstrapMagic.js",
+                "js/embedPlots.js",
+            ],
+        )
+
+    def test_render_templates(self):
+        obs = self.render("index.html")
+        self.assertIn('<a href="index.html">QC overview</a>', obs)
+        self.assertIn("<td>samp2</td>", obs)
+        self.assertIn('{"fake": "spec"}', obs)
+        self.assertIn(f'src="{self.context["vendor"]["vega"]["url"]}"', obs)
+        self.assertIn("renderer: 'canvas'", obs)
+
+        obs = self.render("sample_details.html")
+        self.assertIn('id="bin-search"', obs)
+        self.assertIn("src: 'search_index.js'", obs)
+
+    def test_render_templates_failures_escaped(self):
+        error = 'File "<stdin>", line 1, in <module>\n<script>alert(1)</script>'
+        self.context["failures"][0]["error"] = error
+
+        obs = self.render("index.html")
+        self.assertIn("in &lt;module&gt;", obs)
+        self.assertIn("&lt;script&gt;alert(1)&lt;/script&gt;", obs)
+        self.assertNotIn("<module>", obs)
+
+    def test_get_vendor_assets(self):
+        vendor_dir = os.path.join(self._tmp, "templates", "vendor")
+        os.makedirs(vendor_dir)
+        with open(os.path.join(vendor_dir, "vendor.json"), "w") as fh:
+            json.dump(
+                {
+                    "vega": {"url": "https://cdn/vega.js", "file": "vega.min.js"},
+                    "bootstrap_css": {
+                        "url": "https://cdn/bootstrap.css",
+                        "file": "bootstrap.min.css",
+                        "integrity": "sha256-abc",
+                    },
+                },
+                fh,
+            )
+        with open(os.path.join(vendor_dir, "vega.min.js"), "w") as fh:
+            fh.write("var vega;")
+
+        obs = _get_vendor_assets(os.path.join(self._tmp, "templates"))
+
+        self.assertDictEqual(
+            obs,
+            {
+                # bundled libraries are referenced locally
+                "vega": {"url": "vendor/vega.min.js", "integrity": None},
+                "bootstrap_css": {
+                    "url": "https://cdn/bootstrap.css",
+                    "integrity": "sha256-abc",
+                },
+            },
+        )
+
+    def test_get_vendor_assets_all_listed(self):
+        obs = _get_vendor_assets(self.templates_dir)
+        self.assertListEqual(
+            sorted(obs),
+            ["bootstrap_css", "bootstrap_js", "vega", "vega_embed", "vega_lite"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
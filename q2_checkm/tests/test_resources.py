@@ -0,0 +1,94 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.resources import (
+    _get_available_cpus,
+    _get_available_memory,
+    _plan_threads,
+)
+
+GB = 1024**3
+
+
+class TestResources(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+
+    @patch("os.sched_getaffinity", return_value={0, 1, 4})
+    def test_get_available_cpus(self, p1):
+        self.assertEqual(_get_available_cpus(), 3)
+
+    @patch("os.cpu_count", return_value=6)
+    def test_get_available_cpus_no_affinity(self, p1):
+        with patch("os.sched_getaffinity", side_effect=AttributeError, create=True):
+            self.assertEqual(_get_available_cpus(), 6)
+
+    def test_get_available_memory(self):
+        fp = os.path.join(self._tmp, "meminfo")
+        with open(fp, "w") as fh:
+            fh.write(
+                "MemTotal:       65855124 kB\n"
+                "MemFree:         1234567 kB\n"
+                "MemAvailable:   41943040 kB\n"
+            )
+        self.assertEqual(_get_available_memory(fp), 40 * GB)
+
+    def test_get_available_memory_missing(self):
+        self.assertIsNone(_get_available_memory(os.path.join(self._tmp, "missing")))
+
+    def test_plan_threads_few_bins_many_samples(self):
+        # small samples: several of them are evaluated at once
+        obs = _plan_threads([4] * 50, cpus=32, memory=128 * GB, reduced_tree=True)
+        self.assertEqual(obs["concurrency"], 8)
+        self.assertEqual(obs["threads"], 4)
+        self.assertEqual(obs["pplacer_threads"], 1)
+        self.assertEqual(obs["samples"], 50)
+
+    def test_plan_threads_many_bins(self):
+        # large samples: one at a time, pplacer limited by memory
+        obs = _plan_threads([40, 60, 80], cpus=32, memory=128 * GB)
+        self.assertEqual(obs["concurrency"], 1)
+        self.assertEqual(obs["threads"], 32)
+        self.assertEqual(obs["pplacer_threads"], 3)
+        self.assertEqual(obs["max_bins_per_sample"], 80)
+
+    def test_plan_threads_limited_by_memory(self):
+        obs = _plan_threads([2] * 10, cpus=16, memory=30 * GB, reduced_tree=True)
+        self.assertEqual(obs["concurrency"], 2)
+        self.assertEqual(obs["threads"], 2)
+        self.assertEqual(obs["pplacer_threads"], 1)
+
+    def test_plan_threads_threads_capped_by_bins(self):
+        obs = _plan_threads([3], cpus=16)
+        self.assertEqual(obs["concurrency"], 1)
+        self.assertEqual(obs["threads"], 3)
+        self.assertEqual(obs["pplacer_threads"], 3)
+        self.assertIsNone(obs["memory_available"])
+
+    def test_plan_threads_no_bins(self):
+        obs = _plan_threads([], cpus=4, memory=GB)
+        self.assertEqual(obs["samples"], 0)
+        self.assertEqual(obs["concurrency"], 1)
+        self.assertEqual(obs["threads"], 1)
+        self.assertEqual(obs["pplacer_threads"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
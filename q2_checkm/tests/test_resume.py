@@ -0,0 +1,136 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import os
+import tempfile
+import unittest
+
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.resume import (
+    RESUME_MARKER,
+    _get_bins_key,
+    _get_resume_dir,
+    _restore_sample,
+    _save_sample,
+)
+
+
+class TestResume(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.resume_dir = os.path.join(self._tmp, "resume")
+        self.bins_key = [["bin1.fa", "a" * 64], ["bin2.fa", "b" * 64]]
+
+        self.sample_results = os.path.join(self._tmp, "results", "samp1")
+        os.makedirs(os.path.join(self.sample_results, "storage"))
+        with open(
+            os.path.join(self.sample_results, "storage", "bin_stats_ext.tsv"), "w"
+        ) as fh:
+            fh.write("bin1\t{}\n")
+
+    def test_get_resume_dir(self):
+        params = {"reduced_tree": True, "threads": 2, "unique": None}
+        obs = _get_resume_dir(self.resume_dir, "abc", params)
+
+        self.assertTrue(os.path.isdir(obs))
+        self.assertEqual(os.path.dirname(obs), self.resume_dir)
+        # threads and unset parameters do not change the results
+        self.assertEqual(
+            _get_resume_dir(self.resume_dir, "abc", {"reduced_tree": True}), obs
+        )
+        self.assertNotEqual(
+            _get_resume_dir(self.resume_dir, "def", {"reduced_tree": True}), obs
+        )
+        self.assertNotEqual(
+            _get_resume_dir(self.resume_dir, "abc", {"reduced_tree": False}), obs
+        )
+
+    def test_get_bins_key(self):
+        bins_dir = os.path.join(self._tmp, "bins")
+        os.makedirs(bins_dir)
+        for fn, content in [("bin2.fa", ">c1\nACGT\n"), ("bin1.fa", ">c1\nAAAA\n")]:
+            with open(os.path.join(bins_dir, fn), "w") as fh:
+                fh.write(content)
+        bin_fps = [os.path.join(bins_dir, fn) for fn in ["bin2.fa", "bin1.fa"]]
+
+        obs = _get_bins_key(bin_fps)
+
+        self.assertListEqual([x[0] for x in obs], ["bin1.fa", "bin2.fa"])
+        self.assertEqual(
+            obs[0][1],
+            "4c4acbae4aefa6403cfc8bb4432db68796a05971f8cb40ea2b7c142e40ba11c8",
+        )
+
+        # a bin re-assembled under the same name (and with the same size)
+        # is not considered the same
+        with open(bin_fps[0], "w") as fh:
+            fh.write(">c1\nACGA\n")
+        self.assertEqual(_get_bins_key(bin_fps)[0], obs[0])
+        self.assertNotEqual(_get_bins_key(bin_fps)[1], obs[1])
+
+    def test_save_and_restore_sample(self):
+        os.makedirs(self.resume_dir)
+        _save_sample(self.resume_dir, "samp1", self.bins_key, self.sample_results)
+
+        self.assertListEqual(os.listdir(self.resume_dir), ["samp1"])
+        self.assertTrue(
+            os.path.isfile(os.path.join(self.resume_dir, "samp1", RESUME_MARKER))
+        )
+
+        restored = os.path.join(self._tmp, "restored", "samp1")
+        obs = _restore_sample(self.resume_dir, "samp1", self.bins_key, restored)
+
+        self.assertTrue(obs)
+        self.assertListEqual(os.listdir(restored), ["storage"])
+        with open(os.path.join(restored, "storage", "bin_stats_ext.tsv")) as fh:
+            self.assertEqual(fh.read(), "bin1\t{}\n")
+
+    def test_save_sample_overwrites(self):
+        os.makedirs(self.resume_dir)
+        _save_sample(
+            self.resume_dir, "samp1", [["old.fa", "c" * 64]], self.sample_results
+        )
+        _save_sample(self.resume_dir, "samp1", self.bins_key, self.sample_results)
+
+        self.assertListEqual(os.listdir(self.resume_dir), ["samp1"])
+        self.assertTrue(
+            _restore_sample(
+                self.resume_dir, "samp1", self.bins_key, os.path.join(self._tmp, "r")
+            )
+        )
+
+    def test_restore_sample_missing(self):
+        os.makedirs(self.resume_dir)
+        obs = _restore_sample(
+            self.resume_dir, "samp1", self.bins_key, os.path.join(self._tmp, "r")
+        )
+
+        self.assertFalse(obs)
+        self.assertFalse(os.path.exists(os.path.join(self._tmp, "r")))
+
+    def test_restore_sample_different_bins(self):
+        os.makedirs(self.resume_dir)
+        _save_sample(self.resume_dir, "samp1", self.bins_key, self.sample_results)
+
+        obs = _restore_sample(
+            self.resume_dir,
+            "samp1",
+            [["bin1.fa", "a" * 64]],
+            os.path.join(self._tmp, "r"),
+        )
+        self.assertFalse(obs)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import json
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.search import (
+    SEARCH_INDEX_FILE,
+    _build_search_index,
+    _index_field,
+    _write_search_index,
+)
+
+
+class TestSearch(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.results = pd.DataFrame(
+            {
+                "sample_id": ["samp1", "samp1", "samp2", "Samp10"],
+                "bin_id": ["bin2", "bin10", "bin1", "b"],
+                "marker_lineage": ["g__Myco", None, "c__Alpha", "g__Mycoplasma"],
+                "completeness": [93.8712, 100.0, None, 50.0],
+                "contamination": [1.31, 0.0, 0.5, 2.0],
+                "gcn0": ["[]", "[]", "[]", "[]"],
+            }
+        )
+
+    def test_index_field(self):
+        obs = _index_field(self.results["bin_id"], prefix_length=2)
+
+        # rows ordered by their lowercase value: b, bin1, bin10, bin2
+        self.assertListEqual(obs["order"], [3, 2, 1, 0])
+        self.assertDictEqual(obs["prefixes"], {"b": [0, 4], "bi": [1, 4]})
+
+    def test_index_field_case_and_missing_values(self):
+        obs = _index_field(self.results["marker_lineage"], prefix_length=3)
+
+        # the missing value is sorted first and has no prefixes
+        self.assertListEqual(obs["order"], [1, 2, 0, 3])
+        self.assertDictEqual(
+            obs["prefixes"],
+            {
+                "c": [1, 2],
+                "c_": [1, 2],
+                "c__": [1, 2],
+                "g": [2, 4],
+                "g_": [2, 4],
+                "g__": [2, 4],
+            },
+        )
+        sample_prefixes = _index_field(self.results["sample_id"], 3)["prefixes"]
+        self.assertListEqual(sample_prefixes["sam"], [0, 4])
+
+    def test_build_search_index(self):
+        obs = _build_search_index(self.results)
+
+        self.assertEqual(obs["prefix_length"], 3)
+        self.assertListEqual(
+            obs["columns"],
+            ["sample_id", "bin_id", "marker_lineage", "completeness", "contamination"],
+        )
+        self.assertListEqual(obs["rows"]["completeness"], [93.87, 100.0, None, 50.0])
+        self.assertListEqual(obs["rows"]["marker_lineage"][:2], ["g__Myco", None])
+        self.assertListEqual(
+            sorted(obs["fields"]), ["bin_id", "marker_lineage", "sample_id"]
+        )
+        self.assertListEqual(obs["fields"]["bin_id"]["order"], [3, 2, 1, 0])
+
+    def test_build_search_index_empty(self):
+        obs = _build_search_index(self.results.iloc[:0])
+
+        self.assertListEqual(obs["rows"]["bin_id"], [])
+        self.assertDictEqual(obs["fields"]["bin_id"], {"order": [], "prefixes": {}})
+
+    def test_write_search_index(self):
+        obs = _write_search_index(self._tmp, self.results)
+
+        self.assertEqual(obs, SEARCH_INDEX_FILE)
+        with open(os.path.join(self._tmp, SEARCH_INDEX_FILE)) as fh:
+            content = fh.read()
+        prefix = "window.checkmSearchIndex = "
+        self.assertTrue(content.startswith(prefix))
+        self.assertTrue(content.endswith(";\n"))
+        self.assertDictEqual(
+            json.loads(content[len(prefix) : -2]),
+            json.loads(json.dumps(_build_search_index(self.results))),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
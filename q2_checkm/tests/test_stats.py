@@ -0,0 +1,217 @@
+# ----------------------------------------------------------------------------
+# Copyright (c) 2023, QIIME 2 development team.
+#
+# Distributed under the terms of the Modified BSD License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# ----------------------------------------------------------------------------
+import contextlib
+import math
+import os
+import re
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
+from qiime2.plugin.testing import TestPluginBase
+
+from q2_checkm.stats import (
+    SEQUENCE_STATS_COLS,
+    _calculate_bin_stats,
+    _calculate_n50,
+    _calculate_sequence_stats,
+    _prefilter_bins,
+)
+
+
+def reference_bin_stats(fp):
+    # straightforward re-implementation of CheckM's sequence statistics
+    seqs, seq_id = {}, None
+    with open(fp) as fh:
+        for line in fh:
+            line = line.strip()
+            if line.startswith(">"):
+                seq_id = line[1:]
+                seqs[seq_id] = []
+            elif seq_id is not None:
+                seqs[seq_id].append(line.upper())
+    seqs = {k: "".join(v) for k, v in seqs.items()}
+
+    gc_total, acgt_total, gc_per_seq = 0, 0, []
+    for seq in seqs.values():
+        gc = seq.count("G") + seq.count("C")
+        acgt = gc + seq.count("A") + seq.count("T") + seq.count("U")
+        gc_total, acgt_total = gc_total + gc, acgt_total + acgt
+        if len(seq) > 1000:
+            # CheckM uses a GC content of 0 if there are no A/C/G/T/U bases
+            gc_per_seq.append(gc / acgt if acgt else 0.0)
+    gc = gc_total / acgt_total
+    gc_std = (
+        math.sqrt(sum((x - gc) ** 2 for x in gc_per_seq) / len(gc_per_seq))
+        if len(gc_per_seq) > 1
+        else 0.0
+    )
+
+    scaffold_lens = [len(x) for x in seqs.values()]
+    contig_lens = [len(c) for x in seqs.values() for c in re.split("N{10,}", x) if c]
+
+    def n50(lens):
+        total = 0
+        for x in sorted(lens, reverse=True):
+            total += x
+            if total >= sum(lens) / 2:
+                return x
+
+    return {
+        "gc": gc,
+        "gc_std": gc_std,
+        "genome_size": sum(scaffold_lens),
+        "ambiguous_bases": sum(x.count("N") for x in seqs.values()),
+        "scaffolds": len(scaffold_lens),
+        "contigs": len(contig_lens),
+        "longest_scaffold": max(scaffold_lens),
+        "longest_contig": max(contig_lens),
+        "n50_scaffolds": n50(scaffold_lens),
+        "n50_contigs": n50(contig_lens),
+        "mean_scaffold_length": sum(scaffold_lens) / len(scaffold_lens),
+        "mean_contig_length": sum(contig_lens) / len(contig_lens),
+    }
+
+
+class TestSequenceStats(TestPluginBase):
+    package = "q2_checkm.tests"
+
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.bins = MultiMAGSequencesDirFmt(self.get_data_path("bins"), "r")
+
+    def write_fasta(self, content):
+        fp = os.path.join(self._tmp, "bin.fa")
+        with open(fp, "w") as fh:
+            fh.write(content)
+        return fp
+
+    def test_calculate_n50(self):
+        self.assertEqual(_calculate_n50(np.array([2, 3, 4, 5, 6])), 5)
+        self.assertEqual(_calculate_n50(np.array([10, 1, 1])), 10)
+        self.assertEqual(_calculate_n50(np.array([], dtype=int)), 0)
+
+    def test_calculate_bin_stats(self):
+        fp = self.write_fasta(
+            ">scaffold1 some description\n"
+            "ACGTacgtNN\n"
+            "GGGGNNNNNNNNNNNCCC\n"
+            ">scaffold2\r\n"
+            "ATATATAT\r\n"
+            ">empty\n"
+            ">scaffold3\n"
+            "nnnnnnnnnnGC"
+        )
+        obs = _calculate_bin_stats(fp)
+        exp = {
+            "gc": 13 / 25,
+            "gc_std": 0.0,
+            "genome_size": 48,
+            "ambiguous_bases": 23,
+            "scaffolds": 4,
+            # scaffold1: ACGTacgtNNGGGG + CCC; scaffold2; scaffold3: GC
+            "contigs": 4,
+            "longest_scaffold": 28,
+            "longest_contig": 14,
+            "n50_scaffolds": 28,
+            "n50_contigs": 14,
+            "mean_scaffold_length": 12.0,
+            "mean_contig_length": 27 / 4,
+        }
+        self.assertListEqual(list(obs.keys()), SEQUENCE_STATS_COLS)
+        for key, val in exp.items():
+            self.assertAlmostEqual(obs[key], val, msg=key)
+
+    def test_calculate_bin_stats_empty(self):
+        obs = _calculate_bin_stats(self.write_fasta(""))
+        self.assertEqual(obs["genome_size"], 0)
+        self.assertEqual(obs["scaffolds"], 0)
+        self.assertEqual(obs["n50_contigs"], 0)
+
+    def test_calculate_bin_stats_matches_reference(self):
+        for fp in ["samp1/bin1.fa", "samp1/bin2.fa", "samp2/bin1.fa"]:
+            fp = self.get_data_path(f"bins/{fp}")
+            obs = _calculate_bin_stats(fp)
+            exp = reference_bin_stats(fp)
+            for key, val in exp.items():
+                self.assertAlmostEqual(obs[key], val, msg=f"{fp}: {key}")
+
+    def test_calculate_bin_stats_edge_cases(self):
+        # scaffold1: lowercase and uppercase ACGT (1200 bp, GC 0.5)
+        # scaffold2: GC only (1100 bp, GC 1.0)
+        # ambiguous: no A/C/G/T/U bases (1020 bp, GC 0 as in CheckM)
+        # rna_like: 20 + 10 Ns + 20 + 9 Ns + 2 bp, with U counted as A/T
+        obs = _calculate_bin_stats(self.get_data_path("stats/edge_cases.fa"))
+        gc = (600 + 1100 + 22) / (1200 + 1100 + 42)
+        exp = {
+            "gc": gc,
+            "gc_std": math.sqrt(((0.5 - gc) ** 2 + (1 - gc) ** 2 + gc**2) / 3),
+            "genome_size": 3381,
+            "ambiguous_bases": 19,
+            "scaffolds": 4,
+            # only the run of 10 Ns breaks the last scaffold
+            "contigs": 5,
+            "longest_scaffold": 1200,
+            "longest_contig": 1200,
+            "n50_scaffolds": 1100,
+            "n50_contigs": 1100,
+            "mean_scaffold_length": 3381 / 4,
+            "mean_contig_length": 3371 / 5,
+        }
+        for key, val in exp.items():
+            self.assertAlmostEqual(obs[key], val, msg=key)
+
+        exp_reference = reference_bin_stats(self.get_data_path("stats/edge_cases.fa"))
+        for key, val in exp_reference.items():
+            self.assertAlmostEqual(obs[key], val, msg=key)
+
+    def test_calculate_sequence_stats(self):
+        obs = _calculate_sequence_stats(self.bins, threads=2)
+
+        self.assertListEqual(
+            list(obs.columns), ["sample_id", "bin_id", *SEQUENCE_STATS_COLS]
+        )
+        self.assertListEqual(obs["sample_id"].tolist(), ["samp1", "samp1", "samp2"])
+        self.assertListEqual(obs["bin_id"].tolist(), ["bin1", "bin2", "bin1"])
+        self.assertDictEqual(
+            obs.iloc[1][SEQUENCE_STATS_COLS].to_dict(),
+            _calculate_bin_stats(self.get_data_path("bins/samp1/bin2.fa")),
+        )
+
+    def test_prefilter_bins(self):
+        stats = pd.DataFrame(
+            {
+                "genome_size": [1000, 5000, 5000, 5000],
+                "n50_contigs": [500, 100, 500, 500],
+                "contigs": [2, 50, 200, 10],
+            }
+        )
+        obs = _prefilter_bins(stats, min_genome_size=2000, min_n50=200, max_contigs=100)
+        self.assertListEqual(obs.tolist(), [False, False, False, True])
+
+    def test_prefilter_bins_single_threshold(self):
+        stats = pd.DataFrame(
+            {
+                "genome_size": [1000, 5000],
+                "n50_contigs": [500, 100],
+                "contigs": [2, 50],
+            }
+        )
+        obs = _prefilter_bins(stats, max_contigs=10)
+        self.assertListEqual(obs.tolist(), [True, False])
+        obs = _prefilter_bins(stats)
+        self.assertListEqual(obs.tolist(), [True, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
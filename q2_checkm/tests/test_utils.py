@@ -5,14 +5,32 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import contextlib
+import errno
+import io
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
+from unittest.mock import patch
+from zipfile import ZIP_DEFLATED, ZipFile
 
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
 from qiime2.plugin.testing import TestPluginBase
 
 from q2_checkm.utils import (
+    _get_dir_size,
+    _get_log_fp,
     _get_plots_per_sample,
+    _link_or_copy,
     _process_checkm_arg,
     _process_common_input_params,
+    _prune_dir,
+    _ScratchSpace,
+    _stage_bins,
+    _zip_logs,
+    run_command,
 )
 
 
@@ -28,6 +46,13 @@ def fake_processing_func(key, val):
 class TestCheckMUtils(TestPluginBase):
     package = "q2_checkm.tests"
 
+    def setUp(self):
+        super().setUp()
+        with contextlib.ExitStack() as stack:
+            self._tmp = stack.enter_context(tempfile.TemporaryDirectory())
+            self.addCleanup(stack.pop_all().close)
+        self.bins = MultiMAGSequencesDirFmt(self.get_data_path("bins"), "r")
+
     def test_process_common_inputs_bools(self):
         kwargs = {"arg1": False, "arg2": True}
         obs = _process_common_input_params(fake_processing_func, kwargs)
@@ -85,6 +110,291 @@ class TestCheckMUtils(TestPluginBase):
                 }
             )
 
+    def test_link_or_copy_hardlink(self):
+        src = self.get_data_path("bins/samp1/bin1.fa")
+        dst = os.path.join(self._tmp, "bin1.fa")
+        with patch("os.link") as p1:
+            obs = _link_or_copy(src, dst)
+        self.assertEqual(obs, "hardlink")
+        p1.assert_called_once_with(src, dst)
+
+    @patch("os.link", side_effect=OSError(errno.EXDEV, "Cross-device link"))
+    def test_link_or_copy_symlink(self, p1):
+        src = self.get_data_path("bins/samp1/bin1.fa")
+        dst = os.path.join(self._tmp, "bin1.fa")
+        obs = _link_or_copy(src, dst)
+        self.assertEqual(obs, "symlink")
+        self.assertTrue(os.path.islink(dst))
+        self.assertTrue(os.path.samefile(src, dst))
+
+    @patch("os.link", side_effect=OSError(errno.EXDEV, "Cross-device link"))
+    def test_link_or_copy_no_symlinks(self, p1):
+        src = self.get_data_path("bins/samp1/bin1.fa")
+        dst = os.path.join(self._tmp, "bin1.fa")
+        obs = _link_or_copy(src, dst, allow_symlinks=False)
+        self.assertEqual(obs, "copy")
+        self.assertFalse(os.path.islink(dst))
+        with open(src) as fh1, open(dst) as fh2:
+            self.assertEqual(fh1.read(), fh2.read())
+
+    @patch("os.link", side_effect=OSError(errno.EACCES, "Permission denied"))
+    def test_link_or_copy_other_error(self, p1):
+        with self.assertRaises(PermissionError):
+            _link_or_copy(
+                self.get_data_path("bins/samp1/bin1.fa"),
+                os.path.join(self._tmp, "bin1.fa"),
+            )
+
+    def test_stage_bins(self):
+        staging_dir = os.path.join(self._tmp, "staged")
+        obs = _stage_bins(self.bins, staging_dir)
+
+        self.assertIsInstance(obs, MultiMAGSequencesDirFmt)
+        for sample, mag in [("samp1", "bin1"), ("samp1", "bin2"), ("samp2", "bin1")]:
+            self.assertTrue(
+                os.path.samefile(
+                    self.get_data_path(f"bins/{sample}/{mag}.fa"),
+                    os.path.join(staging_dir, sample, f"{mag}.fa"),
+                )
+            )
+        with open(os.path.join(staging_dir, "MANIFEST")) as fh:
+            self.assertListEqual(
+                fh.read().splitlines(),
+                [
+                    "sample-id,mag-id,filename",
+                    "samp1,bin1,samp1/bin1.fa",
+                    "samp1,bin2,samp1/bin2.fa",
+                    "samp2,bin1,samp2/bin1.fa",
+                ],
+            )
+
+    def test_stage_bins_with_filter(self):
+        staging_dir = os.path.join(self._tmp, "staged")
+        _stage_bins(
+            self.bins, staging_dir, bin_filter=lambda s, m: (s, m) != ("samp1", "bin2")
+        )
+
+        self.assertListEqual(
+            sorted(os.listdir(staging_dir)), ["MANIFEST", "samp1", "samp2"]
+        )
+        self.assertListEqual(
+            os.listdir(os.path.join(staging_dir, "samp1")), ["bin1.fa"]
+        )
+        with open(os.path.join(staging_dir, "MANIFEST")) as fh:
+            self.assertListEqual(
+                fh.read().splitlines(),
+                [
+                    "sample-id,mag-id,filename",
+                    "samp1,bin1,samp1/bin1.fa",
+                    "samp2,bin1,samp2/bin1.fa",
+                ],
+            )
+
+    def test_scratch_space_no_ram_disk(self):
+        with _ScratchSpace(scratch_dir=self._tmp) as scratch:
+            self.assertEqual(os.path.dirname(scratch.path), self._tmp)
+            results_dir = os.path.join(scratch.path, "results")
+            obs = scratch.make_sample_dir(results_dir, "samp1", 100)
+
+            self.assertEqual(obs, os.path.join(results_dir, "samp1"))
+            self.assertFalse(os.path.exists(obs))
+        self.assertFalse(os.path.exists(scratch.path))
+
+    def test_scratch_space_ram_disk_spill(self):
+        ram_disk = os.path.join(self._tmp, "shm")
+        os.makedirs(ram_disk)
+        with _ScratchSpace(
+            scratch_dir=self._tmp, ram_disk_budget=150, ram_disk_path=ram_disk
+        ) as scratch:
+            results_dir = os.path.join(scratch.path, "results")
+            obs1 = scratch.make_sample_dir(results_dir, "samp1", 100)
+            obs2 = scratch.make_sample_dir(results_dir, "samp2", 100)
+            obs3 = scratch.make_sample_dir(results_dir, "samp3", 50)
+
+            self.assertTrue(os.path.islink(obs1))
+            self.assertTrue(os.path.realpath(obs1).startswith(ram_disk))
+            self.assertFalse(os.path.exists(obs2))
+            self.assertTrue(os.path.islink(obs3))
+            self.assertEqual(scratch.ram_disk_budget, 0)
+        self.assertListEqual(os.listdir(ram_disk), [])
+
+    def test_scratch_space_ram_disk_missing(self):
+        with self.assertWarnsRegex(UserWarning, "RAM disk .* is not available"):
+            with _ScratchSpace(
+                scratch_dir=self._tmp,
+                ram_disk_budget=150,
+                ram_disk_path=os.path.join(self._tmp, "missing"),
+            ) as scratch:
+                results_dir = os.path.join(scratch.path, "results")
+                obs = scratch.make_sample_dir(results_dir, "samp1", 100)
+                self.assertFalse(os.path.islink(obs))
+
+    def create_fake_results(self, sample_dir):
+        files = {
+            "lineage.ms": 10,
+            "storage/bin_stats_ext.tsv": 20,
+            "storage/tree/concatenated.pplacer.json": 30,
+            "bins/bin1/genes.gff": 40,
+            "bins/bin1/genes.faa": 50,
+            "bins/bin1/hmmer.analyze.txt": 60,
+        }
+        for fp, size in files.items():
+            os.makedirs(os.path.join(sample_dir, os.path.dirname(fp)), exist_ok=True)
+            with open(os.path.join(sample_dir, fp), "w") as fh:
+                fh.write("x" * size)
+
+    def list_files(self, path):
+        return sorted(
+            os.path.relpath(os.path.join(root, f), path)
+            for root, _, files in os.walk(path, followlinks=True)
+            for f in files
+        )
+
+    def test_get_dir_size(self):
+        self.create_fake_results(self._tmp)
+        self.assertEqual(_get_dir_size(self._tmp), 210)
+
+    def test_prune_dir(self):
+        self.create_fake_results(self._tmp)
+        obs = _prune_dir(
+            self._tmp, keep=["storage/bin_stats_ext.tsv", "bins/*/genes.gff"]
+        )
+
+        self.assertEqual(obs, 150)
+        self.assertListEqual(
+            self.list_files(self._tmp),
+            ["bins/bin1/genes.gff", "storage/bin_stats_ext.tsv"],
+        )
+        self.assertFalse(os.path.exists(os.path.join(self._tmp, "storage", "tree")))
+
+    def test_scratch_space_release(self):
+        ram_disk = os.path.join(self._tmp, "shm")
+        os.makedirs(ram_disk)
+        with _ScratchSpace(
+            scratch_dir=self._tmp, ram_disk_budget=1000, ram_disk_path=ram_disk
+        ) as scratch:
+            results_dir = os.path.join(scratch.path, "results")
+            sample_dir = scratch.make_sample_dir(results_dir, "samp1", 500)
+            self.create_fake_results(sample_dir)
+
+            scratch.release(sample_dir, stage="lineage_wf")
+            self.assertListEqual(
+                self.list_files(sample_dir),
+                ["bins/bin1/genes.gff", "storage/bin_stats_ext.tsv"],
+            )
+            scratch.release(sample_dir, stage="coding_plot")
+            self.assertListEqual(
+                self.list_files(sample_dir), ["storage/bin_stats_ext.tsv"]
+            )
+            self.assertEqual(scratch.peak_usage, 210)
+            self.assertEqual(scratch.record_usage(sample_dir), 20)
+
+    def test_scratch_space_release_returns_ram_disk_budget(self):
+        ram_disk = os.path.join(self._tmp, "shm")
+        os.makedirs(ram_disk)
+        with _ScratchSpace(
+            scratch_dir=self._tmp, ram_disk_budget=500, ram_disk_path=ram_disk
+        ) as scratch:
+            results_dir = os.path.join(scratch.path, "results")
+            obs1 = scratch.make_sample_dir(results_dir, "samp1", 500)
+            self.create_fake_results(obs1)
+            self.assertEqual(scratch.ram_disk_budget, 0)
+
+            # only the retained files (60 bytes) are kept on the RAM disk
+            scratch.release(obs1, stage="lineage_wf")
+            self.assertEqual(scratch.ram_disk_budget, 440)
+            obs2 = scratch.make_sample_dir(results_dir, "samp2", 400)
+            self.assertTrue(os.path.islink(obs2))
+            self.assertEqual(scratch.ram_disk_budget, 40)
+
+            scratch.release(obs1, stage="coding_plot")
+            self.assertEqual(scratch.ram_disk_budget, 80)
+
+    def test_scratch_space_release_measures_sample_only(self):
+        with _ScratchSpace(scratch_dir=self._tmp) as scratch:
+            results_dir = os.path.join(scratch.path, "results")
+            sample_dirs = [
+                scratch.make_sample_dir(results_dir, f"samp{i}", 0) for i in range(3)
+            ]
+            for sample_dir in sample_dirs:
+                self.create_fake_results(sample_dir)
+
+            with patch("q2_checkm.utils._get_dir_size", side_effect=_get_dir_size) as p:
+                for sample_dir in sample_dirs:
+                    scratch.release(sample_dir, stage="lineage_wf")
+
+            # every release measures only the released sample
+            self.assertListEqual(
+                [c.args[0] for c in p.call_args_list],
+                [os.path.realpath(x) for x in sample_dirs],
+            )
+            self.assertEqual(scratch.peak_usage, 60 + 60 + 210)
+            self.assertEqual(scratch.record_usage(sample_dirs[0]), 180)
+
+    def test_scratch_space_release_keep_intermediates(self):
+        with _ScratchSpace(scratch_dir=self._tmp, keep_intermediates=True) as scratch:
+            sample_dir = os.path.join(scratch.path, "results", "samp1")
+            self.create_fake_results(sample_dir)
+
+            scratch.release(sample_dir, stage="lineage_wf")
+            self.assertEqual(len(self.list_files(sample_dir)), 6)
+            self.assertEqual(scratch.peak_usage, 210)
+
+    def test_run_command_log(self):
+        log_fp = os.path.join(self._tmp, "logs", "samp1", "gc_plot.log")
+        cmd = [
+            sys.executable,
+            "-c",
+            "import sys; print('out'); sys.stderr.write('err')",
+        ]
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            run_command(cmd, log_fp=log_fp)
+
+        # nothing is printed - the command and its output are logged
+        self.assertEqual(out.getvalue(), "")
+        with open(log_fp) as fh:
+            obs = fh.read()
+        self.assertTrue(obs.startswith(f"Command: {sys.executable} -c"))
+        self.assertTrue(obs.endswith("\n\nout\nerr"))
+
+    def test_run_command_log_failed(self):
+        log_fp = os.path.join(self._tmp, "samp1", "lineage_wf.log")
+        cmd = [sys.executable, "-c", "import sys; print('oops'); sys.exit(3)"]
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            with self.assertRaises(subprocess.CalledProcessError) as cm:
+                run_command(cmd, log_fp=log_fp)
+
+        self.assertEqual(cm.exception.returncode, 3)
+        self.assertTrue(cm.exception.output.endswith("\n\noops\n"))
+        # the end of the log is reported
+        self.assertEqual(err.getvalue(), cm.exception.output)
+
+    def test_get_log_fp(self):
+        self.assertEqual(
+            _get_log_fp("logs", "samp1", "gc_plot"),
+            os.path.join("logs", "samp1", "gc_plot.log"),
+        )
+        self.assertIsNone(_get_log_fp(None, "samp1", "gc_plot"))
+
+    def test_zip_logs(self):
+        log_dir = os.path.join(self._tmp, "logs")
+        for sample, stage in [("samp1", "lineage_wf"), ("samp2", "gc_plot")]:
+            os.makedirs(os.path.join(log_dir, sample), exist_ok=True)
+            with open(os.path.join(log_dir, sample, f"{stage}.log"), "w") as fh:
+                fh.write(f"{sample} {stage}\n" * 100)
+        zip_fp = os.path.join(self._tmp, "checkm_logs.zip")
+
+        _zip_logs(log_dir, zip_fp)
+
+        with ZipFile(zip_fp) as zf:
+            self.assertListEqual(
+                zf.namelist(), ["samp1/lineage_wf.log", "samp2/gc_plot.log"]
+            )
+            self.assertEqual(zf.read("samp2/gc_plot.log"), b"samp2 gc_plot\n" * 100)
+            self.assertEqual(
+                zf.getinfo("samp2/gc_plot.log").compress_type, ZIP_DEFLATED
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
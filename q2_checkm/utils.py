@@ -5,13 +5,44 @@
 #
 # The full license is in the file LICENSE, distributed with this software.
 # ----------------------------------------------------------------------------
+import errno
+import fnmatch
+import glob
+import os
+import shutil
 import subprocess
+import sys
+import tempfile
+import threading
+import warnings
 from collections import defaultdict
-from typing import Dict, List, Mapping
+from typing import Callable, Dict, List, Mapping
+from zipfile import ZIP_DEFLATED, ZipFile
 
+import pandas as pd
+from q2_types.per_sample_sequences import MultiMAGSequencesDirFmt
 
-def run_command(cmd, env=None, verbose=True):
-    if verbose:
+from q2_checkm.jobqueue import _read_log_tail
+
+RAM_DISK_PATH = "/dev/shm"
+
+# rough estimate of how much space CheckM's intermediate files (Prodigal,
+# HMMER and pplacer outputs) take up relative to the size of the input bins
+INTERMEDIATES_SIZE_FACTOR = 3
+
+# files (relative to the sample's results directory) which are still required
+# by the later stages of the analysis, once the given stage has completed
+RETAINED_FILES = {
+    "lineage_wf": [
+        os.path.join("storage", "bin_stats_ext.tsv"),
+        os.path.join("bins", "*", "genes.gff"),
+    ],
+    "coding_plot": [os.path.join("storage", "bin_stats_ext.tsv")],
+}
+
+
+def run_command(cmd, env=None, verbose=True, log_fp=None):
+    if verbose and not log_fp:
         print(
             "Running external command line application(s). This may print "
             "messages to stdout and/or stderr."
@@ -21,13 +52,58 @@ def run_command(cmd, env=None, verbose=True):
             "be manually re-run as they will depend on temporary files that "
             "no longer exist."
         )
-    if verbose:
         print("\nCommand:", end=" ")
         print(" ".join(cmd), end="\n\n")
-    if env:
-        subprocess.run(cmd, env=env, check=True)
-    else:
-        subprocess.run(cmd, check=True)
+    kwargs = {"env": env} if env else {}
+    if not log_fp:
+        subprocess.run(cmd, check=True, **kwargs)
+        return
+
+    # the command's output is only written into the log - the last lines
+    # are reported (and attached to the error) if the command fails
+    os.makedirs(os.path.dirname(log_fp), exist_ok=True)
+    with open(log_fp, "w") as fh:
+        fh.write(f"Command: {' '.join(cmd)}\n\n")
+        fh.flush()
+        try:
+            subprocess.run(
+                cmd, check=True, stdout=fh, stderr=subprocess.STDOUT, **kwargs
+            )
+        except subprocess.CalledProcessError as e:
+            fh.flush()
+            e.output = _read_log_tail(log_fp)
+            sys.stderr.write(e.output)
+            raise
+
+
+def _get_log_fp(log_dir: str, sample: str, stage: str) -> str:
+    """Finds the location of a job's log file.
+
+    Args:
+        log_dir (str): Directory in which the logs of all the jobs are kept.
+            Logs are not kept if not provided.
+        sample (str): The sample ID.
+        stage (str): The stage of the job (e.g., lineage_wf or gc_plot).
+
+    Returns:
+        str: Path to the log file or None if logs are not kept.
+    """
+    if not log_dir:
+        return None
+    return os.path.join(log_dir, sample, f"{stage}.log")
+
+
+def _zip_logs(log_dir: str, zip_path: str):
+    """Compresses the logs of all the jobs into a single zip archive.
+
+    Args:
+        log_dir (str): Directory containing the logs, one directory
+            per sample.
+        zip_path (str): The path to the zip archive.
+    """
+    with ZipFile(zip_path, "w", compression=ZIP_DEFLATED) as zf:
+        for log_fp in sorted(glob.glob(os.path.join(log_dir, "*", "*.log"))):
+            zf.write(log_fp, arcname=os.path.relpath(log_fp, log_dir))
 
 
 def _process_common_input_params(processing_func, params: dict) -> List[str]:
@@ -109,3 +185,289 @@ def _get_plots_per_sample(
         for subkey, subval in val.items():
             plots_per_sample[subkey][key] = subval
     return plots_per_sample
+
+
+def _link_or_copy(src: str, dst: str, allow_symlinks: bool = True) -> str:
+    """Places a file at the destination path without duplicating its data
+        whenever possible.
+
+    A hardlink is attempted first. If that is not possible (e.g., when the
+    source and the destination are on different filesystems) a symlink is
+    created instead - unless disallowed, in which case (or when symlinks are
+    not supported either) the file gets copied.
+
+    Args:
+        src (str): Path to the source file.
+        dst (str): Path to the destination file.
+        allow_symlinks (bool): Whether symlinks can be used if hardlinking
+            is not possible.
+
+    Returns:
+        str: Method used to stage the file (one of: hardlink/symlink/copy).
+    """
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+
+    if allow_symlinks:
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            return "symlink"
+        except OSError as e:
+            if e.errno not in (errno.EPERM, errno.ENOTSUP):
+                raise
+
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def _stage_bins(
+    bins: MultiMAGSequencesDirFmt,
+    staging_dir: str,
+    bin_filter: Callable[[str, str], bool] = None,
+    allow_symlinks: bool = True,
+) -> MultiMAGSequencesDirFmt:
+    """Builds a new MAG directory from links pointing to the original bins.
+
+    The staged directory has the same layout as the original
+    MultiMAGSequencesDirFmt (one directory per sample and a MANIFEST file)
+    so it can be used wherever the original bins are expected, while no
+    sequence data are copied unless links cannot be created.
+
+    Args:
+        bins (MultiMAGSequencesDirFmt): The bins to be staged.
+        staging_dir (str): Location where the staged bins should be created.
+        bin_filter (Callable[[str, str], bool]): Optional function accepting
+            a sample ID and a MAG ID which decides whether the corresponding
+            bin should be staged. All bins are staged if not provided.
+        allow_symlinks (bool): Whether symlinks can be used if hardlinking
+            is not possible.
+
+    Returns:
+        MultiMAGSequencesDirFmt: The staged bins.
+    """
+    manifest: pd.DataFrame = bins.manifest.view(pd.DataFrame).reset_index()
+    os.makedirs(staging_dir, exist_ok=True)
+
+    manifest_lines = ["sample-id,mag-id,filename"]
+    sample_dirs = set()
+    for sample_id, mag_id, fp in manifest[
+        ["sample-id", "mag-id", "filename"]
+    ].itertuples(index=False):
+        if bin_filter is not None and not bin_filter(sample_id, mag_id):
+            continue
+        if sample_id not in sample_dirs:
+            os.makedirs(os.path.join(staging_dir, sample_id), exist_ok=True)
+            sample_dirs.add(sample_id)
+        fn = os.path.join(sample_id, os.path.basename(fp))
+        _link_or_copy(fp, os.path.join(staging_dir, fn), allow_symlinks)
+        manifest_lines.append(f"{sample_id},{mag_id},{fn}")
+
+    with open(os.path.join(staging_dir, "MANIFEST"), "w") as fh:
+        fh.write("\n".join(manifest_lines) + "\n")
+
+    return MultiMAGSequencesDirFmt(staging_dir, "r")
+
+
+def _get_dir_size(path: str) -> int:
+    """Calculates the total size of all the files in a directory.
+
+    Args:
+        path (str): Path to the directory.
+
+    Returns:
+        int: Total size of all the files (in bytes).
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            fp = os.path.join(root, f)
+            try:
+                if not os.path.islink(fp):
+                    total += os.path.getsize(fp)
+            except FileNotFoundError:
+                # files of concurrently evaluated samples may disappear
+                pass
+    return total
+
+
+def _prune_dir(path: str, keep: List[str]) -> int:
+    """Removes all the files from a directory except for the specified ones.
+
+    Symlinked directories are followed so that the files stored on a RAM
+    disk are also pruned. Empty directories are removed.
+
+    Args:
+        path (str): Path to the directory to be pruned.
+        keep (List[str]): Glob patterns (relative to the path) of files
+            which should be retained.
+
+    Returns:
+        int: Total size of the removed files (in bytes).
+    """
+    removed = 0
+    for root, dirs, files in os.walk(path, topdown=False, followlinks=True):
+        for f in files:
+            fp = os.path.join(root, f)
+            if any(fnmatch.fnmatch(os.path.relpath(fp, path), x) for x in keep):
+                continue
+            removed += os.path.getsize(fp) if not os.path.islink(fp) else 0
+            os.remove(fp)
+        for d in dirs:
+            dp = os.path.join(root, d)
+            if not os.path.islink(dp) and not os.listdir(dp):
+                os.rmdir(dp)
+    return removed
+
+
+class _ScratchSpace:
+    """Temporary location for CheckM's intermediate files.
+
+    Per-sample result directories are placed on the RAM disk for as long as
+    the estimated size of their intermediates fits into the provided budget -
+    all the remaining ones spill over to the on-disk scratch location. RAM disk
+    directories are symlinked into the on-disk location so that all the
+    results can be accessed using the same paths. All the methods can be
+    called concurrently for different samples.
+
+    Args:
+        scratch_dir (str): Directory in which the on-disk scratch location
+            should be created. The system's default temporary directory is
+            used if not provided.
+        ram_disk_budget (int): Maximum space (in bytes) that can be occupied
+            by the intermediate files on the RAM disk. RAM disk is not used
+            when not provided.
+        ram_disk_path (str): Location of the RAM disk.
+        keep_intermediates (bool): Whether all the intermediate files should
+            be kept until the scratch space is cleaned up. By default, files
+            which are not required by later stages are removed as soon as
+            a sample's stage has completed.
+    """
+
+    def __init__(
+        self,
+        scratch_dir: str = None,
+        ram_disk_budget: int = None,
+        ram_disk_path: str = RAM_DISK_PATH,
+        keep_intermediates: bool = False,
+    ):
+        self.scratch_dir = scratch_dir
+        self.ram_disk_budget = ram_disk_budget or 0
+        self.ram_disk_path = ram_disk_path
+        self.keep_intermediates = keep_intermediates
+        self.peak_usage = 0
+        self.path = None
+        self._tmp_dirs = []
+        self._ram_disk_dir = None
+        self._lock = threading.Lock()
+        # size of every sample's results directory (as last measured), their
+        # total and the RAM disk space reserved for every sample
+        self._usage = {}
+        self._total_usage = 0
+        self._reserved = {}
+
+    def __enter__(self):
+        if self.scratch_dir:
+            os.makedirs(self.scratch_dir, exist_ok=True)
+        tmp = tempfile.TemporaryDirectory(dir=self.scratch_dir)
+        self._tmp_dirs.append(tmp)
+        self.path = tmp.name
+
+        if self.ram_disk_budget > 0:
+            if os.path.isdir(self.ram_disk_path):
+                tmp = tempfile.TemporaryDirectory(dir=self.ram_disk_path)
+                self._tmp_dirs.append(tmp)
+                self._ram_disk_dir = tmp.name
+            else:
+                warnings.warn(
+                    f"RAM disk {self.ram_disk_path} is not available - all the "
+                    f"intermediate files will be stored in {self.path}."
+                )
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for tmp in reversed(self._tmp_dirs):
+            tmp.cleanup()
+        self._tmp_dirs = []
+
+    def make_sample_dir(
+        self, results_dir: str, sample: str, estimated_size: int = 0
+    ) -> str:
+        """Creates a results directory for a single sample.
+
+        Args:
+            results_dir (str): Location where the results for all the samples
+                are stored.
+            sample (str): The sample ID.
+            estimated_size (int): Estimated size (in bytes) of the
+                intermediate files that will be generated for the sample.
+
+        Returns:
+            str: Path to the sample's results directory (inside
+                the results_dir).
+        """
+        sample_dir = os.path.join(results_dir, sample)
+        os.makedirs(results_dir, exist_ok=True)
+
+        with self._lock:
+            if self._ram_disk_dir and estimated_size <= min(
+                self.ram_disk_budget, shutil.disk_usage(self._ram_disk_dir).free
+            ):
+                ram_disk_sample_dir = os.path.join(self._ram_disk_dir, sample)
+                os.makedirs(ram_disk_sample_dir)
+                os.symlink(ram_disk_sample_dir, sample_dir)
+                self.ram_disk_budget -= estimated_size
+                self._reserved[sample_dir] = estimated_size
+        return sample_dir
+
+    def _set_usage(self, sample_dir: str, size: int) -> int:
+        """Updates the tracked size of a sample's results directory (with
+        the lock held) and the peak usage of the scratch space.
+        """
+        self._total_usage += size - self._usage.get(sample_dir, 0)
+        self._usage[sample_dir] = size
+        self.peak_usage = max(self.peak_usage, self._total_usage)
+        return self._total_usage
+
+    def record_usage(self, sample_dir: str) -> int:
+        """Updates the usage of the scratch space with the current size
+            of a sample's results directory.
+
+        Only that directory is measured - sizes of the other samples'
+        directories are tracked from their previous measurements.
+
+        Args:
+            sample_dir (str): Path to the sample's results directory.
+
+        Returns:
+            int: Current size of all the samples' results (in bytes).
+        """
+        size = _get_dir_size(os.path.realpath(sample_dir))
+        with self._lock:
+            return self._set_usage(sample_dir, size)
+
+    def release(self, sample_dir: str, stage: str):
+        """Removes sample's intermediate files which are no longer required
+            once the given stage has completed.
+
+        Args:
+            sample_dir (str): Path to the sample's results directory.
+            stage (str): The stage which has completed (one of the keys
+                in RETAINED_FILES).
+        """
+        self.record_usage(sample_dir)
+        if self.keep_intermediates:
+            return
+        removed = _prune_dir(sample_dir, RETAINED_FILES[stage])
+
+        with self._lock:
+            remaining = self._usage[sample_dir] - removed
+            self._set_usage(sample_dir, remaining)
+            # RAM disk space which is not needed anymore can be used
+            # by the samples which are yet to be evaluated
+            if sample_dir in self._reserved:
+                self.ram_disk_budget += self._reserved[sample_dir] - remaining
+                self._reserved[sample_dir] = remaining
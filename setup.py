@@ -15,12 +15,15 @@ setup(
     version=versioneer.get_version(),
     cmdclass=versioneer.get_cmdclass(),
     license="BSD-3-Clause",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks*"]),
     author="Michal Ziemski",
     author_email="ziemski.michal@gmail.com",
     description="QIIME 2 plugin for (meta)genome quality assessment using CheckM.",
     url="https://github.com/bokulich-lab/q2-checkm",
-    entry_points={"qiime2.plugins": ["q2-checkm=q2_checkm.plugin_setup:plugin"]},
+    entry_points={
+        "qiime2.plugins": ["q2-checkm=q2_checkm.plugin_setup:plugin"],
+        "console_scripts": ["q2-checkm-worker=q2_checkm.jobqueue:main"],
+    },
     package_data={
         "q2_checkm": [
             "citations.bib",
@@ -28,13 +31,18 @@ setup(
             "assets/checkm/data/*",
             "assets/checkm/js/*",
             "assets/checkm/css/*",
+            "assets/checkm/vendor/*",
         ],
         "q2_checkm.tests": [
             "data/*",
             "data/bins/*",
+            "data/alignments/*",
             "data/bins/*/*",
             "data/checkm_reports/*/*/*",
             "data/plots/*/*/*",
+            "data/results/*",
+            "data/results/bin_stats/*/*",
+            "data/stats/*",
         ],
     },
     zip_safe=False,